@@ -0,0 +1,162 @@
+"""Benchmark `utils.algorithms.longest_common_substring` against the old
+all-substrings scan on real franchise title lists.
+
+Run from the repo root:
+    python -m benchmarks.bench_algorithms
+"""
+import timeit
+
+from utils.algorithms import (
+    _longest_common_substring,
+    get_all_substrings,
+    longest_common_substring,
+)
+from utils.anilist_graph import clean_title
+
+FRANCHISES = {
+    "Monogatari": [
+        "Bakemonogatari",
+        "Nisemonogatari",
+        "Nekomonogatari: Kuro",
+        "Monogatari Series: Second Season",
+        "Hanamonogatari",
+        "Tsukimonogatari",
+        "Owarimonogatari",
+        "Koyomimonogatari",
+        "Kizumonogatari Part 1: Tekketsu",
+        "Kizumonogatari Part 2: Nekketsu",
+        "Kizumonogatari Part 3: Reiketsu",
+        "Owarimonogatari Season 2",
+        "Zoku Owarimonogatari",
+        "Monogatari Series: Off & Monster Season",
+    ],
+    "Gintama": [
+        "Gintama",
+        "Gintama'",
+        "Gintama': Enchousen",
+        "Gintama°",
+        "Gintama.",
+        "Gintama.: Porori-hen",
+        "Gintama.: Shirogane no Tamashii-hen",
+        "Gintama: The Movie",
+        "Gintama: The Final",
+        "Gintama: The Semi-Final",
+        "Gintama Movie 2: Kanketsu-hen - Yorozuya yo Eien Nare",
+        "Gintama': Yorinuki Gintama-san on Theater 2D",
+    ],
+    "Fate": [
+        "Fate/stay night",
+        "Fate/Zero",
+        "Fate/Zero Season 2",
+        "Fate/stay night: Unlimited Blade Works",
+        "Fate/stay night: Unlimited Blade Works Season 2",
+        "Fate/stay night: Heaven's Feel I. presage flower",
+        "Fate/stay night: Heaven's Feel II. lost butterfly",
+        "Fate/stay night: Heaven's Feel III. spring song",
+        "Fate/Apocrypha",
+        "Fate/Extra Last Encore",
+        "Fate/Grand Order: Absolute Demonic Front - Babylonia",
+        "Fate/kaleid liner Prisma Illya",
+        "Fate/strange Fake: Whispers of Dawn",
+    ],
+    "JoJo": [
+        "JoJo's Bizarre Adventure",
+        "JoJo's Bizarre Adventure: Stardust Crusaders",
+        "JoJo's Bizarre Adventure: Stardust Crusaders - Battle in Egypt",
+        "JoJo's Bizarre Adventure: Diamond is Unbreakable",
+        "JoJo's Bizarre Adventure: Golden Wind",
+        "JoJo's Bizarre Adventure: Stone Ocean",
+        "JoJo's Bizarre Adventure: Stone Ocean Part 2",
+        "JoJo's Bizarre Adventure: Stone Ocean Part 3",
+    ],
+    "Attack on Titan": [
+        "Attack on Titan",
+        "Attack on Titan Season 2",
+        "Attack on Titan Season 3",
+        "Attack on Titan Season 3 Part 2",
+        "Attack on Titan: The Final Season",
+        "Attack on Titan: The Final Season Part 2",
+        "Attack on Titan: The Final Season - The Final Chapters",
+        "Attack on Titan: Junior High",
+        "Attack on Titan: No Regrets",
+        "Attack on Titan: Lost Girls",
+    ],
+    "Sword Art Online": [
+        "Sword Art Online",
+        "Sword Art Online II",
+        "Sword Art Online: Extra Edition",
+        "Sword Art Online the Movie: Ordinal Scale",
+        "Sword Art Online: Alicization",
+        "Sword Art Online: Alicization - War of Underworld",
+        "Sword Art Online: Alicization - War of Underworld Part 2",
+        "Sword Art Online Progressive: Aria of a Starless Night",
+        "Sword Art Online Progressive: Scherzo of Deep Night",
+        "Sword Art Online Alternative: Gun Gale Online",
+    ],
+    "Oshi no Ko": [
+        "Oshi no Ko",
+        "Oshi no Ko Season 2",
+        "Oshi no Ko Season 3",
+    ],
+}
+
+
+def reference_longest_common_substring(titles, threshold=0.6):
+    """The previous O(n·L³) implementation, kept as the correctness oracle."""
+    all_substrings = {}
+    for title in titles:
+        for substring in get_all_substrings(title):
+            if substring not in all_substrings:
+                count = sum(1 for t in titles if substring in t)
+                frequency = count / len(titles)
+                if frequency >= threshold:
+                    all_substrings[substring] = frequency
+
+    if not all_substrings:
+        return ""
+
+    candidates = sorted(
+        all_substrings.items(), key=lambda x: len(x[0]), reverse=True
+    )
+    return candidates[0][0].strip()
+
+
+def _uncached(titles, threshold):
+    _longest_common_substring.cache_clear()
+    return longest_common_substring(titles, threshold)
+
+
+def main():
+    print(f"{'franchise':<18}{'titles':>7}{'old (ms)':>11}{'new (ms)':>11}{'speedup':>9}  result")
+
+    for name, raw_titles in FRANCHISES.items():
+        for label, titles in (
+            (name, [t.lower() for t in raw_titles]),
+            (f"{name}*", [clean_title(t).lower() for t in raw_titles]),
+        ):
+            expected = reference_longest_common_substring(titles)
+            result = _uncached(titles, 0.6)
+            assert result == expected, (label, expected, result)
+
+            runs = 3
+            old = timeit.timeit(
+                lambda: reference_longest_common_substring(titles), number=runs
+            ) / runs
+            new = timeit.timeit(lambda: _uncached(titles, 0.6), number=runs * 10) / (
+                runs * 10
+            )
+
+            print(
+                f"{label:<18}{len(titles):>7}{old * 1000:>11.2f}{new * 1000:>11.2f}"
+                f"{old / new:>8.0f}x  {result!r}"
+            )
+
+    titles = [t.lower() for t in FRANCHISES["Fate"]]
+    longest_common_substring(titles)
+    cached = timeit.timeit(lambda: longest_common_substring(titles), number=1000) / 1000
+    print(f"\nmemoized repeat lookup: {cached * 1e6:.2f} µs")
+    print("* titles passed through anilist_graph.clean_title first")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Benchmark `utils.card` rendering from local fixture covers (no network).
+
+Reports a per-stage breakdown of the real rendering functions (cover
+decoding, fitting, corner masking, text drawing, pasting, encoding), then end-to-end
+throughput and peak RSS for the serial `card_maker` path and the pooled
+`CardRenderer` path on 1, 4, 8 and 32-card layouts. RSS is this process
+only, so `--process` workers aren't counted.
+
+Run from the repo root:
+    python -m benchmarks.bench_card
+    python -m benchmarks.bench_card --covers path/to/jpgs --latency 80 --process
+"""
+import argparse
+import asyncio
+import glob
+import os
+import random
+import time
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import psutil
+from PIL import Image, ImageDraw
+
+from utils import card
+
+LAYOUTS = (1, 4, 8, 32)
+# AniList `coverImage.large` size
+COVER_SIZE = (230, 345)
+
+
+def make_fixture_covers(count=16, seed=0):
+    """Deterministic JPEG covers: gradient, shapes and noise, like real art."""
+    rng = random.Random(seed)
+    covers = []
+    for _ in range(count):
+        top = tuple(rng.randrange(256) for _ in range(3))
+        bottom = tuple(rng.randrange(256) for _ in range(3))
+        gradient = Image.linear_gradient("L").resize(COVER_SIZE)
+        img = Image.composite(
+            Image.new("RGB", COVER_SIZE, bottom), Image.new("RGB", COVER_SIZE, top), gradient
+        )
+
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x, y = rng.randrange(COVER_SIZE[0]), rng.randrange(COVER_SIZE[1])
+            r = rng.randrange(10, 80)
+            draw.ellipse(
+                (x - r, y - r, x + r, y + r),
+                fill=tuple(rng.randrange(256) for _ in range(3)),
+            )
+        noise = Image.effect_noise(COVER_SIZE, 24).convert("RGB")
+        img = Image.blend(img, noise, 0.15)
+
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", quality=90)
+        covers.append(buffer.getvalue())
+    return covers
+
+
+def load_fixture_covers(directory):
+    paths = sorted(
+        p for ext in ("jpg", "jpeg", "png", "webp") for p in glob.glob(os.path.join(directory, f"*.{ext}"))
+    )
+    covers = []
+    for path in paths:
+        with open(path, "rb") as f:
+            covers.append(f.read())
+    return covers
+
+
+class _Response:
+    def __init__(self, payload):
+        self._payload = payload
+
+    async def read(self):
+        return self._payload
+
+
+class StubClient:
+    """Stands in for `AniListClient`: serves fixture bytes by url."""
+
+    def __init__(self, covers, latency=0.0):
+        self.covers = covers
+        self.latency = latency
+
+    async def request(self, method, url, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return _Response(self.covers[url])
+
+
+class NoCache(card.TileCache):
+    """A cache that never hits, so every iteration does the full work."""
+
+    def __init__(self):
+        pass
+
+    def __contains__(self, key):
+        return False
+
+    def get(self, key):
+        return None
+
+    def put(self, key, payload):
+        pass
+
+    def get_tile(self, url):
+        return None
+
+    def put_tile(self, url, tile):
+        pass
+
+
+def make_data(n, covers):
+    return [
+        {
+            "image": f"fixture://{i % len(covers)}",
+            "title": f"Character Name {i}",
+            "subtitle": "Some Rather Long Series Title",
+        }
+        for i in range(n)
+    ]
+
+
+def stage_breakdown(data, covers, iterations):
+    """Times the stages of `render_card` by wrapping the calls it makes:
+    `ImageOps.fit` (fit), `add_rounded_corners` (mask), `ImageDraw.text`
+    (text) and `Image.paste` (paste, tiles into rows and rows into the
+    card). Whatever else `_decode_tile` spends is opening and converting
+    the cover (decode)."""
+    timings = defaultdict(float)
+    payloads = {f"fixture://{i}": cover for i, cover in enumerate(covers)}
+
+    def timed(stage, func):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[stage] += time.perf_counter() - start
+        return wrapper
+
+    patches = (
+        (card.ImageOps, "fit", "fit"),
+        (card, "add_rounded_corners", "mask"),
+        (ImageDraw.ImageDraw, "text", "text"),
+        (Image.Image, "paste", "paste"),
+    )
+    originals = [(owner, name, getattr(owner, name)) for owner, name, _ in patches]
+    for owner, name, stage in patches:
+        setattr(owner, name, timed(stage, getattr(owner, name)))
+    try:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            tiles = [card._decode_tile(payloads[item["image"]]) for item in data]
+            timings["decode"] += time.perf_counter() - start
+
+            image = card._compose(data, tiles)
+
+            start = time.perf_counter()
+            card.encode_card(image)
+            timings["encode"] += time.perf_counter() - start
+    finally:
+        for owner, name, original in originals:
+            setattr(owner, name, original)
+
+    timings["decode"] -= timings["fit"] + timings["mask"]
+    return {stage: total / iterations for stage, total in timings.items()}
+
+
+async def run_serial(data, client, iterations):
+    for _ in range(iterations):
+        image = await card.card_maker(data, client)
+        card.encode_card(image)
+
+
+async def run_pooled(data, client, iterations, renderer):
+    await asyncio.gather(*(renderer.render(data, client) for _ in range(iterations)))
+
+
+def measure(coro_factory, poll=0.005):
+    """Run the coroutine, returning its wall time and the peak RSS seen
+    meanwhile (Pillow's buffers live outside the Python heap)"""
+    process = psutil.Process()
+    peak = process.memory_info().rss
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.wait(poll):
+            peak = max(peak, process.memory_info().rss)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        asyncio.run(coro_factory())
+    finally:
+        elapsed = time.perf_counter() - start
+        done.set()
+        sampler.join()
+    return elapsed, max(peak, process.memory_info().rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--covers", help="directory of local cover images to use as fixtures")
+    parser.add_argument("--iterations", type=int, default=5, help="renders per layout")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated fetch latency (ms)")
+    parser.add_argument("--workers", type=int, default=2, help="pool size for the pooled path")
+    parser.add_argument("--process", action="store_true", help="use a process pool instead of threads")
+    args = parser.parse_args()
+
+    covers = load_fixture_covers(args.covers) if args.covers else make_fixture_covers()
+    if not covers:
+        parser.error(f"no images found in {args.covers}")
+    client = StubClient(
+        {f"fixture://{i}": cover for i, cover in enumerate(covers)}, args.latency / 1000
+    )
+
+    # Warm the cached fonts/masks so the first layout is not penalised
+    stage_breakdown(make_data(1, covers), covers, 1)
+
+    print(f"{len(covers)} fixture covers, {args.iterations} iterations, "
+          f"{args.latency:.0f}ms simulated latency\n")
+    print("per-render stage timings (ms)")
+    stages = ("decode", "fit", "mask", "text", "paste", "encode")
+    print(f"{'cards':>6}" + "".join(f"{stage:>9}" for stage in stages))
+    for n in LAYOUTS:
+        timings = stage_breakdown(make_data(n, covers), covers, max(1, args.iterations // 2))
+        print(f"{n:>6}" + "".join(f"{timings[stage] * 1000:>9.2f}" for stage in stages))
+
+    executor = None
+    if args.process:
+        executor = ProcessPoolExecutor(max_workers=args.workers)
+    renderer = card.CardRenderer(
+        executor=executor, max_workers=args.workers, tile_cache=NoCache(), card_cache=NoCache()
+    )
+
+    print(f"\n{'path':<8}{'cards':>6}{'total (s)':>11}{'renders/s':>11}{'cards/s':>10}{'peak RSS (MB)':>15}")
+    for n in LAYOUTS:
+        data = make_data(n, covers)
+        for label, factory in (
+            ("serial", lambda: run_serial(data, client, args.iterations)),
+            ("pooled", lambda: run_pooled(data, client, args.iterations, renderer)),
+        ):
+            elapsed, peak = measure(factory)
+            print(
+                f"{label:<8}{n:>6}{elapsed:>11.3f}{args.iterations / elapsed:>11.1f}"
+                f"{args.iterations * n / elapsed:>10.1f}{peak / 2**20:>15.1f}"
+            )
+
+    renderer.close()
+
+
+if __name__ == "__main__":
+    main()
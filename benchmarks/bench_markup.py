@@ -0,0 +1,185 @@
+"""Benchmark `utils.markup.to_markdown` against the old replace/regex
+chains of `vn.parse_vndb_desciption` and `AnilistBase.parse_description`,
+both on a cold memo and on repeat lookups.
+
+The corpus is a set of descriptions in each site's markup, plus every
+tag and trait description in the local VNDB index (`utils.vndb_index`)
+when `--db` points at a database where it has been built. Untruncated
+output is checked against the old implementation first.
+
+Run from the repo root:
+    python -m benchmarks.bench_markup
+    python -m benchmarks.bench_markup --db akane_db.db
+"""
+import argparse
+import re
+import sqlite3
+import timeit
+
+from utils import markup
+
+VNDB_SAMPLES = [
+    "The story follows [url=/c1234]Okabe Rintarou[/url], a self-proclaimed [i]mad scientist[/i], "
+    "and the members of his lab as they stumble upon a way to send messages to the past.\n\n"
+    "[spoiler]Every change to the past has a price, and the [b]world line[/b] always converges.[/spoiler]\n\n"
+    "[From [url=https://example.org/steins]the official website[/url]]",
+    "Kyou is a normal high school student until the day [url=/c55]Nagisa[/url] asks him "
+    "to help restart the drama club. #School life, #Drama\n\n"
+    "[b]After Story[/b] continues past graduation. [spoiler]It gets a lot sadder.[/spoiler]",
+    "A short [i]kinetic novel[/i] without choices.",
+    "Some [b]very[/b] long description " * 40
+    + "[url=/v17]related[/url] and [spoiler]a late spoiler[/spoiler] at the end.",
+    "",
+]
+
+ANILIST_SAMPLES = [
+    "In a world where <i>idols</i> are everything, <b>Gorou</b> meets his favourite idol, "
+    "Ai Hoshino.<br>\n<br>\n~!Ai is murdered in the first episode and he is reborn as her son.!~"
+    "<br>\n<br>\n(Source: Crunchyroll)",
+    "Tanjirou sets out to become a demon slayer after his family is slaughtered and his "
+    "sister Nezuko is turned into a demon.<br><br>\n<i>Note: Includes the episode 1 "
+    "hour-long special.</i> #Shounen",
+    "<b>Season two</b> of the series.",
+    "The <i>long</i> journey continues. " * 60 + "~!The ending is a twist!~",
+    "",
+]
+
+
+# The implementations `utils.markup` replaced, kept as correctness oracles
+
+
+def _old_bbcode_link(match):
+    url = match.group(1)
+    if url.startswith("/"):
+        url = "https://vndb.org" + url
+    return f"[{match.group(2)}]({url})"
+
+
+def old_vndb(description, limit=300):
+    if not description:
+        return "NA"
+
+    description = (
+        description.replace("[spoiler]", "||")
+        .replace("[/spoiler]", "||")
+        .replace("#", "")
+        .replace("[i]", "")
+        .replace("[b]", "")
+        .replace("[/b]", "")
+        .replace("[/i]", "")
+    )
+    description = re.sub(r"\[url=(.*?)\](.*?)\[/url\]", _old_bbcode_link, description)
+
+    if len(description) > limit:
+        description = description[0:limit]
+        if re.search(r"\[[^\]]+\]\([^)]*$", description):
+            if description.endswith("("):
+                description = description[:-1]
+            else:
+                description += ")"
+        elif re.search(r"\[[^\]]*$", description):
+            description = re.sub(r"\[([^\]]*)$", r"\1", description)
+        if description.count("||") % 2:
+            description = description + "||"
+        description = description + "..."
+
+    return description
+
+
+def old_anilist(description, limit=400):
+    if not description:
+        return "-"
+
+    for tag in ["<i>", "</i>", "<I>", "</I>", "<b>", "</b>", "<B>", "</B>", "<br>", "<BR>", "#"]:
+        description = description.replace(tag, "")
+    description = description.replace("~!", "||").replace("!~", "||")
+
+    if len(description) > limit:
+        description = description[:limit]
+        if description.count("||") % 2:
+            description += "||"
+        description += "..."
+
+    return description
+
+
+def new(dialect, empty):
+    def convert(description, limit):
+        if not description:
+            return empty
+        return markup.to_markdown(description, dialect, limit)
+
+    return convert
+
+
+def load_index_corpus(path):
+    con = sqlite3.connect(path)
+    try:
+        return [
+            row[0]
+            for table in ("vndb_tags", "vndb_traits")
+            for row in con.execute(f"SELECT description FROM {table}")
+        ]
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        con.close()
+
+
+def bench(label, corpus, old, convert, limit, number):
+    for text in corpus:
+        expected = old(text, 10**9)
+        markup.cache_clear()
+        result = convert(text, None)
+        assert result == expected, (label, text[:60], expected[:60], result[:60])
+
+    def cold():
+        markup.cache_clear()
+        for text in corpus:
+            convert(text, limit)
+
+    def warm():
+        for text in corpus:
+            convert(text, limit)
+
+    old_s = timeit.timeit(lambda: [old(text, limit) for text in corpus], number=number) / number
+    cold_s = timeit.timeit(cold, number=number) / number
+    warm()
+    warm_s = timeit.timeit(warm, number=number) / number
+
+    per = 1e6 / len(corpus)
+    print(
+        f"{label:<18}{len(corpus):>6}{old_s * per:>11.2f}{cold_s * per:>11.2f}"
+        f"{warm_s * per:>11.2f}{old_s / cold_s:>8.2f}x{old_s / warm_s:>8.0f}x"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="database with a built VNDB tag/trait index")
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    corpora = [
+        ("vndb samples", VNDB_SAMPLES, old_vndb, new("vndb", "NA"), 300),
+        ("anilist samples", ANILIST_SAMPLES, old_anilist, new("anilist", "-"), 400),
+    ]
+    if args.db:
+        index = load_index_corpus(args.db)
+        if index:
+            corpora.append(("vndb index", index, old_vndb, new("vndb", "NA"), 300))
+        else:
+            print(f"No VNDB index in {args.db}, skipping it")
+
+    print(
+        f"{'corpus':<18}{'docs':>6}{'old (µs)':>11}{'cold (µs)':>11}"
+        f"{'memo (µs)':>11}{'cold':>9}{'memo':>9}"
+    )
+    for label, corpus, old, convert, limit in corpora:
+        number = args.number if len(corpus) < 100 else max(1, args.number // 50)
+        bench(label, corpus, old, convert, limit, number)
+    print("µs per description; cold clears the memo before every pass")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,8 +15,13 @@ from dotenv import load_dotenv
 from lightbulb.ext import tasks
 
 from utils.anilist_client import AniListClient
+from utils.botstats import GitInfo, SystemSampler
+from utils.card import CardRenderer
+from utils.emote import EmoteProcessor
 from utils.help import BotHelpCommand
 from utils.misc import dlogger, verbose_timedelta
+from utils.sauce_client import SauceClient
+from utils.vndb_client import VNDBClient
 
 load_dotenv()
 
@@ -101,6 +106,10 @@ async def on_starting(event: hk.StartingEvent) -> None:
         timeout=ClientTimeout(total=10),
     )
     bot.d.anilist = AniListClient(bot.d.aio_session)
+    bot.d.card_renderer = CardRenderer()
+    bot.d.emote_processor = EmoteProcessor()
+    bot.d.sauce = SauceClient(bot.d.aio_session, os.getenv("SAUCENAO_KEY"))
+    bot.d.vndb = VNDBClient(bot.d.aio_session)
     with open("config.json") as f:
         bot.d.config = json.load(f)
     bot.d.timeup = datetime.now().astimezone()
@@ -113,6 +122,12 @@ async def on_starting(event: hk.StartingEvent) -> None:
 
     setup_logging()
 
+    bot.d.sampler = SystemSampler()
+    bot.d.sampler.start()
+    bot.d.git_info = GitInfo()
+    # Kept so the task isn't garbage collected before it finishes
+    bot.d.git_refresh = asyncio.create_task(bot.d.git_info.refresh())
+
 
 @bot.listen()
 async def on_stopping(event: hk.StoppingEvent) -> None:
@@ -122,7 +137,11 @@ async def on_stopping(event: hk.StoppingEvent) -> None:
         bot,
         f"Bot closed with {verbose_timedelta(datetime.now().astimezone()-bot.d.timeup)} uptime",
     )
+    bot.d.sampler.stop()
+    await bot.d.sauce.close()
     await bot.d.aio_session.close()
+    bot.d.card_renderer.close()
+    bot.d.emote_processor.close()
 
 
 @bot.command
@@ -499,11 +499,12 @@ async def _search_studio(ctx: lb.Context, query: str):
             if len(studio_works) == 8:
                 break
 
+        card_ext = "png"
         if studio_works:
-            card_image = await card_maker(studio_works, ctx.bot.d.anilist)
-            image = BytesIO()
-            card_image.save(image, format='PNG')
-            image.seek(0)
+            card, card_ext = await ctx.bot.d.card_renderer.render(
+                studio_works, ctx.bot.d.anilist
+            )
+            image = BytesIO(card)
         else:
             image = BytesIO()
 
@@ -514,7 +515,7 @@ async def _search_studio(ctx: lb.Context, query: str):
                 color=colors.ANILIST,
                 timestamp=datetime.now().astimezone(),
             )
-            .set_image(hk.Bytes(image, 'studio_card.png'))
+            .set_image(hk.Bytes(image, f'studio_card.{card_ext}'))
             .set_footer(
                 text="Source: AniList",
                 icon="https://anilist.co/img/icons/android-chrome-512x512.png",
@@ -594,9 +595,6 @@ def _parse_non_anime_roles(description: str) -> list:
     
     return non_anime_roles
 
-from utils.card import card_maker
-
-
 
 def trim_va_description(description: str) -> str:
     """Specific logic to trim the description for voice actors"""
@@ -644,12 +642,14 @@ async def _search_voiceactor(ctx: lb.Context, query: str):
         # Parse non-anime roles
         non_anime_roles = _parse_non_anime_roles(data.get('description', ''))
         
-        # Get anime roles
+        # Get anime roles, ranked across every page of the staff's characterMedia
         anime_roles = []
-        
+        if data.get('id'):
+            anime_roles = await ALStaff.fetch_character_roles(ctx.bot.d.anilist, data['id'])
+
         characters = data.get('characters', {}).get('nodes', [])
-        
-        if not characters:
+
+        if not anime_roles and not characters:
             await ctx.edit_last_response(
                 content=None,
                 embed=hk.Embed(
@@ -660,20 +660,23 @@ async def _search_voiceactor(ctx: lb.Context, query: str):
                 ),
             )
             return
-        
-        for character in characters:
-            if character.get('image', {}).get('medium') and character.get('media', {}).get('nodes'):
-                media = character['media']['nodes'][0]
-                subtitle = media.get('title', {}).get('english') or media.get('title', {}).get('romaji')
-                if subtitle:
-                    anime_roles.append({
-                        'title': character['name']['full'],
-                        'image': character['image']['medium'],
-                        'subtitle': subtitle,
-                    })
-            if len(anime_roles) == 8:
-                break
-        
+
+        if not anime_roles:
+            for character in characters:
+                if character.get('image', {}).get('medium') and character.get('media', {}).get('nodes'):
+                    media = character['media']['nodes'][0]
+                    subtitle = media.get('title', {}).get('english') or media.get('title', {}).get('romaji')
+                    if subtitle:
+                        anime_roles.append({
+                            'title': character['name']['full'],
+                            'image': character['image']['medium'],
+                            'subtitle': subtitle,
+                        })
+                if len(anime_roles) == 8:
+                    break
+
+        anime_roles = anime_roles[:8]
+
         def build_base_embed() -> hk.Embed:
             emb = (
                 hk.Embed(
@@ -715,19 +718,19 @@ async def _search_voiceactor(ctx: lb.Context, query: str):
 
         embed = build_base_embed()
         
+        # Both card variants are rendered from one shared set of covers
+        renderer = ctx.bot.d.card_renderer
+        covers = await renderer.fetch_covers(anime_roles, ctx.bot.d.anilist) if anime_roles else []
+
         if anime_roles:
-            card_image_4 = await card_maker(anime_roles[:4], ctx.bot.d.anilist)
-            buf4 = BytesIO()
-            card_image_4.save(buf4, format='PNG')
-            embed.set_image(hk.Bytes(buf4.getvalue(), 'va_card_4.png'))
+            card_4, ext_4 = await renderer.render(anime_roles[:4], covers=covers[:4])
+            embed.set_image(hk.Bytes(card_4, f'va_card_4.{ext_4}'))
 
         swap_embed = None
         if len(anime_roles) > 4:
             swap_embed = build_base_embed()
-            card_image_8 = await card_maker(anime_roles[:8], ctx.bot.d.anilist)
-            buf8 = BytesIO()
-            card_image_8.save(buf8, format='PNG')
-            swap_embed.set_image(hk.Bytes(buf8.getvalue(), 'va_card_8.png'))
+            card_8, ext_8 = await renderer.render(anime_roles, covers=covers)
+            swap_embed.set_image(hk.Bytes(card_8, f'va_card_8.{ext_8}'))
 
         view = views.AuthorView(user_id=ctx.author.id)
         if swap_embed:
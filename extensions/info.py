@@ -3,18 +3,14 @@ import io
 import json
 import typing as t
 from datetime import datetime
-from math import floor
-from subprocess import PIPE, Popen
 
 import hikari as hk
 import lightbulb as lb
-import pandas as pd
-import psutil
 from miru.ext import nav
-from PIL import Image, ImageOps
 from rapidfuzz import process
 from rapidfuzz.utils import default_process
 
+from utils.botstats import MemberTotals
 from utils.buttons import (
     AddEmoteButton,
     CustomNextButton,
@@ -22,14 +18,27 @@ from utils.buttons import (
     KillNavButton,
     SwapButton,
 )
+from utils.emote import EMOJI_MAX_BYTES
 from utils.models import ColorPalette as colors
-from utils.misc import is_image
-from utils.views import AuthorNavi, AuthorView
+from utils.errors import EmoteTooLargeError
+from utils.misc import csv_attachment, fetch_image, probe_image
+from utils.role_index import RoleIndex
+from utils.views import AuthorNavi, AuthorView, LazyNavi
 
 info_plugin = lb.Plugin("Utility", "Utility and info commands", include_datastore=True)
 info_plugin.d.help = True
 info_plugin.d.help_emoji = "⚙️"
 info_plugin.d.help_image = "https://i.imgur.com/nsg3lZJ.png"
+info_plugin.d.role_index = RoleIndex()
+info_plugin.d.member_totals = MemberTotals()
+info_plugin.d.application = None
+
+# Member list navigators keep only this many pages either side of the current one
+PAGE_CACHE_WINDOW = 2
+# Images past this aren't downloaded to be turned into emotes
+MAX_EMOTE_SOURCE_BYTES = 16 * 1024 * 1024
+# Who may `-inrole --export` a role's members
+INROLE_EXPORT_CHECK = lb.has_guild_permissions(hk.Permissions.MANAGE_ROLES) | lb.owner_only
 
 
 
@@ -46,67 +55,59 @@ async def inrole_cmd(ctx: lb.Context, role: str) -> None:
         role (str): The role/event
     """
 
-    # Trying to convert it into an int (hk.SnowFlake) basically, if possible
-    try:
-        role = int(role)
-    except ValueError:
-        pass
-
-    if not isinstance(role, hk.Role):
-        if isinstance(role, int):
-            for role_ in ctx.bot.cache.get_roles_view_for_guild(ctx.guild_id).values():
-                if role == role_.id:
-                    role = role_
-                    break
-            else:
-                await ctx.respond("No matching roles found")
-                return
+    roles = role.split()
+    if roles[-1] == "--export":  # Whether to export the data as a csv
+        export = True
+        role = " ".join(roles[:-1])
+    else:
+        export = False
+        role = " ".join(roles)
 
-        elif role[0] == "<":
-            for role_ in ctx.bot.cache.get_roles_view_for_guild(ctx.guild_id).values():
-                if role == role_.mention:
-                    role = role_
-                    break
-            else:
-                await ctx.respond("No matching roles found")
-                return
-        else:
-            guild_roles = {
-                role_.name: role_
-                for role_ in ctx.bot.cache.get_roles_view_for_guild(
-                    ctx.guild_id
-                ).values()
-            }
+    if not role:
+        await ctx.respond("No matching roles found")
+        return
 
-            ans = process.extractOne(
-                role,
-                list(guild_roles.keys()),
-                score_cutoff=85,
-                processor=default_process,
+    if export:
+        try:
+            await INROLE_EXPORT_CHECK(ctx)
+        except lb.CheckFailure:
+            await ctx.respond(
+                "You need the Manage Roles permission to export members",
+                flags=hk.MessageFlag.EPHEMERAL,
             )
+            return
 
-            # Unpacking the closest value, if it exists
-            if ans:
-                closest_role_match, *_ = ans
-
-                role = guild_roles[closest_role_match]
-            else:
-                await ctx.respond("No matching roles found")
-                return
-
-    try:
-        d1, d2 = "", ""
+    index = info_plugin.d.role_index
+    if not index.is_indexed(ctx.guild_id):
+        index.build(
+            ctx.guild_id, ctx.bot.cache.get_members_view_for_guild(ctx.guild_id).values()
+        )
 
-        counter: int = 0
+    # A role id, a mention or (fuzzily) a name
+    role_id = role.strip()
+    if role_id.startswith("<@&") and role_id.endswith(">"):
+        role_id = role_id[3:-1]
 
-        pages = []
+    if role_id.isdigit():
+        role = ctx.bot.cache.get_role(int(role_id))
+        if role is None or role.guild_id != ctx.guild_id:
+            await ctx.respond("No matching roles found")
+            return
+    else:
+        matched_id = index.match_role_name(
+            ctx.guild_id,
+            ctx.bot.cache.get_roles_view_for_guild(ctx.guild_id).values(),
+            role,
+        )
+        role = ctx.bot.cache.get_role(matched_id) if matched_id else None
+        if role is None:
+            await ctx.respond("No matching roles found")
+            return
 
-        for member in ctx.bot.cache.get_members_view_for_guild(ctx.guild_id).values():
-            if role.id in member.role_ids:
-                d1 += f"{member.id: <20}\n"
-                username = member.username.replace("_", r"\_")
-                d2 += f"{username}\n"
-                counter += 1
+    try:
+        # Just the ids, members are looked up when their page is shown
+        member_ids = sorted(index.members_with(ctx.guild_id, role.id))
+        counter = len(member_ids)
 
         if not counter:
             await ctx.respond(
@@ -119,30 +120,46 @@ async def inrole_cmd(ctx: lb.Context, role: str) -> None:
 
             return
 
-        mem_ids = [
-            d1.split("\n")[i : i + 20] for i in range(0, len(d1.split("\n")), 20)
-        ]
-        mem_names = [
-            d2.split("\n")[i : i + 20] for i in range(0, len(d2.split("\n")), 20)
-        ]
+        if export:
+            rows = (
+                (member_id, member.username if member else "-")
+                for member_id in member_ids
+                for member in (ctx.bot.cache.get_member(ctx.guild_id, member_id),)
+            )
+            await ctx.respond(
+                await csv_attachment("role.csv", ("User IDs", "User Names"), rows)
+            )
+            return
 
-        for i, item in enumerate(mem_ids):
-            pages.append(
+        async def build_page(page: int) -> hk.Embed:
+            chunk = member_ids[page * 20 : (page + 1) * 20]
+            names = []
+            for member_id in chunk:
+                member = ctx.bot.cache.get_member(ctx.guild_id, member_id)
+                names.append(member.username.replace("_", r"\_") if member else "-")
+            return (
                 hk.Embed(
                     title=f"List of users in {role.name} role ({counter})",
                     timestamp=datetime.now().astimezone(),
                     color=role.color or 0xFFFFFF,
                 )
                 .set_thumbnail(role.icon_url)
-                .add_field("UID", "\n".join(item), inline=True)
-                .add_field("Name", "\n".join(mem_names[i]), inline=True)
+                .add_field("UID", "\n".join(map(str, chunk)), inline=True)
+                .add_field("Name", "\n".join(names), inline=True)
             )
 
-        if len(pages) == 1:
-            await ctx.respond(pages[0])
+        page_count = -(-counter // 20)
+        if page_count == 1:
+            await ctx.respond(await build_page(0))
             return
 
-        view = AuthorNavi(pages=pages, user_id=ctx.author.id, buttons="default")
+        view = LazyNavi(
+            page_count=page_count,
+            page_builder=build_page,
+            buttons="default",
+            user_id=ctx.author.id,
+            cache_window=PAGE_CACHE_WINDOW,
+        )
 
         await view.send(ctx.channel_id)
         return
@@ -186,10 +203,7 @@ async def inevent_cmd(ctx: lb.Context, event: str):
                     event_ = event
                     break
         else:
-            guild_events = {
-                event.name: event
-                for event in await ctx.bot.rest.fetch_scheduled_events(ctx.guild_id)
-            }
+            guild_events = {event.name: event for event in events}
 
             ans = process.extractOne(
                 probable_event,
@@ -208,27 +222,21 @@ async def inevent_cmd(ctx: lb.Context, event: str):
             await ctx.respond("No matching events found")
             return
 
-        event_members = []
-        members = list(
-            await ctx.bot.rest.fetch_scheduled_event_users(ctx.guild_id, event_)
-        )
+        # Paged by hikari as it's iterated, nothing is collected up front
+        event_users = ctx.bot.rest.fetch_scheduled_event_users(ctx.guild_id, event_)
 
         if not export:
-            for member in members:
-                if member.member:
-                    event_members.append(
-                        f"`{member.member.id: <19}`  {member.member.username}"
-                    )
-
-            paginated_members = [
-                event_members[i : i + 20] for i in range(0, len(event_members), 20)
+            event_members = [
+                (user.member.id, user.member.username)
+                async for user in event_users
+                if user.member
             ]
-            pages = []
+            counter = len(event_members)
 
             if not event_members:
                 await ctx.respond(
                     hk.Embed(
-                        title=f"List of users interested in {event_.name} ({len(event_members)})",
+                        title=f"List of users interested in {event_.name} ({counter})",
                         timestamp=datetime.now().astimezone(),
                         color=colors.DEFAULT,
                     ).set_image(event_.image_url)
@@ -236,39 +244,47 @@ async def inevent_cmd(ctx: lb.Context, event: str):
 
                 return
 
-            for item in paginated_members:
-                pages.append(
+            async def build_page(page: int) -> hk.Embed:
+                return (
                     hk.Embed(
-                        title=f"List of users interested in {event_.name} ({len(event_members)})",
+                        title=f"List of users interested in {event_.name} ({counter})",
                         timestamp=datetime.now().astimezone(),
                         color=colors.DEFAULT,
                     )
                     .set_image(event_.image_url)
-                    .add_field("\u200B", "\n".join(item))
+                    .add_field(
+                        "\u200B",
+                        "\n".join(
+                            f"`{member_id: <19}`  {username}"
+                            for member_id, username in event_members[page * 20 : (page + 1) * 20]
+                        ),
+                    )
                 )
 
-            if len(pages) == 1:
-                await ctx.respond(pages[0])
+            page_count = -(-counter // 20)
+            if page_count == 1:
+                await ctx.respond(await build_page(0))
                 return
 
-            view = AuthorNavi(pages=pages, user_id=ctx.author.id, buttons="default")
+            view = LazyNavi(
+                page_count=page_count,
+                page_builder=build_page,
+                buttons="default",
+                user_id=ctx.author.id,
+                cache_window=PAGE_CACHE_WINDOW,
+            )
             await view.send(ctx.channel_id)
 
         else:
             try:
-                mem_ids, mem_names = [], []
-                for member in members:
-                    if member.member:
-                        mem_ids.append(member.member.id)
-                        mem_names.append(member.member.username)
-
-                test_bytes = io.BytesIO()
-
-                pd.DataFrame({"User IDs": mem_ids, "User Names": mem_names}).to_csv(
-                    test_bytes, index=False
+                rows = (
+                    (user.member.id, user.member.username)
+                    async for user in event_users
+                    if user.member
+                )
+                await ctx.respond(
+                    await csv_attachment("event.csv", ("User IDs", "User Names"), rows)
                 )
-
-                await ctx.respond(hk.Bytes(test_bytes.getvalue(), "event.csv"))
 
             except Exception as e:
                 await ctx.respond(f"Erra: {e}")
@@ -427,67 +443,44 @@ async def add_emote(
         if not check_if_known_emoji_provider(emote):
             return await ctx.respond("Unknown Emote Provider ⚠")
 
-        image_type = await is_image(
-            emote, ctx.bot.d.aio_session
-        )  # 1 if PIL friendly image, 2 if not, 0 if not image
+        info = await probe_image(emote, ctx.bot.d.aio_session)
 
-        if not image_type:
+        if info is None or info.format not in ("png", "jpeg", "webp", "gif"):
             await ctx.respond("Invalid image url")
             return
 
-        elif image_type == 2:
-            try:
-                emoji = await ctx.bot.rest.create_emoji(
-                    ctx.guild_id, name=name, image=emote
-                )
-                await ctx.respond(f"Added emote: {emoji.mention}")
-
-            except hk.RateLimitTooLongError:
-                await ctx.respond("Rate limit hit. Please try again shortly.")
-
-            except hk.BadRequestError:
-                # Reason being server emotes full or invalid value
-                await ctx.respond("Can't add this emote")
-
-            except hk.InternalServerError:
-                await ctx.respond("Discord went buggy oops")
-
-        elif image_type == 1:
-            try:
-                async with ctx.bot.d.aio_session.get(emote) as resp:
-                    img_bytes = await resp.read()
-
-                    ratio = len(img_bytes) / (1024 * 256)
-
-                    if ratio > 1:
-                        await ctx.respond(
-                            "Image size possibly too large, attempting compression..."
-                        )
-
-                        im = Image.open(io.BytesIO(img_bytes))
-                        im = ImageOps.contain(im, (128, 128), Image.Resampling.LANCZOS)
-
-                        new_pixels = io.BytesIO()
-                        im.save(new_pixels, format="PNG", optimize=True)
-                        emote = new_pixels.getvalue()
+        img_bytes = None
+        if info.size is None or info.size <= MAX_EMOTE_SOURCE_BYTES:
+            img_bytes = await fetch_image(
+                emote, ctx.bot.d.aio_session, info, max_bytes=MAX_EMOTE_SOURCE_BYTES
+            )
+        if img_bytes is None:
+            await ctx.respond("Image is too large to add")
+            return
 
-                    else:
-                        pass
+        try:
+            if len(img_bytes) > EMOJI_MAX_BYTES:
+                await ctx.respond("Image size possibly too large, attempting compression...")
+            img_bytes, extension = await ctx.bot.d.emote_processor.process(img_bytes)
+        except EmoteTooLargeError:
+            await ctx.respond("Couldn't get the emote under Discord's 256KB limit")
+            return
 
-                emoji = await ctx.bot.rest.create_emoji(
-                    ctx.guild_id, name=name, image=emote
-                )
-                await ctx.respond(f"Added emote: {emoji.mention}")
+        try:
+            emoji = await ctx.bot.rest.create_emoji(
+                ctx.guild_id, name=name, image=hk.Bytes(img_bytes, f"{name}.{extension}")
+            )
+            await ctx.respond(f"Added emote: {emoji.mention}")
 
-            except hk.RateLimitTooLongError:
-                await ctx.respond("Rate limit hit. Please try again shortly.")
+        except hk.RateLimitTooLongError:
+            await ctx.respond("Rate limit hit. Please try again shortly.")
 
-            except hk.BadRequestError:
-                # Reason being server emotes full or invalid value
-                await ctx.respond("Can't add this emote")
+        except hk.BadRequestError:
+            # Reason being server emotes full or invalid value
+            await ctx.respond("Can't add this emote")
 
-            except hk.InternalServerError:
-                await ctx.respond("Discord went buggy oops")
+        except hk.InternalServerError:
+            await ctx.respond("Discord went buggy oops")
 
     except Exception as e:
         await ctx.respond(f"Error: {e}")
@@ -600,41 +593,22 @@ async def botinfo(ctx: lb.Context) -> None:
 
     try:
         user = ctx.bot.get_me()
-        data = await ctx.bot.rest.fetch_application()
-        guilds = list(ctx.bot.cache.get_guilds_view().values())
-
-        member = 0
-        for guild in list(ctx.bot.cache.get_members_view()):
-            guild_obj = ctx.bot.cache.get_guild(guild)
-            member = member + guild_obj.member_count
-
-        process = Popen(
-            "git rev-list --count main",
-            text=True,
-            shell=True,
-            stdout=PIPE,
-            stderr=PIPE,
-        )
-        num_commits, _ = process.communicate()
-
-        num_commits = int(num_commits)
-
-        process = Popen(
-            'git log -5 --format="<t:%at:D>: %s"',
-            text=True,
-            shell=True,
-            stdout=PIPE,
-            stderr=PIPE,
+        # Only the owner is shown, which doesn't change while running
+        if info_plugin.d.application is None:
+            info_plugin.d.application = await ctx.bot.rest.fetch_application()
+        data = info_plugin.d.application
+
+        totals = info_plugin.d.member_totals
+        if not totals:
+            # Reloaded after the guilds arrived, count the cache once
+            for guild in ctx.bot.cache.get_guilds_view().values():
+                totals.set_guild(guild.id, guild.member_count)
+
+        sampler = ctx.bot.d.sampler
+        git_info = ctx.bot.d.git_info
+        changes = "\n".join(
+            f"{i+1}. {item}" for i, item in enumerate(git_info.changelog)
         )
-        changes, _ = process.communicate()
-
-        change_list: t.List[str] = [
-            f"{i+1}. {item}" for i, item in enumerate(changes.split("\n")[:5])
-        ]
-
-        changes = "\n".join(change_list)
-
-        version = f"0.{floor(num_commits/100)}.{floor((num_commits%100)/10)}"
 
         pages = [
             hk.Embed(
@@ -643,9 +617,9 @@ async def botinfo(ctx: lb.Context) -> None:
                     written in hikari-py.\n\nPrimarily made for the Oshi no Ko discord server.",
             )
             .add_field("Name", user)
-            .add_field("No of Servers", len(guilds), inline=True)
-            .add_field("No of Members", member, inline=True)
-            .add_field("Version", version)
+            .add_field("No of Servers", len(ctx.bot.cache.get_guilds_view()), inline=True)
+            .add_field("No of Members", totals.total, inline=True)
+            .add_field("Version", git_info.version)
             .add_field(
                 "Alive since", f"<t:{int(user.created_at.timestamp())}:R>", inline=True
             )
@@ -656,7 +630,9 @@ async def botinfo(ctx: lb.Context) -> None:
             )
             .add_field(
                 "System Usage",
-                f"RAM: {psutil.virtual_memory()[2]}% (of 512MB) \nCPU: {psutil.cpu_percent(4)}%",
+                f"RAM: {sampler.memory_percent}% (of 512MB), bot: {sampler.rss / 2**20:.0f}MB"
+                f"\nCPU: {sampler.cpu_percent:.1f}%"
+                f"\nLoop lag: {sampler.loop_lag*1000:.1f}ms (max {sampler.max_loop_lag*1000:.1f}ms)",
             )
             .set_author(name=f"{user.username} Bot")
             .set_thumbnail(user.avatar_url)
@@ -920,6 +896,72 @@ async def emote_removal(
             await ctx.respond(f"Error: {e}")
 
 
+# Keep the -inrole index and the -botinfo member count in step with the gateway
+
+
+@info_plugin.listener(hk.MemberCreateEvent)
+async def on_member_create(event: hk.MemberCreateEvent) -> None:
+    info_plugin.d.role_index.set_member(event.guild_id, event.member.id, event.member.role_ids)
+    info_plugin.d.member_totals.add(event.guild_id, 1)
+
+
+@info_plugin.listener(hk.MemberUpdateEvent)
+async def on_member_update(event: hk.MemberUpdateEvent) -> None:
+    info_plugin.d.role_index.set_member(event.guild_id, event.member.id, event.member.role_ids)
+
+
+@info_plugin.listener(hk.MemberDeleteEvent)
+async def on_member_delete(event: hk.MemberDeleteEvent) -> None:
+    info_plugin.d.role_index.remove_member(event.guild_id, event.user_id)
+    info_plugin.d.member_totals.add(event.guild_id, -1)
+
+
+@info_plugin.listener(hk.MemberChunkEvent)
+async def on_member_chunk(event: hk.MemberChunkEvent) -> None:
+    index = info_plugin.d.role_index
+    for member in event.members.values():
+        index.set_member(event.guild_id, member.id, member.role_ids)
+
+
+@info_plugin.listener(hk.RoleCreateEvent)
+async def on_role_create(event: hk.RoleCreateEvent) -> None:
+    info_plugin.d.role_index.invalidate_names(event.guild_id)
+
+
+@info_plugin.listener(hk.RoleUpdateEvent)
+async def on_role_update(event: hk.RoleUpdateEvent) -> None:
+    info_plugin.d.role_index.invalidate_names(event.guild_id)
+
+
+@info_plugin.listener(hk.RoleDeleteEvent)
+async def on_role_delete(event: hk.RoleDeleteEvent) -> None:
+    info_plugin.d.role_index.remove_role(event.guild_id, event.role_id)
+
+
+@info_plugin.listener(hk.GuildLeaveEvent)
+async def on_guild_leave(event: hk.GuildLeaveEvent) -> None:
+    info_plugin.d.role_index.drop_guild(event.guild_id)
+    info_plugin.d.member_totals.drop_guild(event.guild_id)
+
+
+@info_plugin.listener(hk.GuildAvailableEvent)
+async def on_guild_available(event: hk.GuildAvailableEvent) -> None:
+    info_plugin.d.member_totals.set_guild(event.guild_id, event.guild.member_count)
+    # Joins and leaves during an outage were missed, start over from the cache
+    index = info_plugin.d.role_index
+    if index.is_indexed(event.guild_id):
+        index.build(
+            event.guild_id,
+            event.app.cache.get_members_view_for_guild(event.guild_id).values(),
+        )
+        index.invalidate_names(event.guild_id)
+
+
+@info_plugin.listener(hk.GuildJoinEvent)
+async def on_guild_join(event: hk.GuildJoinEvent) -> None:
+    info_plugin.d.member_totals.set_guild(event.guild_id, event.guild.member_count)
+
+
 def load(bot: lb.BotApp) -> None:
     """Load the plugin"""
     bot.add_plugin(info_plugin)
@@ -1,17 +1,18 @@
 """Search the source of a given image"""
 
 
-import os
+import asyncio
+import functools
 import re
+import time
 import traceback
 import typing as t
+from collections import OrderedDict
 from datetime import datetime
 from urllib.parse import quote
 
-import dotenv
 import hikari as hk
 import lightbulb as lb
-import miru
 from miru.ext import nav
 
 from utils.anilist import ALManga
@@ -24,22 +25,23 @@ from utils.buttons import (
     SwapNaviButton
 )
 from utils.checks import trusted_user_check
+from utils.errors import QuotaExceededError, TransportError
+from utils.id_map import AniListIdMap
 from utils.models import ColorPalette as colors
 from utils.models import EmoteCollection as emotes
+from utils.sauce_cache import SauceCache, image_hashes
 from utils.misc import (
     check_if_url,
+    ImageInfo,
     dlogger,
+    fetch_image,
     get_random_quote,
-    is_image,
     iso_to_timestamp,
-    poor_mans_proxy,
+    probe_image,
     tenor_link_from_gif
 )
-from utils.views import AuthorNavi, AuthorView
-
-dotenv.load_dotenv()
-
-SAUCENAO_KEY = os.getenv("SAUCENAO_KEY")
+from utils.video import best_frame, iter_url
+from utils.views import AuthorNavi, AuthorView, LazyNavi
 
 sauce_plugin = lb.Plugin(
     "Sauce", "Finding the source of an image", include_datastore=True
@@ -51,7 +53,6 @@ sauce_plugin.d.help = True
 
 @sauce_plugin.command
 @lb.add_cooldown(length=86400, uses=7, bucket=lb.UserBucket)
-@lb.add_cooldown(length=86400, uses=10, bucket=lb.GuildBucket)
 @lb.command("User pfp Sauce", "Sauce of user pfp", auto_defer=True, ephemeral=True)
 @lb.implements(lb.UserCommand)
 async def pfp_sauce(ctx: lb.UserContext):
@@ -67,57 +68,51 @@ async def pfp_sauce(ctx: lb.UserContext):
         await ctx.respond(url["errorMessage"])
         return
 
-    params = {
-        "api_key": SAUCENAO_KEY,
-        "output_type": 2,
-        "numres": 5,
-        "url": url["url"],
-    }
+    try:
+        res = await _sauce_search(
+            "saucenao", url["url"], bucket=ctx.guild_id or ctx.author.id
+        )
+    except QuotaExceededError as e:
+        await ctx.respond(_quota_message(e))
+        return
+    except TransportError as e:
+        await ctx.respond(f"Ran into en error, `{e}`")
+        return
 
-    async with ctx.bot.d.aio_session.get(
-        "https://saucenao.com/search.php?", params=params
-    ) as res:
-        if res.ok:
-            res = await res.json()
-
-            if res["header"]["status"] < 0:
-                await ctx.respond(f"Error: {res['header']['message']}")
-                return
-
-            try:
-                embed, view = await _complex_parsing(ctx, res["results"][0])
-                if float(res["results"][0]["header"]["similarity"]) < 60.0:
-                    # url["url"] = url["url"].split("?")[0]
-                    view.add_item(
-                        GenericButton(
-                            url=f"https://yandex.com/images/search?url={quote(url['url'])}&rpt=imageview",
-                            label="Search Yandex",
-                        )
-                    )
-                await ctx.respond(
-                    content=f"User: {ctx.options.target.mention}",
-                    embed=embed,
-                    components=view,
-                )
-            except Exception:
-                embed, view = await _simple_parsing(ctx, res["results"][0])
-                await ctx.respond(
-                    embed=embed,
-                    components=view,
-                )
-                await dlogger(
-                    ctx.bot, f"Sauce parser failed, json returned: ```{res}```"
-                )
+    if res["header"]["status"] < 0:
+        await ctx.respond(f"Error: {res['header']['message']}")
+        return
 
-        else:
-            await ctx.respond(f"Ran into en error, `code : {res.status}`")
+    try:
+        embed, view = await _complex_parsing(ctx, res["results"][0])
+        if float(res["results"][0]["header"]["similarity"]) < 60.0:
+            # url["url"] = url["url"].split("?")[0]
+            view.add_item(
+                GenericButton(
+                    url=f"https://yandex.com/images/search?url={quote(url['url'])}&rpt=imageview",
+                    label="Search Yandex",
+                )
+            )
+        await ctx.respond(
+            content=f"User: {ctx.options.target.mention}",
+            embed=embed,
+            components=view,
+        )
+    except Exception:
+        embed, view = await _simple_parsing(ctx, res["results"][0])
+        await ctx.respond(
+            embed=embed,
+            components=view,
+        )
+        await dlogger(
+            ctx.bot, f"Sauce parser failed, json returned: ```{res}```"
+        )
 
 
 @sauce_plugin.command
-@lb.set_max_concurrency(1, lb.GlobalBucket)
+@lb.set_max_concurrency(1, lb.UserBucket)
 @lb.add_checks(trusted_user_check)
 @lb.add_cooldown(length=86400, uses=10, bucket=lb.UserBucket)
-@lb.add_cooldown(length=86400, uses=20, bucket=lb.GuildBucket)
 @lb.command("Video Sauce", "Search the sauce of video", auto_defer=True)
 @lb.implements(lb.MessageCommand)
 async def find_video_sacue(ctx: lb.MessageContext):
@@ -127,131 +122,104 @@ async def find_video_sacue(ctx: lb.MessageContext):
         ctx (lb.MessageContext): The context the command is invoked in
     """
 
-    if ctx.options["target"].attachments:
-        vid_url = ctx.options["target"].attachments[0].url
-
-    print("Video URL: ", vid_url)
-
-    vid_bytes = await poor_mans_proxy(vid_url, ctx.bot.d.aio_session)
-
-    print("Video Bytes")
-
-    # To save the bytes to memory
-    with open("temp.mp4", "wb") as f:
-        f.write(vid_bytes.read())
+    if not ctx.options["target"].attachments:
+        await ctx.respond(f"There's no video here to find the sauce of {emotes.SIP.value}")
+        return
 
-    print("Written to filesystem")
+    vid_url = ctx.options["target"].attachments[0].url
 
-    os.system("ffmpeg -i temp.mp4 -vf fps=1 temp.jpg")
+    try:
+        frame = await best_frame(iter_url(ctx.bot.d.aio_session, vid_url))
+    except Exception:
+        await dlogger(
+            ctx.bot, f"Frame extraction failed: ```{traceback.format_exc()}```"
+        )
+        frame = None
 
-    print("Converted to image")
+    if frame is None:
+        await ctx.respond("Couldn't get a frame out of that video")
+        return
 
-    msg = await ctx.respond(attachments=["temp.jpg"])
-    message = await msg.message()
-    link = message.attachments[0].url
+    try:
+        res = await _sauce_search(
+            "saucenao", image=frame, bucket=ctx.guild_id or ctx.author.id
+        )
+    except QuotaExceededError as e:
+        await ctx.respond(_quota_message(e))
+        return
+    except TransportError as e:
+        await ctx.respond(f"Ran into en error, `{e}`")
+        return
 
-    # await msg.delete()
+    if res["header"]["status"] < 0:
+        await ctx.respond(f"Error: {res['header']['message']}")
+        return
 
-    params = {
-        "api_key": SAUCENAO_KEY,
-        "output_type": 2,
-        "numres": 5,
-        "url": link,
-    }
+    try:
+        embed, view = await _complex_parsing(ctx, res["results"][0])
 
-    async with ctx.bot.d.aio_session.get(
-        "https://saucenao.com/search.php?", params=params
-    ) as res:
-        if res.ok:
-            res = await res.json()
-
-            if res["header"]["status"] < 0:
-                await ctx.edit_last_response(f"Error: {res['header']['message']}")
-                return
-
-            try:
-                embed, view = await _complex_parsing(ctx, res["results"][0])
-
-                if float(res["results"][0]["header"]["similarity"]) < 60.0:
-                    await msg.delete()
-                    view = AuthorNavi(
-                        pages=[
-                            nav.Page(
-                                content=ctx.options.target.make_link(ctx.guild_id),
-                                embed=hk.Embed(
-                                    title="Possible false match",
-                                    description=(
-                                        "We might have encountered a false match."
-                                        "\n\nFalse matches often contain NSFW matches or "
-                                        "in rarer cases, what you're actually looking for."
-                                        "\nPlease use the ❌ or Go Back button should that happen."
-                                    ),
-                                    color=colors.WARN,
-                                    timestamp=datetime.now().astimezone(),
-                                ),
-                            ),
-                            nav.Page(
-                                content=ctx.options.target.make_link(ctx.guild_id),
-                                embed=embed,
-                            ),
-                        ],
-                        buttons=[
-                            SwapNaviButton(
-                                labels=["Show anyway", "Go Back"],
-                                emojis=[
-                                    None,
-                                    hk.Emoji.parse("<:previous:1136984315415236648>"),
-                                ],
-                            ),
-                            NavButton(
-                                url=f"https://yandex.com/images/search?url={quote(link)}&rpt=imageview",
-                                label="Search Yandex",
+        if float(res["results"][0]["header"]["similarity"]) < 60.0:
+            view = AuthorNavi(
+                pages=[
+                    nav.Page(
+                        content=ctx.options.target.make_link(ctx.guild_id),
+                        embed=hk.Embed(
+                            title="Possible false match",
+                            description=(
+                                "We might have encountered a false match."
+                                "\n\nFalse matches often contain NSFW matches or "
+                                "in rarer cases, what you're actually looking for."
+                                "\nPlease use the ❌ or Go Back button should that happen."
                             ),
-                            KillNavButton(style=hk.ButtonStyle.SECONDARY),
-                        ],
-                        user_id=ctx.author.id,
-                    )
-                    await view.send(ctx.interaction, responded=True)
-
-                else:
-                    # view.
-                    view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
-                    view.clean_items = False
-
-                    choice = await ctx.edit_last_response(
+                            color=colors.WARN,
+                            timestamp=datetime.now().astimezone(),
+                        ),
+                    ),
+                    nav.Page(
                         content=ctx.options.target.make_link(ctx.guild_id),
                         embed=embed,
-                        components=view,
-                        attachments=None,
-                    )
+                    ),
+                ],
+                buttons=[
+                    SwapNaviButton(
+                        labels=["Show anyway", "Go Back"],
+                        emojis=[
+                            None,
+                            hk.Emoji.parse("<:previous:1136984315415236648>"),
+                        ],
+                    ),
+                    KillNavButton(style=hk.ButtonStyle.SECONDARY),
+                ],
+                user_id=ctx.author.id,
+            )
+            await view.send(ctx.interaction, responded=True)
 
-                    await view.start(choice)
-                    await view.wait()
-            except Exception as e:
-                await dlogger(
-                    ctx.bot, f"Sauce parser failed, json returned: ```{res}```"
-                )
-                embed, view = await _simple_parsing(ctx, res["results"][0])
-                view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
-                view.clean_items = False
-                choice = await ctx.edit_last_response(
-                    embed=embed, components=view, attachments=None
-                )
-                # await ctx.respond(e)
-                await view.start(choice)
-                await view.wait()
         else:
-            await ctx.respond(f"Ran into en error, `code : {res.status}`")
+            view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
+            view.clean_items = False
 
-    os.remove("temp.mp4")
-    os.remove("temp.jpg")
+            choice = await ctx.edit_last_response(
+                content=ctx.options.target.make_link(ctx.guild_id),
+                embed=embed,
+                components=view,
+            )
 
-    # ctx.get_channel()
+            await view.start(choice)
+            await view.wait()
+    except Exception:
+        await dlogger(
+            ctx.bot, f"Sauce parser failed, json returned: ```{res}```"
+        )
+        embed, view = await _simple_parsing(ctx, res["results"][0])
+        view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
+        view.clean_items = False
+        choice = await ctx.edit_last_response(embed=embed, components=view)
+        await view.start(choice)
+        await view.wait()
 
 
 @sauce_plugin.command
 @lb.add_cooldown(length=86400, uses=10, bucket=lb.UserBucket)
-@lb.add_cooldown(length=86400, uses=20, bucket=lb.GuildBucket)
 @lb.command("Find the Sauce", "Search the sauce of the image", auto_defer=False)
 @lb.implements(lb.MessageCommand)
 async def find_sauce_menu(ctx: lb.MessageContext):
@@ -271,97 +239,99 @@ async def find_sauce_menu(ctx: lb.MessageContext):
         await ctx.respond(url["errorMessage"])
         return
 
-    params = {
-        "api_key": SAUCENAO_KEY,
-        "output_type": 2,
-        "numres": 5,
-        "url": link,
-    }
+    if len(url["urls"]) > 1:
+        await _sauce_many(ctx, url["urls"], message_link)
+        return
 
-    async with ctx.bot.d.aio_session.get(
-        "https://saucenao.com/search.php?", params=params
-    ) as res:
-        if res.ok:
-            res = await res.json()
-
-            if res["header"]["status"] < 0:
-                await ctx.respond(f"Error: {res['header']['message']}")
-                return
-
-            try:
-                embed, view = await _complex_parsing(ctx, res["results"][0])
-
-                if float(res["results"][0]["header"]["similarity"]) < 60.0:
-                    view = AuthorNavi(
-                        pages=[
-                            nav.Page(
-                                content=message_link,
-                                embed=hk.Embed(
-                                    title="Possible false match",
-                                    description=(
-                                        "We might have encountered a false match."
-                                        "\n\nFalse matches often contain NSFW matches or "
-                                        "in rarer cases, what you're actually looking for."
-                                        "\nPlease use the ❌ or Go Back button should that happen."
-                                    ),
-                                    color=colors.WARN,
-                                    timestamp=datetime.now().astimezone(),
-                                ),
-                            ),
-                            nav.Page(
-                                content=message_link,
-                                embed=embed,
-                            ),
-                        ],
-                        buttons=[
-                            SwapNaviButton(
-                                labels=["Show anyway", "Go Back"],
-                                emojis=[
-                                    None,
-                                    hk.Emoji.parse("<:previous:1136984315415236648>"),
-                                ],
-                            ),
-                            NavButton(
-                                url=f"https://yandex.com/images/search?url={quote(url['url'])}&rpt=imageview",
-                                label="Search Yandex",
-                            ),
-                            KillNavButton(style=hk.ButtonStyle.SECONDARY),
-                        ],
-                        user_id=ctx.author.id,
-                    )
-                    await view.send(ctx, responded=True)
+    try:
+        res = await _sauce_search(
+            "saucenao", link, bucket=ctx.guild_id or ctx.author.id
+        )
+    except QuotaExceededError as e:
+        await ctx.respond(_quota_message(e))
+        return
+    except TransportError as e:
+        await ctx.respond(f"Ran into en error, `{e}`")
+        return
 
-                else:
-                    view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
-                    view.clean_items = False
-                    choice = await ctx.respond(
+    if res["header"]["status"] < 0:
+        await ctx.respond(f"Error: {res['header']['message']}")
+        return
+
+    try:
+        embed, view = await _complex_parsing(ctx, res["results"][0])
+
+        if float(res["results"][0]["header"]["similarity"]) < 60.0:
+            view = AuthorNavi(
+                pages=[
+                    nav.Page(
+                        content=message_link,
+                        embed=hk.Embed(
+                            title="Possible false match",
+                            description=(
+                                "We might have encountered a false match."
+                                "\n\nFalse matches often contain NSFW matches or "
+                                "in rarer cases, what you're actually looking for."
+                                "\nPlease use the ❌ or Go Back button should that happen."
+                            ),
+                            color=colors.WARN,
+                            timestamp=datetime.now().astimezone(),
+                        ),
+                    ),
+                    nav.Page(
                         content=message_link,
                         embed=embed,
-                        components=view,
-                    )
-                    await view.start(choice)
-                    await view.wait()
-            except Exception as e:
-                await dlogger(
-                    ctx.bot, f"Sauce parser failed, json returned: ```{res}```"
-                )
-                embed, view = await _simple_parsing(ctx, res["results"][0])
-                view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
-                choice = await ctx.respond(embed=embed, components=view)
-                # await ctx.respond(e)
-                await view.start(choice)
-                await view.wait()
+                    ),
+                ],
+                buttons=[
+                    SwapNaviButton(
+                        labels=["Show anyway", "Go Back"],
+                        emojis=[
+                            None,
+                            hk.Emoji.parse("<:previous:1136984315415236648>"),
+                        ],
+                    ),
+                    NavButton(
+                        url=f"https://yandex.com/images/search?url={quote(url['url'])}&rpt=imageview",
+                        label="Search Yandex",
+                    ),
+                    KillNavButton(style=hk.ButtonStyle.SECONDARY),
+                ],
+                user_id=ctx.author.id,
+            )
+            await view.send(ctx, responded=True)
+
         else:
-            await ctx.respond(f"Ran into en error, `code : {res.status}`")
+            view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
+            view.clean_items = False
+            choice = await ctx.respond(
+                content=message_link,
+                embed=embed,
+                components=view,
+            )
+            await view.start(choice)
+            await view.wait()
+    except Exception as e:
+        await dlogger(
+            ctx.bot, f"Sauce parser failed, json returned: ```{res}```"
+        )
+        embed, view = await _simple_parsing(ctx, res["results"][0])
+        view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
+        choice = await ctx.respond(embed=embed, components=view)
+        # await ctx.respond(e)
+        await view.start(choice)
+        await view.wait()
 
 
 @sauce_plugin.command
-@lb.set_help("**Find the source of an image using SauceNAO (default) or Trace.Moe**")
+@lb.set_help(
+    "**Find the source of an image using SauceNAO (default), Trace.Moe or both**"
+)
 @lb.option(
     "service",
     "The service to use to search for it",
     required=False,
-    choices=["SauceNAO", "TraceMoe"],
+    choices=["SauceNAO", "TraceMoe", "Both"],
 )
 @lb.option(
     "link",
@@ -390,73 +360,67 @@ async def find_sauce(
         await ctx.edit_last_response(url["errorMessage"])
         return
 
-    params = {"api_key": SAUCENAO_KEY, "output_type": 2, "numres": 5, "url": link}
+    if service == "Both":
+        await _merged_sauce(ctx, link)
+        return
 
     if service != "TraceMoe":
-        res = await ctx.bot.d.aio_session.get(
-            "https://saucenao.com/search.php?", params=params
-        )
-        if res.ok:
-            res = await res.json()
-
-            if res["header"]["status"] < 0:
-                await ctx.edit_last_response(f"Error: {res['header']['message']}")
-                return
-
-            data = res["results"][0]
-            try:
-                embed, view = await _complex_parsing(ctx, data)
-                if float(data["header"]["similarity"]) < 60.0:
-                    disp_embed = hk.Embed(
-                        title="Possible false match",
-                        description=(
-                            "We might have encountered a false match."
-                            "\n\nFalse matches often contain NSFW matches or "
-                            "in rarer cases, what you're actually looking for."
-                            "\nPlease use the ❌ or Go Back button should that happen."
-                        ),
-                        color=colors.WARN,
-                        timestamp=datetime.now().astimezone(),
-                    )
-                    view = AuthorView(user_id=ctx.author.id)
-                    view.add_item(
-                        SwapButton(
-                            label1="Show anyway",
-                            label2="Go Back",
-                            emoji1=hk.Emoji.parse("<:next:1136984292921200650>"),
-                            emoji2=hk.Emoji.parse("<:previous:1136984315415236648>"),
-                            original_page=disp_embed,
-                            swap_page=embed,
-                        )
-                    )
-                    # url["url"] = url["url"].split("?")[0]
-                    view.add_item(
-                        GenericButton(
-                            url=f"https://yandex.com/images/search?url={quote(url['url'])}&rpt=imageview",
-                            label="Search Yandex",
-                        )
-                    )
-                    view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
-                    choice = await ctx.edit_last_response(
-                        content=None, embed=disp_embed, components=view
+        try:
+            res = await _sauce_search(
+                "saucenao", link, bucket=ctx.guild_id or ctx.author.id
+            )
+        except QuotaExceededError as e:
+            await ctx.edit_last_response(_quota_message(e))
+            return
+        except TransportError as e:
+            await ctx.edit_last_response(f"Ran into en error, `{e}`")
+            return
+
+        if res["header"]["status"] < 0:
+            await ctx.edit_last_response(f"Error: {res['header']['message']}")
+            return
+
+        data = res["results"][0]
+        try:
+            embed, view = await _complex_parsing(ctx, data)
+            if float(data["header"]["similarity"]) < 60.0:
+                disp_embed = hk.Embed(
+                    title="Possible false match",
+                    description=(
+                        "We might have encountered a false match."
+                        "\n\nFalse matches often contain NSFW matches or "
+                        "in rarer cases, what you're actually looking for."
+                        "\nPlease use the ❌ or Go Back button should that happen."
+                    ),
+                    color=colors.WARN,
+                    timestamp=datetime.now().astimezone(),
+                )
+                view = AuthorView(user_id=ctx.author.id)
+                view.add_item(
+                    SwapButton(
+                        label1="Show anyway",
+                        label2="Go Back",
+                        emoji1=hk.Emoji.parse("<:next:1136984292921200650>"),
+                        emoji2=hk.Emoji.parse("<:previous:1136984315415236648>"),
+                        original_page=disp_embed,
+                        swap_page=embed,
                     )
-                    await view.start(choice)
-                    await view.wait()
-
-                else:
-                    view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
-                    view.clean_items = False
-                    choice = await ctx.edit_last_response(
-                        content=None, embed=embed, components=view
+                )
+                # url["url"] = url["url"].split("?")[0]
+                view.add_item(
+                    GenericButton(
+                        url=f"https://yandex.com/images/search?url={quote(url['url'])}&rpt=imageview",
+                        label="Search Yandex",
                     )
-                    await view.start(choice)
-                    await view.wait()
-
-            except Exception:
-                await dlogger(
-                    ctx.bot, f"Sauce parser failed, json returned: ```{res}```"
                 )
-                embed, view = await _simple_parsing(ctx, data)
+                view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
+                choice = await ctx.edit_last_response(
+                    content=None, embed=disp_embed, components=view
+                )
+                await view.start(choice)
+                await view.wait()
+
+            else:
                 view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
                 view.clean_items = False
                 choice = await ctx.edit_last_response(
@@ -464,66 +428,282 @@ async def find_sauce(
                 )
                 await view.start(choice)
                 await view.wait()
-        else:
-            await ctx.edit_last_response(f"Ran into en error, `code : {res.status}`")
+
+        except Exception:
+            await dlogger(
+                ctx.bot, f"Sauce parser failed, json returned: ```{res}```"
+            )
+            embed, view = await _simple_parsing(ctx, data)
+            view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
+            view.clean_items = False
+            choice = await ctx.edit_last_response(
+                content=None, embed=embed, components=view
+            )
+            await view.start(choice)
+            await view.wait()
 
     else:
         try:
-            async with ctx.bot.d.aio_session.get(
-                "https://api.trace.moe/search", params={"url": link}
-            ) as res:
-                if res.ok:
-                    res = (await res.json())["result"]
-                    raw_filename = res[0]["filename"]
-                    raw_filename = raw_filename.replace(".mkv", "").replace(".mp4", "")
-                    sauce = re.sub(
-                        r"\[.*?\]", "", re.sub(r"\(.*?\)", "", raw_filename)
-                    ).strip()
-                    sauce += f" [Clip]({res[0].get('video')})"
-
-                    view = AuthorView(user_id=ctx.author.id, timeout=15 * 60)
-                    view.add_item(
-                        GenericButton(
-                            style=hk.ButtonStyle.LINK,
-                            emoji=hk.Emoji.parse(emotes.AL.value),
-                            url=f"https://anilist.co/anime/{res[0]['anilist']}",
-                        )
-                    )
-                    view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
-
-                    choice = await ctx.edit_last_response(
-                        content=None,
-                        embed=hk.Embed(color=0x000000)
-                        .add_field(
-                            "Similarity", f"{round(res[0]['similarity']*100, 2)}"
-                        )
-                        .add_field("Source", sauce)
-                        .add_field("Episode", res[0]["episode"] or "1", inline=True)
-                        .add_field(
-                            "Timestamp",
-                            (
-                                f"{int(res[0]['from']//60)}:{int(res[0]['from']%60)} -"
-                                f" {int(res[0]['to']//60)}:{int(res[0]['to']%60)}"
-                                f""
-                            ),
-                            inline=True,
-                        )
-                        .set_thumbnail(res[0]["image"])
-                        .set_author(name="Search results returned the follows: ")
-                        .set_footer(
-                            text="Powered by: Trace.Moe",
-                        ),
-                        components=view,
-                    )
-                    await view.start(choice)
-                    await view.wait()
-                else:
-                    await ctx.respond("Couldn't find it.")
+            res = (await _sauce_search("tracemoe", link))["result"]
+            view = AuthorView(user_id=ctx.author.id, timeout=15 * 60)
+            view.add_item(
+                GenericButton(
+                    style=hk.ButtonStyle.LINK,
+                    emoji=hk.Emoji.parse(emotes.AL.value),
+                    url=f"https://anilist.co/anime/{res[0]['anilist']}",
+                )
+            )
+            view.add_item(KillButton(style=hk.ButtonStyle.SECONDARY, label="❌"))
+
+            choice = await ctx.edit_last_response(
+                content=None,
+                embed=_tracemoe_parsing(res[0]),
+                components=view,
+            )
+            await view.start(choice)
+            await view.wait()
+        except TransportError:
+            await ctx.respond("Couldn't find it.")
         except Exception:
             await dlogger(ctx.bot, f"Sauce parser failed, json returned: ```{res}```")
             await ctx.respond("Ran into an unknown exception")
 
 
+# Probes of links that passed `_is_sauceable`, kept for `_load_image` to
+# carry on from instead of downloading the image from the start
+MAX_PROBES = 64
+_probes: "OrderedDict[str, ImageInfo]" = OrderedDict()
+
+
+async def _is_sauceable(link: str, session) -> bool:
+    """Whether a link is an image the engines take (see `probe_image`)"""
+    info = await probe_image(link, session)
+    if info is None or info.format not in ("png", "jpeg", "jpg", "webp", "gif"):
+        return False
+
+    _probes[link] = info
+    _probes.move_to_end(link)
+    while len(_probes) > MAX_PROBES:
+        _probes.popitem(last=False)
+    return True
+
+
+async def _load_image(url: t.Optional[str] = None, image=None) -> tuple:
+    """Fetch (if needed) and hash an image for `_sauce_search`
+
+    Returns:
+        tuple: The image (None if it couldn't be fetched) and its hashes
+            (None if it couldn't be decoded)
+    """
+    try:
+        if image is None:
+            image = await fetch_image(
+                url, sauce_plugin.bot.d.aio_session, _probes.pop(url, None)
+            )
+        return image, await asyncio.to_thread(image_hashes, image)
+    except Exception:
+        return image, None
+
+
+async def _sauce_search(
+    engine: str, url: t.Optional[str] = None, image=None, hashes=None, bucket=None
+) -> dict:
+    """Search SauceNAO or trace.moe, answering from the sauce cache when
+    the image is a near-duplicate of one looked up before
+
+    Args:
+        engine (str): "saucenao" or "tracemoe"
+        url (str, t.Optional): The image link. Defaults to None.
+        image (bytes | Image, t.Optional): The image itself. Defaults to None.
+        hashes (tuple, t.Optional): Precomputed `_load_image` hashes of
+            `image`. Defaults to None.
+        bucket (t.Optional): Who the SauceNAO quota is charged to (the
+            guild, or the user in DMs). Defaults to None.
+
+    Raises:
+        QuotaExceededError: No SauceNAO quota left for `bucket`
+        TransportError: The engine couldn't be reached
+
+    Returns:
+        dict: The engine's response body
+    """
+    bot = sauce_plugin.bot
+    cache = sauce_plugin.d.sauce_cache
+    if engine == "saucenao":
+        search = functools.partial(bot.d.sauce.saucenao, bucket=bucket)
+    else:
+        search = bot.d.sauce.tracemoe
+
+    if hashes is None:
+        image, hashes = await _load_image(url, image)
+
+    if hashes is None:
+        # Not something we could fetch or decode, leave it to the engine
+        return await (search(url=url) if url else search(image=image))
+
+    cached = cache.lookup(engine, hashes)
+    if cached is not None:
+        return cached
+
+    res = await search(image=image)
+    if _is_cacheable(engine, res):
+        cache.store(engine, hashes, res)
+    return res
+
+
+def _quota_message(error: QuotaExceededError) -> str:
+    """User facing message for a search the SauceNAO quota turned away"""
+    if error.retry_after is None:
+        return f"{error} {emotes.SIP.value}"
+    return f"{error}, try again <t:{int(time.time() + error.retry_after)}:R>"
+
+
+def _is_cacheable(engine: str, res: dict) -> bool:
+    """Only complete, successful responses are worth reusing"""
+    if engine == "saucenao":
+        return res.get("header", {}).get("status") == 0 and bool(res.get("results"))
+    return not res.get("error") and bool(res.get("result"))
+
+
+# Similarity (0-1) at which each engine's matches stop being mostly noise
+SIMILARITY_CUTOFFS = {"saucenao": 0.6, "tracemoe": 0.9}
+MAX_MERGED_RESULTS = 10
+
+
+def _normalized_score(engine: str, similarity: float) -> float:
+    """Map an engine's similarity (0-1) onto a shared 0-1 scale
+
+    The engines' scores aren't comparable as is (a 0.85 is a solid
+    SauceNAO match but a miss on trace.moe), so each is stretched
+    piecewise linearly to put its own cutoff at 0.5.
+    """
+    cutoff = SIMILARITY_CUTOFFS[engine]
+    if similarity >= cutoff:
+        return 0.5 + 0.5 * (similarity - cutoff) / (1 - cutoff)
+    return 0.5 * similarity / cutoff
+
+
+async def _merged_sauce(ctx: lb.Context, link: str) -> None:
+    """Search SauceNAO and trace.moe at once and show one ranked navigator"""
+    image, hashes = await _load_image(link)
+    saucenao, tracemoe = await asyncio.gather(
+        _sauce_search(
+            "saucenao", link, image, hashes, bucket=ctx.guild_id or ctx.author.id
+        ),
+        _sauce_search("tracemoe", link, image, hashes),
+        return_exceptions=True,
+    )
+
+    ranked = []
+    if isinstance(saucenao, dict) and saucenao.get("header", {}).get("status", -1) >= 0:
+        for data in saucenao.get("results") or []:
+            similarity = float(data["header"]["similarity"]) / 100
+            ranked.append((_normalized_score("saucenao", similarity), "saucenao", data))
+    if isinstance(tracemoe, dict) and not tracemoe.get("error"):
+        for data in tracemoe.get("result") or []:
+            ranked.append((_normalized_score("tracemoe", data["similarity"]), "tracemoe", data))
+
+    if not ranked:
+        for res in (saucenao, tracemoe):
+            if isinstance(res, BaseException):
+                await dlogger(ctx.bot, f"Merged sauce search failed: `{res!r}`")
+        await ctx.edit_last_response("Couldn't find it.")
+        return
+
+    ranked.sort(key=lambda x: x[0], reverse=True)
+    ranked = ranked[:MAX_MERGED_RESULTS]
+    _prefetch_enrichments(data for _, engine, data in ranked if engine == "saucenao")
+
+    async def build_page(index: int) -> hk.Embed:
+        score, engine, data = ranked[index]
+        if engine == "tracemoe":
+            embed = _tracemoe_parsing(data)
+            embed.description = f"[Link 1](https://anilist.co/anime/{data['anilist']})"
+        else:
+            embed = await _saucenao_page(ctx, data)
+
+        match = "Possible false match" if score < 0.5 else "Match"
+        return embed.set_author(
+            name=f"{match} {index + 1}/{len(ranked)} • {round(score * 100)}% confidence"
+        )
+
+    navigator = LazyNavi(
+        page_count=len(ranked),
+        page_builder=build_page,
+        buttons="default",
+        user_id=ctx.author.id,
+    )
+    await ctx.delete_last_response()
+    await navigator.send(ctx.interaction, responded=True)
+
+
+async def _saucenao_page(ctx: lb.Context, data: dict) -> hk.Embed:
+    """A navigator page for a SauceNAO result
+
+    The link buttons `_complex_parsing` builds can't live on a navigator
+    page, so they're listed in the description instead.
+    """
+    try:
+        embed, view = await _complex_parsing(ctx, data)
+    except Exception:
+        embed, view = await _simple_parsing(ctx, data)
+
+    links = [item.url for item in view.children if getattr(item, "url", None)]
+    if links:
+        embed.description = " • ".join(
+            f"[Link {i}]({url})" for i, url in enumerate(links, 1)
+        )
+    return embed
+
+
+async def _sauce_many(ctx: lb.Context, links: t.List[str], message_link: str) -> None:
+    """Sauce every image of a message at once and page through the results"""
+    bucket = ctx.guild_id or ctx.author.id
+    # The quota scheduler queues these, so they finish as fast as it allows
+    results = await asyncio.gather(
+        *(_sauce_search("saucenao", link, bucket=bucket) for link in links),
+        return_exceptions=True,
+    )
+    _prefetch_enrichments(
+        res["results"][0]
+        for res in results
+        if isinstance(res, dict) and res["header"]["status"] >= 0 and res.get("results")
+    )
+
+    async def build_page(index: int) -> nav.Page:
+        res = results[index]
+        label = f"Image {index + 1}/{len(links)}"
+
+        if isinstance(res, QuotaExceededError):
+            embed = hk.Embed(description=_quota_message(res), color=colors.WARN)
+        elif (
+            isinstance(res, BaseException)
+            or res["header"]["status"] < 0
+            or not res.get("results")
+        ):
+            if isinstance(res, BaseException) and not isinstance(res, TransportError):
+                await dlogger(ctx.bot, f"Sauce search failed: `{res!r}`")
+            embed = hk.Embed(
+                description=f"Couldn't find the sauce of [this one]({links[index]})",
+                color=colors.ERROR,
+            )
+        else:
+            data = res["results"][0]
+            embed = await _saucenao_page(ctx, data)
+            if float(data["header"]["similarity"]) < 60.0:
+                label += " • Possible false match"
+
+        return nav.Page(content=message_link, embed=embed.set_author(name=label))
+
+    navigator = LazyNavi(
+        page_count=len(links),
+        page_builder=build_page,
+        buttons="default",
+        user_id=ctx.author.id,
+    )
+    await navigator.send(ctx.interaction, responded=True)
+
+
 async def _complex_parsing(ctx: lb.Context, data: dict):
     """A usually stable method to form an embed via sauce results"""
     sauce = "😵"
@@ -531,25 +711,14 @@ async def _complex_parsing(ctx: lb.Context, data: dict):
     view = AuthorView(user_id=ctx.author.id, timeout=15 * 60)
 
     if "MangaDex" in data["header"]["index_name"]:
-        try:
-            if "mal_id" in data["data"].keys():
-                view.add_item(
-                    GenericButton(
-                        style=hk.ButtonStyle.LINK,
-                        emoji=hk.Emoji.parse(emotes.AL.value),
-                        url=(await al_from_mal(data["data"]["mal_id"])),
-                    )
-                )
-            else:
-                view.add_item(
-                    GenericButton(
-                        style=hk.ButtonStyle.LINK,
-                        emoji=hk.Emoji.parse(emotes.AL.value),
-                        url=(await al_from_mal(name=data["data"]["source"])),
-                    )
+        if al_url := await asyncio.shield(_enrich(data)):
+            view.add_item(
+                GenericButton(
+                    style=hk.ButtonStyle.LINK,
+                    emoji=hk.Emoji.parse(emotes.AL.value),
+                    url=al_url,
                 )
-        except Exception:
-            pass
+            )
 
         view.add_item(
             GenericButton(
@@ -576,40 +745,14 @@ async def _complex_parsing(ctx: lb.Context, data: dict):
         )
 
     elif "Anime" in data["header"]["index_name"]:
-        if len(data["data"]["ext_urls"]) > 1:
+        if al_url := await asyncio.shield(_enrich(data)):
             view.add_item(
                 GenericButton(
                     style=hk.ButtonStyle.LINK,
                     emoji=hk.Emoji.parse(emotes.AL.value),
-                    url=data["data"]["ext_urls"][2],
+                    url=al_url,
                 )
             )
-        else:
-            try:
-                params = {
-                    "source": "anidb",
-                    "id": data["data"]["ext_urls"][0].split("/")[-1],
-                    "include": "anilist",
-                }
-                res = await ctx.bot.d.aio_session.get(
-                    "https://arm.haglund.dev/api/v2/ids", params=params
-                )
-
-                if res.ok:
-                    res = await res.json()
-
-                    view.add_item(
-                        GenericButton(
-                            style=hk.ButtonStyle.LINK,
-                            emoji=hk.Emoji.parse(emotes.AL.value),
-                            url=f"https://anilist.co/anime/{res['anilist']}",
-                        )
-                    )
-                else:
-                    await ctx.respond("not ok ")
-
-            except Exception:
-                pass
 
         return (
             hk.Embed(
@@ -696,14 +839,15 @@ async def _complex_parsing(ctx: lb.Context, data: dict):
         )
 
     elif "H-Misc (E-Hentai)" in data["header"]["index_name"]:
-        view.add_item(
-            GenericButton(
-                style=hk.ButtonStyle.LINK,
-                emoji=hk.Emoji.parse(emotes.VNDB.value),
-                label="VNDB",
-                url=await vndb_url(data["data"]["source"]),
+        if vn_url := await asyncio.shield(_enrich(data)):
+            view.add_item(
+                GenericButton(
+                    style=hk.ButtonStyle.LINK,
+                    emoji=hk.Emoji.parse(emotes.VNDB.value),
+                    label="VNDB",
+                    url=vn_url,
+                )
             )
-        )
 
         return (
             hk.Embed(
@@ -793,6 +937,35 @@ async def _simple_parsing(ctx: lb.Context, data: dict):
     )
 
 
+def _tracemoe_parsing(data: dict) -> hk.Embed:
+    """Form an embed from a trace.moe result"""
+    raw_filename = data["filename"]
+    raw_filename = raw_filename.replace(".mkv", "").replace(".mp4", "")
+    sauce = re.sub(r"\[.*?\]", "", re.sub(r"\(.*?\)", "", raw_filename)).strip()
+    if data.get("video"):
+        sauce += f" [Clip]({data['video']})"
+
+    return (
+        hk.Embed(color=0x000000)
+        .add_field("Similarity", f"{round(data['similarity']*100, 2)}")
+        .add_field("Source", sauce)
+        .add_field("Episode", data["episode"] or "1", inline=True)
+        .add_field(
+            "Timestamp",
+            (
+                f"{int(data['from']//60)}:{int(data['from']%60)} -"
+                f" {int(data['to']//60)}:{int(data['to']%60)}"
+            ),
+            inline=True,
+        )
+        .set_thumbnail(data["image"])
+        .set_author(name="Search results returned the follows: ")
+        .set_footer(
+            text="Powered by: Trace.Moe",
+        )
+    )
+
+
 def sanitize_field(name: str) -> str:
     """Replacing _ with space"""
     return name.replace("_", " ").capitalize()
@@ -803,10 +976,117 @@ async def al_from_mal(
     type: t.Optional[str] = None,
     name: t.Optional[str] = None,
 ) -> t.Optional[str]:
-    """Anilist URL from MAL id"""
-    return await ALManga.al_url_from_mal(
+    """Anilist URL from MAL id, via the local id map when it's known"""
+    id_map = sauce_plugin.d.id_map
+    if mal_id and (al_id := id_map.get("mal", mal_id, "MANGA")):
+        return f"https://anilist.co/manga/{al_id}"
+
+    media = await ALManga.media_from_mal(
         sauce_plugin.bot.d.anilist, mal_id=mal_id, name=name
     )
+    if not media:
+        return None
+    id_map.remember_media([media], "MANGA")
+    return media["siteUrl"]
+
+
+async def al_from_anidb(anidb_id: int) -> t.Optional[str]:
+    """Anilist URL from AniDB id, via the local id map when it's known"""
+    id_map = sauce_plugin.d.id_map
+    if not (al_id := id_map.get("anidb", anidb_id, "ANIME")):
+        async with sauce_plugin.bot.d.aio_session.get(
+            "https://arm.haglund.dev/api/v2/ids",
+            params={"source": "anidb", "id": anidb_id, "include": "anilist"},
+        ) as res:
+            if not res.ok:
+                return None
+            al_id = (await res.json() or {}).get("anilist")
+        if not al_id:
+            return None
+        id_map.put("anidb", anidb_id, "ANIME", al_id)
+
+    return f"https://anilist.co/anime/{al_id}"
+
+
+def _remember_anime_ids(result: dict) -> None:
+    """SauceNAO's anime index carries the AniList id next to the MAL and
+    AniDB ones, so keep those pairs for later lookups"""
+    al_id = result["anilist_id"]
+    try:
+        sauce_plugin.d.id_map.put_many(
+            (source, result[key], "ANIME", al_id)
+            for source, key in (("mal", "mal_id"), ("anidb", "anidb_aid"))
+            if result.get(key)
+        )
+    except (TypeError, ValueError):
+        # Malformed ids only cost the shortcut, not the link
+        pass
+
+
+async def _resolve_link(data: dict) -> t.Optional[str]:
+    """The AniList/VNDB link for a SauceNAO result, if it has one"""
+    index_name = data["header"]["index_name"]
+    result = data["data"]
+    try:
+        if "MangaDex" in index_name:
+            if "mal_id" in result:
+                return await al_from_mal(result["mal_id"])
+            return await al_from_mal(name=result["source"])
+
+        if "Anime" in index_name:
+            if result.get("anilist_id"):
+                _remember_anime_ids(result)
+                return f"https://anilist.co/anime/{result['anilist_id']}"
+            if len(result["ext_urls"]) > 2:
+                return result["ext_urls"][2]
+            return await al_from_anidb(int(result["ext_urls"][0].split("/")[-1]))
+
+        if "H-Misc (E-Hentai)" in index_name:
+            return await vndb_url(result["source"])
+    except Exception:
+        pass
+    return None
+
+
+# Recent enrichments, so a result shown again (or prefetched) is resolved once
+MAX_ENRICHMENTS = 256
+_enrichments: "OrderedDict[tuple, asyncio.Task]" = OrderedDict()
+
+
+def _enrich(data: dict) -> "asyncio.Task[t.Optional[str]]":
+    """The (shared) task resolving `_resolve_link` for a SauceNAO result
+
+    Start it early for every result in a batch and the lookups run
+    concurrently; `_complex_parsing` then just awaits the finished task.
+    Await it through `asyncio.shield`, so a cancelled caller doesn't
+    cancel it for everyone else sharing it.
+    """
+    key = (
+        data["header"]["index_name"],
+        data["data"].get("source"),
+        tuple(data["data"].get("ext_urls") or ()),
+    )
+    if key in _enrichments:
+        _enrichments.move_to_end(key)
+        return _enrichments[key]
+
+    def forget_misses(done: asyncio.Task) -> None:
+        # Misses are likely transient (rate limits etc), don't hold on to them
+        if done.cancelled() or done.result() is None:
+            if _enrichments.get(key) is done:
+                del _enrichments[key]
+
+    task = asyncio.create_task(_resolve_link(data))
+    task.add_done_callback(forget_misses)
+    _enrichments[key] = task
+    while len(_enrichments) > MAX_ENRICHMENTS:
+        _enrichments.popitem(last=False)
+    return task
+
+
+def _prefetch_enrichments(results: t.Iterable[dict]) -> None:
+    for data in results:
+        _enrich(data)
 
 
 async def vndb_url(text: str) -> t.Union[str, None]:
@@ -821,20 +1101,10 @@ async def vndb_url(text: str) -> t.Union[str, None]:
     pattern = r"\[.*?\]"
     result_text = re.sub(pattern, "", text)
 
-    url = "https://api.vndb.org/kana/vn"
-    headers = {"Content-Type": "application/json"}
-    data = {
-        "filters": ["search", "=", result_text],
-        "fields": "title",
-        # "sort": "title"
-    }
-    req = await sauce_plugin.bot.d.aio_session.post(url, headers=headers, json=data)
-
-    if not req.ok:
+    results = await sauce_plugin.bot.d.vndb.search("vn", result_text, "id", results=1)
+    if not results:
         return
-
-    req = await req.json()
-    return f"https://vndb.org/{req['results'][0]['id']}"
+    return f"https://vndb.org/{results[0]['id']}"
 
 
 pattern = r"https?://\S+|www\.\S+"
@@ -842,20 +1112,39 @@ pattern = r"https?://\S+|www\.\S+"
 url_regex = re.compile(pattern)
 
 
-class MyModal(miru.Modal):
-    # Define our modal items
-    # You can also use Modal.add_item() to add items to the modal after instantiation, just like with views.
-    num = miru.TextInput(
-        label="Which image to search for?",
-        placeholder="The attachment number to consider",
-        required=True,
-    )
+# Most images of one message sauced at once
+MAX_MESSAGE_IMAGES = 10
+
 
-    # The callback function is called after the user hits 'Submit'
-    async def callback(self, ctx: miru.ModalContext) -> None:
-        ...
+async def _message_image_urls(message: hk.Message, session) -> t.List[str]:
+    """Every image in a message: attachments, image links and tenor gifs
+
+    Args:
+        message (hk.Message): The message
+        session (CachedSession): The aiohttp session
+
+    Returns:
+        t.List[str]: The image urls in message order, at most MAX_MESSAGE_IMAGES
+    """
+    links = url_regex.findall(message.content or "")
+    links += [attachment.url for attachment in message.attachments]
+    # Discord already knows the attachment types, no need to probe those
+    known = {
+        attachment.url
+        for attachment in message.attachments
+        if (attachment.media_type or "").startswith("image/")
+    }
 
-    #     # You can also access the values using ctx.values, Modal.values, or use ctx.get_value_by_id()
+    async def resolve(link: str) -> t.Optional[str]:
+        if link in known:
+            return link
+        if _is_tenor_link(link):
+            gif = await tenor_link_from_gif(link, session)
+            return gif if gif != link else None
+        return link if await _is_sauceable(link, session) else None
+
+    resolved = await asyncio.gather(*(resolve(link) for link in dict.fromkeys(links)))
+    return [link for link in resolved if link][:MAX_MESSAGE_IMAGES]
 
 
 async def _find_the_url(ctx) -> dict:
@@ -867,6 +1156,7 @@ async def _find_the_url(ctx) -> dict:
     Returns:
         dict: {
             "url" : The link (if applicable)
+            "urls": Every image link in the message (message context only)
             "errorMessage": If applicable otherwise None
         }
     """
@@ -893,7 +1183,7 @@ async def _find_the_url(ctx) -> dict:
                     }
                 return {"url": link, "errorMessage": None}
 
-            if not await is_image(url, ctx.bot.d.aio_session):
+            if not await _is_sauceable(url, ctx.bot.d.aio_session):
                 msg = f"Please enter a valid image link {emotes.SMILE.value}"
                 return {
                     "url": url,
@@ -905,77 +1195,24 @@ async def _find_the_url(ctx) -> dict:
             return {"url": None, "errorMessage": f"Exception: ```{e}```"}
 
     elif isinstance(ctx, lb.MessageContext):
-        url = None
-        errorMessage = "No valid url found"
-
-        message = ctx.options["target"]
-
-        if message.content:
-            match = url_regex.search(message.content)
-            if match:
-                url = match.group()
-
-        if url:
-            if await is_image(url, ctx.bot.d.aio_session):
-                return ctx, {"url": url, "errorMessage": None}
-
-            if _is_tenor_link(url):
-                link = await tenor_link_from_gif(url, ctx.bot.d.aio_session)
-                if link == url:
-                    return ctx, {
-                        "url": url,
-                        "errorMessage": "Unknown error fetching tenor url",
-                    }
-                return ctx, {"url": link, "errorMessage": None}
-
-        if not message.attachments:
-            msg = f"There's nothing here to find the sauce of {emotes.SIP.value}"
-            return ctx, {
-                "url": None,
-                "errorMessage": msg,
-            }
-
-        if len(message.attachments) > 1:
-            # Temp disable due to modal/api issues
-            # test = MyModal(title="Sauce Search Image Selection", timeout=60)
-            # await test.send(ctx)
-            # await test.wait(timeout=60)
-            # if test.last_context is None:
-            #     return
-            # ctx = test.last_context
-            
-            
-            # val = test.num.value
-            val = "1"
-            await ctx.respond(hk.ResponseType.DEFERRED_MESSAGE_CREATE)
-        else:
-            val = "1"
-            await ctx.respond(hk.ResponseType.DEFERRED_MESSAGE_CREATE)
+        await ctx.respond(hk.ResponseType.DEFERRED_MESSAGE_CREATE)
 
         try:
-            if not isinstance(eval(val), int):
-                return
-
-            val = int(val)
-
-            if val > len(message.attachments) + 1 or val < 1:
-                return ctx, {
-                    "url": None,
-                    "errorMessage": "Invalid attachment number",
-                }
-
-            if await is_image(message.attachments[val - 1].url, ctx.bot.d.aio_session):
-                return ctx, {
-                    "url": message.attachments[val - 1].url,
-                    "errorMessage": None,
-                }
-            return ctx, {"url": url, "errorMessage": errorMessage}
+            urls = await _message_image_urls(
+                ctx.options["target"], ctx.bot.d.aio_session
+            )
         except Exception:
             await dlogger(
                 ctx.bot,
                 f"Error while trying to find img url: ```{traceback.format_exc()}```",
             )
-            await ctx.respond("Unknown Error")
+            return ctx, {"url": None, "urls": [], "errorMessage": "Unknown Error"}
+
+        if not urls:
+            msg = f"There's nothing here to find the sauce of {emotes.SIP.value}"
+            return ctx, {"url": None, "urls": [], "errorMessage": msg}
+
+        return ctx, {"url": urls[0], "urls": urls, "errorMessage": None}
 
     return {
         "url": None,
@@ -990,6 +1227,45 @@ def _is_tenor_link(link) -> bool:
     return False
 
 
+@sauce_plugin.listener(hk.StartedEvent)
+async def on_starting(event: hk.StartedEvent) -> None:
+    """Create the sauce cache and id map tables and load them"""
+
+    conn = sauce_plugin.bot.d.con
+    cursor = conn.cursor()
+
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS sauce_cache (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        engine TEXT,
+        phash INTEGER,
+        dhash INTEGER,
+        result TEXT,
+        created_at INTEGER
+    )
+"""
+    )
+    conn.commit()
+
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS anilist_id_map (
+        source TEXT,
+        source_id INTEGER,
+        media_type TEXT,
+        anilist_id INTEGER,
+        PRIMARY KEY (source, source_id, media_type)
+    )
+"""
+    )
+    conn.commit()
+
+    sauce_plugin.d.sauce_cache = SauceCache(conn)
+    sauce_plugin.d.id_map = AniListIdMap(conn)
+    sauce_plugin.d.id_map.seed_from_file()
+
+
 def load(bot: lb.BotApp) -> None:
     """Load the plugin"""
     bot.add_plugin(sauce_plugin)
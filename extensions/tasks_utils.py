@@ -238,6 +238,9 @@ async def update_and_restart(ctx: lb.Context) -> None:
         else:
             await ctx.respond("Updated source.")
 
+    # -botinfo reads the changelog from here
+    await ctx.bot.d.git_info.refresh()
+
     await ctx.edit_last_response("Restarting the bot...")
 
     await ctx.bot.close()
@@ -366,6 +369,9 @@ async def update_code(ctx: lb.Context) -> None:
         else:
             await ctx.respond("Updated source.")
 
+    # -botinfo reads the changelog from here
+    await ctx.bot.d.git_info.refresh()
+
     os.kill(os.getpgid())
 
 
@@ -1,21 +1,26 @@
 """Visual novel (VNDB) related commands"""
 
-import collections
+import logging
+import os
 import re
+import typing as t
 from datetime import datetime
 from operator import itemgetter
 
 import hikari as hk
 import lightbulb as lb
 import miru
-import pandas as pd
+from lightbulb.ext import tasks
 
 from extensions.adata import al_search
 from utils import buttons as btns
 from utils import views as views
 from utils.components import SimpleTextSelect
+from utils.errors import RequestsFailedError
+from utils.markup import to_markdown
 from utils.misc import dlogger, verbose_date
 from utils.models import ColorPalette as colors
+from utils.vndb_index import FIXTURES, VNDBIndex
 
 vn_listener = lb.Plugin(
     "VN",
@@ -25,6 +30,8 @@ vn_listener = lb.Plugin(
 vn_listener.d.help = True
 vn_listener.d.help_emoji = "📖"
 
+logger = logging.getLogger(__name__)
+
 
 vndb_pattern = re.compile(r"\b(https?:\/\/)?(www.)?vndb.org\/[a-z]\/(\d+)")
 
@@ -170,6 +177,9 @@ async def add_trait_map(ctx: lb.PrefixContext, person: str, map: str):
             (person, map),
         )
         db.commit()
+        # The first alias added for a name wins, as with the table lookup
+        vn_listener.d.traitmap.setdefault(person, map)
+        vn_listener.d.vndb_index.set_local_aliases("trait", vn_listener.d.traitmap)
         await ctx.respond("Done")
     except Exception as e:
         print(e)
@@ -186,8 +196,10 @@ async def remove_trait_map(ctx: lb.PrefixContext, person: str):
         db = ctx.bot.d.con
         cursor = db.cursor()
         cursor.execute("DELETE FROM traitmap where user = ?", (person,))
-        await ctx.respond("Removed trait")
         db.commit()
+        vn_listener.d.traitmap.pop(person, None)
+        vn_listener.d.vndb_index.set_local_aliases("trait", vn_listener.d.traitmap)
+        await ctx.respond("Removed trait")
     except Exception as e:
         print(e)
 
@@ -198,73 +210,52 @@ async def remove_trait_map(ctx: lb.PrefixContext, person: str):
 @lb.implements(lb.PrefixCommand)
 async def show_traits(ctx: lb.PrefixContext):
     """Show all the trait maps"""
+    cursor = ctx.bot.d.con.cursor()
+    cursor.execute("SELECT id, user, trait FROM traitmap")
     await ctx.respond(
-        f'```{pd.read_sql("SELECT * FROM traitmap", ctx.bot.d.con).to_string(index=False)}```'
+        f"```{_fixed_width_table(('id', 'user', 'trait'), cursor.fetchall())}```"
     )
 
 
 # ============ HELPERS ============
 
-async def _fetch_trait_map(user: str) -> str:
+def _fetch_trait_map(user: str) -> t.Optional[str]:
     """Search if there's a trait map for a query"""
-    db = vn_listener.bot.d.con
-    cursor = db.cursor()
-    cursor.execute("SELECT trait FROM traitmap WHERE user=?", (user,))
-    return cursor.fetchone()
-
+    return vn_listener.d.traitmap.get(user)
 
-def replace_bbcode_with_markdown(match: re.Match) -> str:
-    """Make a MD string from a re Match object"""
-    url = match.group(1)
 
-    # Replacing VNDB ids with the corresponding url
-    if url.startswith("/"):
-        url = "https://vndb.org" + url
-
-    link_text = match.group(2)
-    markdown_link = f"[{link_text}]({url})"
-    return markdown_link
-
-
-def parse_vndb_desciption(description: str, limit: int = 300) -> str:
-    """Parse a VNDB description into a Discord friendly Markdown"""
-    if not description:
-        return "NA"
-
-    description = (
-        description.replace("[spoiler]", "||")
-        .replace("[/spoiler]", "||")
-        .replace("#", "")
-        .replace("[i]", "")
-        .replace("[b]", "")
-        .replace("[/b]", "")
-        .replace("[/i]", "")
+def _fixed_width_table(headers: t.Sequence[str], rows: t.Sequence[t.Sequence]) -> str:
+    """Render rows as a plain text table for a code block"""
+    table = [tuple(map(str, headers))] + [tuple(map(str, row)) for row in rows]
+    widths = [max(len(row[col]) for row in table) for col in range(len(headers))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+        for row in table
     )
 
-    pattern = r"\[url=(.*?)\](.*?)\[/url\]"
 
-    # Replace BBCode links with Markdown links in the text
-    description = re.sub(pattern, replace_bbcode_with_markdown, description)
+async def _lookup_vndb_term(ctx: lb.Context, kind: str, query: str, fields: str) -> t.Optional[dict]:
+    """The best matching tag/trait, from the local index once it's built"""
+    # The traitmap aliases are only for the home server
+    home = ctx.guild_id == 695200821910044783
 
-    if len(description) > limit:
-        description = description[0:limit]
+    index = vn_listener.d.vndb_index
+    if index.built_at(kind) is not None:
+        # The traitmap aliases are part of the index
+        return index.lookup(kind, query, local_aliases=home)
 
-        # Fix incomplete markdown links cut off during truncation
-        if re.search(r"\[[^\]]+\]\([^)]*$", description):
-            if description.endswith("("):
-                description = description[:-1]
-            else:
-                description += ")"
-        elif re.search(r"\[[^\]]*$", description):
-            description = re.sub(r"\[([^\]]*)$", r"\1", description)
+    if kind == "trait" and home:
+        query = _fetch_trait_map(query.lower()) or query
 
-        if description.count("||") % 2:
-            description = description + "||"
+    results = await ctx.bot.d.vndb.search(kind, query, fields, results=1)
+    return results[0] if results else None
 
-        description = description + "..."
-
-    return description
 
+def parse_vndb_desciption(description: str, limit: int = 300) -> str:
+    """Parse a VNDB description into a Discord friendly Markdown"""
+    if not description:
+        return "NA"
+    return to_markdown(description, "vndb", limit)
 
 
 def truncate_words(text: str, limit: int) -> str:
@@ -317,41 +308,216 @@ class VNSelect(miru.TextSelect):
             await ctx.edit_response(content=None, embeds=embeds_list, components=self.view)
 
 
+# ============ RESULT PAGES ============
+# Search results are kept as the decoded records; these build a record's
+# page the first time its option is picked (see `views.LazyPages`).
+
+def _vn_embed(vn: dict) -> hk.Embed:
+    """The info embed of a vn record"""
+    if vn.get("description"):
+        description = parse_vndb_desciption(vn["description"])
+    else:
+        description = "NA"
+
+    if vn.get("released"):
+        date = vn["released"].split("-")
+        if len(date) == 3:
+            released = verbose_date(date[2], date[1], date[0])
+        else:
+            released = "-".join(date)
+    else:
+        released = "Unreleased"
+
+    tags = "NA"
+    if vn.get("tags"):
+        tags_list = []
+        for tag in sorted(vn["tags"], key=itemgetter("rating"), reverse=True):
+            if (
+                tag["category"] == "cont" and tag["spoiler"] != 2
+            ):  # 0 = not a spoiler, 1 = minor spoiler, 2 - major.
+                tags_list.append(
+                    tag["name"] if not tag["spoiler"] else f"||{tag['name']}||"
+                )
+
+            if len(tags_list) == 7:
+                break
+
+        tags = ", ".join(tags_list if tags_list else ["NA"])
+
+    if vn.get("length_minutes"):
+        hour, mins = divmod(vn["length_minutes"], 60)
+        est_time = f"{hour} hours, {mins} minutes" if mins else f"{hour} hours"
+    else:
+        len_map = {
+            1: "Very Short (<2 hours)",
+            2: "Short (2-10 hours)",
+            3: "Medium (10-30 hours)",
+            4: "Long (30-50 hours)",
+            5: "Very Long (>50 hours)",
+        }
+        est_time = len_map.get(int(vn["length"]), "NA") if vn.get("length") else "NA"
+
+    return (
+        hk.Embed(
+            title=vn["title"],
+            url=f"https://vndb.org/{vn['id']}",
+            color=colors.VNDB,
+            timestamp=datetime.now().astimezone(),
+        )
+        .add_field(
+            "Rating",
+            vn.get("rating") or "NA",
+        )
+        .add_field("Tags", tags)
+        .add_field("Released", released, inline=True)
+        .add_field("Est. Time", est_time, inline=True)
+        .add_field("Summary", description)
+        .set_thumbnail(vn["image"]["url"] if vn.get("image") and vn["image"].get("url") else None)
+        .set_footer(text="Source: VNDB", icon="https://s.vndb.org/s/angel-bg.jpg")
+    )
+
+
+def _vn_screenshots(vn: dict) -> list[hk.Embed]:
+    """The screenshot embeds of a vn record, skipping explicit ones"""
+    screenshot_urls = [
+        ss["url"]
+        for ss in vn.get("screenshots", [])[:4]
+        if not (ss.get("sexual") == 2 or ss.get("violence") == 2)
+    ]
+
+    vn_url = f"https://vndb.org/{vn['id']}"
+    if not screenshot_urls:
+        return [
+            hk.Embed(
+                title=f"Screenshots - {vn['title']}",
+                url=vn_url,
+                description="No screenshots available.",
+                color=0x000000,
+            ).set_footer(text="Source: VNDB", icon="https://s.vndb.org/s/angel-bg.jpg")
+        ]
+
+    ss_embeds = []
+    links_str = " • ".join(
+        [f"[Screenshot {idx+1}]({u})" for idx, u in enumerate(screenshot_urls)]
+    )
+    for idx, ss_url in enumerate(screenshot_urls):
+        emb = hk.Embed(
+            title=f"Screenshots - {vn['title']}",
+            url=vn_url,
+            color=0x000000,
+        ).set_image(ss_url)
+        if idx == 0:
+            emb.description = links_str
+            emb.set_footer(text="Source: VNDB", icon="https://s.vndb.org/s/angel-bg.jpg")
+        ss_embeds.append(emb)
+    return ss_embeds
+
+
+def _vn_option(vn: dict) -> miru.SelectOption:
+    """The dropdown option of a vn record"""
+    rel_year = vn["released"].split("-")[0] if vn.get("released") else None
+    label_text = f"{vn['title']} ({rel_year})" if rel_year else vn["title"]
+    label_text = truncate_words(label_text, 100)
+
+    if vn.get("description"):
+        clean_desc = " ".join(parse_vndb_desciption(vn["description"], limit=120).split())
+        if len(vn["description"]) > 75 or len(clean_desc) > 75:
+            short_desc = truncate_words(clean_desc, 75)
+        else:
+            short_desc = clean_desc
+    else:
+        short_desc = "No description"
+
+    return miru.SelectOption(
+        label=label_text,
+        value=str(vn["id"]),
+        description=short_desc,
+    )
+
+
+def _vnchara_embed(chara: dict) -> hk.Embed:
+    """The info embed of a vn character record"""
+    if chara["description"]:
+        description = parse_vndb_desciption(chara["description"])
+    else:
+        description = "NA"
+
+    if chara["traits"]:
+        trait_groups = ["Hair", "Eyes", "Body", "Personality"]
+        traits = {
+            group: [
+                trait["name"]
+                for trait in chara["traits"]
+                if trait["group_name"] == group
+            ]
+            for group in trait_groups
+        }
+
+        traits_string = ""
+        for group, names in traits.items():
+            if names:
+                traits_string += f"_{group}_: {', '.join(names[:5])}\n"
+
+        traits = traits_string
+    else:
+        traits = "NA"
+
+    sex_symbols = {"m": "(♂)", "f": "(♀)", "b": "(⚥)", "n": "(⚲)"}
+    if chara["birthday"]:
+        birthday = f'{chara["birthday"][1]}/{chara["birthday"][0]}'
+    else:
+        birthday = "NA"
+
+    return (
+        hk.Embed(
+            title=f'{chara["name"]} {sex_symbols.get(chara["sex"][0])}',
+            url=f"https://vndb.org/{chara['id']}",
+            color=colors.VNDB,
+            timestamp=datetime.now().astimezone(),
+        )
+        .add_field("Birthday", birthday, inline=True)
+        .add_field("Age", chara["age"] or "NA", inline=True)
+        .add_field("Traits", traits)
+        .add_field("Summary", description)
+        .set_thumbnail(chara["image"]["url"])
+        .set_footer(
+            text="Source: VNDB", icon="https://files.catbox.moe/3gg4nn.jpg"
+        )
+    )
+
+
 # ============ INTERNAL SEARCH FUNCTIONS ============
 
 async def _search_vn(ctx: lb.Context, query: str):
     """Search a vn"""
     try:
-        url = "https://api.vndb.org/kana/vn"
-        headers = {"Content-Type": "application/json"}
-        data = {
-            "filters": ["search", "=", query],
-            "fields": (
-                "title, image.url, rating, released, length_minutes, length,"
-                "description, tags.spoiler, tags.name,"
-                "tags.category, tags.rating,"
-                "screenshots.url, screenshots.sexual, screenshots.violence"
-            ),
-            # "sort": "title"
-        }
-        # try:
-        req = await ctx.bot.d.aio_session.post(url, headers=headers, json=data)
-
-        if not req.ok:
+        try:
+            results = await ctx.bot.d.vndb.search(
+                "vn",
+                query,
+                (
+                    "title, image.url, rating, released, length_minutes, length,"
+                    "description, tags.spoiler, tags.name,"
+                    "tags.category, tags.rating,"
+                    "screenshots.url, screenshots.sexual, screenshots.violence"
+                ),
+            )
+        except RequestsFailedError as e:
             await ctx.respond(
                 hk.Embed(
                     title="SEARCH ERROR",
                     color=colors.WARN,
-                    description=f"Your search query raised a `code:{req.status}` error",
+                    description=(
+                        f"Your search query raised a `code:{e.status}` error"
+                        if getattr(e, "status", None)
+                        else f"Your search query failed: `{e}`"
+                    ),
                     timestamp=datetime.now().astimezone(),
                 )
             )
-            # await ctx.respond("Couldn't find the VN you asked for.")
             return
 
-        req = await req.json()
-
-        if not req["results"]:
+        if not results:
             return await ctx.respond(
                 hk.Embed(
                     title="VISUAL NOVEL NOT FOUND",
@@ -361,143 +527,23 @@ async def _search_vn(ctx: lb.Context, query: str):
                 )
             )
 
-        pages = {}
-        screenshots_dict = {}
-        options = []
-        first_page = None
-        first_screenshots = []
-
-        for i, vn in enumerate(req["results"][:15]):
-            if vn.get("description"):
-                description = parse_vndb_desciption(vn["description"])
-            else:
-                description = "NA"
-
-            if vn.get("released"):
-                date = vn["released"].split("-")
-                if len(date) == 3:
-                    released = verbose_date(date[2], date[1], date[0])
-                else:
-                    released = "-".join(date)
-            else:
-                released = "Unreleased"
-
-            tags = "NA"
-            if vn.get("tags"):
-                tags_list = []
-                for tag in sorted(
-                    vn["tags"], key=itemgetter("rating"), reverse=True
-                ):
-                    if (
-                        tag["category"] == "cont" and tag["spoiler"] != 2
-                    ):  # 0 = not a spoiler, 1 = minor spoiler, 2 - major.
-                        tags_list.append(
-                            tag["name"] if not tag["spoiler"] else f"||{tag['name']}||"
-                        )
-
-                    if len(tags_list) == 7:
-                        break
-
-                tags = ", ".join(tags_list if tags_list else ["NA"])
-
-            if vn.get("length_minutes"):
-                hour, mins = divmod(vn["length_minutes"], 60)
-                time = f"{hour} hours, {mins} minutes" if mins else f"{hour} hours"
-            else:
-                len_map = {
-                    1: "Very Short (<2 hours)",
-                    2: "Short (2-10 hours)",
-                    3: "Medium (10-30 hours)",
-                    4: "Long (30-50 hours)",
-                    5: "Very Long (>50 hours)",
-                }
-                time = len_map.get(int(vn["length"]), "NA") if vn.get("length") else "NA"
-
-            embed = (
-                hk.Embed(
-                    title=vn["title"],
-                    url=f"https://vndb.org/{vn['id']}",
-                    color=colors.VNDB,
-                    timestamp=datetime.now().astimezone(),
-                )
-                .add_field(
-                    "Rating",
-                    vn.get("rating") or "NA",
-                )
-                .add_field("Tags", tags)
-                .add_field("Released", released, inline=True)
-                .add_field("Est. Time", time, inline=True)
-                .add_field("Summary", description)
-                .set_thumbnail(vn["image"]["url"] if vn.get("image") and vn["image"].get("url") else None)
-                .set_footer(text="Source: VNDB", icon="https://s.vndb.org/s/angel-bg.jpg")
-            )
-
-            screenshot_urls = [
-                ss["url"]
-                for ss in vn.get("screenshots", [])[:4]
-                if not (ss.get("sexual") == 2 or ss.get("violence") == 2)
-            ]
-
-            vn_url = f"https://vndb.org/{vn['id']}"
-            if screenshot_urls:
-                ss_embeds = []
-                links_str = " • ".join(
-                    [f"[Screenshot {idx+1}]({u})" for idx, u in enumerate(screenshot_urls)]
-                )
-                for idx, ss_url in enumerate(screenshot_urls):
-                    emb = hk.Embed(
-                        title=f"Screenshots - {vn['title']}",
-                        url=vn_url,
-                        color=0x000000,
-                    ).set_image(ss_url)
-                    if idx == 0:
-                        emb.description = links_str
-                        emb.set_footer(text="Source: VNDB", icon="https://s.vndb.org/s/angel-bg.jpg")
-                    ss_embeds.append(emb)
-            else:
-                ss_embeds = [
-                    hk.Embed(
-                        title=f"Screenshots - {vn['title']}",
-                        url=vn_url,
-                        description="No screenshots available.",
-                        color=0x000000,
-                    ).set_footer(text="Source: VNDB", icon="https://s.vndb.org/s/angel-bg.jpg")
-                ]
-
-            vn_id_str = str(vn["id"])
-            if not i:
-                first_page = embed
-                first_screenshots = ss_embeds
-
-            rel_year = vn["released"].split("-")[0] if vn.get("released") else None
-            label_text = f"{vn['title']} ({rel_year})" if rel_year else vn["title"]
-            label_text = truncate_words(label_text, 100)
-
-            if vn.get("description"):
-                clean_desc = " ".join(parse_vndb_desciption(vn["description"], limit=120).split())
-                if len(vn["description"]) > 75 or len(clean_desc) > 75:
-                    short_desc = truncate_words(clean_desc, 75)
-                else:
-                    short_desc = clean_desc
-            else:
-                short_desc = "No description"
-
-            options.append(
-                miru.SelectOption(
-                    label=label_text,
-                    value=vn_id_str,
-                    description=short_desc,
-                )
-            )
-            pages[vn_id_str] = embed
-            screenshots_dict[vn_id_str] = ss_embeds
+        records = {str(vn["id"]): vn for vn in results}
+        first_id = str(results[0]["id"])
+        pages = views.LazyPages(records, _vn_embed)
+        screenshots = views.LazyPages(records, _vn_screenshots)
+        first_page = pages[first_id]
 
         view = views.SelectView(user_id=ctx.author.id, pages=pages)
-        view.screenshots = screenshots_dict
-        view.add_item(VNSelect(options=options, placeholder="Other visual novels"))
+        view.screenshots = screenshots
+        view.add_item(
+            VNSelect(
+                options=[_vn_option(vn) for vn in results],
+                placeholder="Other visual novels",
+            )
+        )
         view.add_item(
             btns.SwapButton(
-                swap_page=first_screenshots,
+                swap_page=screenshots[first_id],
                 original_page=first_page,
                 label1="Screenshots",
                 emoji1=hk.Emoji.parse("📸"),
@@ -519,22 +565,17 @@ async def _search_vn(ctx: lb.Context, query: str):
 
 async def _search_vnchara(ctx: lb.Context, query: str):
     """Search a vn character"""
-    url = "https://api.vndb.org/kana/character"
-    headers = {"Content-Type": "application/json"}
-    data = {
-        "filters": ["search", "=", query],
-        "fields": "name, description, age, sex,  image.url, traits.name, traits.group_name, vns.title, birthday",
-    }
-
-    req = await ctx.bot.d.aio_session.post(url, headers=headers, json=data)
-
-    if not req.ok:
+    try:
+        results = await ctx.bot.d.vndb.search(
+            "character",
+            query,
+            "name, description, age, sex, image.url, traits.name, traits.group_name, vns.title, birthday",
+        )
+    except RequestsFailedError:
         await ctx.respond("Couldn't find the character you asked for.")
         return
 
-    req = await req.json()
-
-    if not req["results"]:
+    if not results:
         return await ctx.respond(
             hk.Embed(
                 title="VN CHARACTER NOT FOUND",
@@ -544,71 +585,23 @@ async def _search_vnchara(ctx: lb.Context, query: str):
             )
         )
 
-    try:
-        pages = collections.defaultdict(list)
-        options = []
-        for i, chara in enumerate(req["results"][:15]):
-            if chara["description"]:
-                description = parse_vndb_desciption(chara["description"])
-            else:
-                description = "NA"
-
-            if chara["traits"]:
-                traits = {}
-                trait_groups = ["Hair", "Eyes", "Body", "Personality"]
-                traits = {
-                    group: [
-                        trait["name"]
-                        for trait in chara["traits"]
-                        if trait["group_name"] == group
-                    ]
-                    for group in trait_groups
-                }
-
-                traits_string = ""
-                for group, names in traits.items():
-                    if names:
-                        traits_string += f"_{group}_: {', '.join(names[:5])}\n"
-
-                traits = traits_string
-            else:
-                traits = "NA"
-
-            sex_symbols = {"m": "(♂)", "f": "(♀)", "b": "(⚥)", "n": "(⚲)"}
-            if chara["birthday"]:
-                birthday = f'{chara["birthday"][1]}/{chara["birthday"][0]}'
-            else:
-                birthday = "NA"
-
-            embed = [
-                hk.Embed(
-                    title=f'{chara["name"]} {sex_symbols.get(chara["sex"][0])}',
-                    url=f"https://vndb.org/{chara['id']}",
-                    color=colors.VNDB,
-                    timestamp=datetime.now().astimezone(),
-                )
-                .add_field("Birthday", birthday, inline=True)
-                .add_field("Age", chara["age"] or "NA", inline=True)
-                .add_field("Traits", traits)
-                .add_field("Summary", description)
-                .set_thumbnail(chara["image"]["url"])
-                .set_footer(
-                    text="Source: VNDB", icon="https://files.catbox.moe/3gg4nn.jpg"
-                ),
-            ]
-
-            if not i:
-                first_page = embed[0]
-
-            options.append(
-                miru.SelectOption(
-                    label=chara["name"],
-                    value=chara["name"],
-                    description=chara["vns"][0]["title"],
-                )
+    records = {}
+    options = []
+    for chara in results:
+        if chara["name"] in records:
+            continue
+        records[chara["name"]] = chara
+        options.append(
+            miru.SelectOption(
+                label=chara["name"],
+                value=chara["name"],
+                description=chara["vns"][0]["title"],
             )
-            pages[chara["name"]] = embed[0]
+        )
+    pages = views.LazyPages(records, _vnchara_embed)
+    first_page = pages[results[0]["name"]]
 
+    try:
         view = views.SelectView(user_id=ctx.author.id, pages=pages)
         view.add_item(SimpleTextSelect(options=options, placeholder="Other characters"))
         view.add_item(btns.KillButton())
@@ -627,22 +620,15 @@ async def _search_vnchara(ctx: lb.Context, query: str):
 
 async def _search_vntag(ctx: lb.Context, query: str):
     """Search a vn tag"""
-    url = "https://api.vndb.org/kana/tag"
-    headers = {"Content-Type": "application/json"}
-    data = {
-        "filters": ["search", "=", query],
-        "fields": "name, aliases, description, category, vn_count",
-        # "sort": "title"
-    }
-    req = await ctx.bot.d.aio_session.post(url, headers=headers, json=data)
-
-    if not req.ok:
+    try:
+        tag = await _lookup_vndb_term(
+            ctx, "tag", query, "name, aliases, description, category, vn_count"
+        )
+    except RequestsFailedError:
         await ctx.respond("Couldn't find the tag you asked for.")
         return
 
-    req = await req.json()
-
-    if not req["results"]:
+    if not tag:
         return await ctx.respond(
             hk.Embed(
                 title="TAG NOT FOUND",
@@ -652,15 +638,15 @@ async def _search_vntag(ctx: lb.Context, query: str):
             )
         )
 
-    if req["results"][0]["description"]:
-        description = parse_vndb_desciption(req["results"][0]["description"])
+    if tag["description"]:
+        description = parse_vndb_desciption(tag["description"])
     else:
         description = "NA"
 
-    tag_aliases = ", ".join(req["results"][0].get("aliases", ["NA"]))
+    tag_aliases = ", ".join(tag.get("aliases", ["NA"]))
 
-    req["results"][0]["category"] = (
-        req["results"][0]["category"]
+    tag["category"] = (
+        tag["category"]
         .replace("cont", "Content")
         .replace("ero", "Sexual")
         .replace("tech", "Technical")
@@ -670,14 +656,14 @@ async def _search_vntag(ctx: lb.Context, query: str):
     view.add_item(btns.KillButton())
     choice = await ctx.respond(
         hk.Embed(
-            title=req["results"][0]["name"],
-            url=f"https://vndb.org/{req['results'][0]['id']}",
+            title=tag["name"],
+            url=f"https://vndb.org/{tag['id']}",
             color=colors.VNDB,
             timestamp=datetime.now().astimezone(),
         )
         .add_field("Aliases", tag_aliases)
-        .add_field("Category", req["results"][0]["category"], inline=True)
-        .add_field("No of VNs", req["results"][0]["vn_count"], inline=True)
+        .add_field("Category", tag["category"], inline=True)
+        .add_field("No of VNs", tag["vn_count"], inline=True)
         .add_field("Summary", description)
         .set_footer(text="Source: VNDB", icon="https://files.catbox.moe/3gg4nn.jpg"),
         components=view,
@@ -688,30 +674,15 @@ async def _search_vntag(ctx: lb.Context, query: str):
 
 async def _search_vntrait(ctx: lb.Context, query: str):
     """Search a vn character trait"""
-    url = "https://api.vndb.org/kana/trait"
-    headers = {"Content-Type": "application/json"}
-
-    if ctx.guild_id == 695200821910044783:
-        db_check = await _fetch_trait_map(query.lower())
-
-        if db_check is not None:
-            query = db_check[0]
-
-    data = {
-        "filters": ["search", "=", query],
-        "fields": "name, aliases, description, group_name, char_count",
-        # "sort": "title"
-    }
-
-    req = await ctx.bot.d.aio_session.post(url, headers=headers, json=data)
-
-    if not req.ok:
+    try:
+        trait = await _lookup_vndb_term(
+            ctx, "trait", query, "name, aliases, description, group_name, char_count"
+        )
+    except RequestsFailedError:
         await ctx.respond("Couldn't find the trait you asked for.")
         return
 
-    req = await req.json()
-
-    if not req["results"]:
+    if not trait:
         return await ctx.respond(
             hk.Embed(
                 title="TRAIT NOT FOUND",
@@ -721,25 +692,25 @@ async def _search_vntrait(ctx: lb.Context, query: str):
             )
         )
 
-    if req["results"][0]["description"]:
-        description = parse_vndb_desciption(req["results"][0]["description"])
+    if trait["description"]:
+        description = parse_vndb_desciption(trait["description"])
     else:
         description = "NA"
 
-    tags = ", ".join(req["results"][0]["aliases"][:5]) or "NA"
+    tags = ", ".join(trait["aliases"][:5]) or "NA"
 
     view = views.AuthorView(user_id=ctx.author.id)
     view.add_item(btns.KillButton())
     choice = await ctx.respond(
         hk.Embed(
-            title=req["results"][0]["name"],
-            url=f"https://vndb.org/{req['results'][0]['id']}",
+            title=trait["name"],
+            url=f"https://vndb.org/{trait['id']}",
             color=colors.VNDB,
             timestamp=datetime.now().astimezone(),
         )
         .add_field("Aliases", tags)
-        .add_field("Group Name", req["results"][0]["group_name"], inline=True)
-        .add_field("No of Characters", req["results"][0]["char_count"], inline=True)
+        .add_field("Group Name", trait["group_name"], inline=True)
+        .add_field("No of Characters", trait["char_count"], inline=True)
         .add_field("Summary", description)
         .set_footer(text="Source: VNDB", icon="https://files.catbox.moe/3gg4nn.jpg"),
         components=view,
@@ -752,7 +723,7 @@ async def _search_vntrait(ctx: lb.Context, query: str):
 
 @vn_listener.listener(hk.StartedEvent)
 async def on_starting(event: hk.StartedEvent) -> None:
-    """Create traitmap table on bot start"""
+    """Create and load the traitmap and the tag/trait index on bot start"""
 
     conn = vn_listener.bot.d.con
     cursor = conn.cursor()
@@ -768,6 +739,35 @@ async def on_starting(event: hk.StartedEvent) -> None:
     )
     conn.commit()
 
+    # First row per name, like the `fetchone` lookups this replaces
+    cursor.execute("SELECT user, trait FROM traitmap ORDER BY id")
+    vn_listener.d.traitmap = {}
+    for user, trait in cursor.fetchall():
+        vn_listener.d.traitmap.setdefault(user, trait)
+
+    vn_listener.d.vndb_index = VNDBIndex(conn)
+    vn_listener.d.vndb_index.set_local_aliases("trait", vn_listener.d.traitmap)
+    refresh_vndb_index.start()
+
+
+@tasks.task(d=1)
+async def refresh_vndb_index() -> None:
+    """Rebuild the local tag/trait index from VNDB's dumps once a week"""
+    index = vn_listener.d.vndb_index
+    for kind in ("tag", "trait"):
+        if not index.is_stale(kind):
+            continue
+        try:
+            count = await index.refresh(vn_listener.bot.d.aio_session, kind)
+        except Exception as e:
+            # Never built and VNDB unreachable: fall back to a shipped fixture
+            fixture = FIXTURES[kind]
+            if index.built_at(kind) is None and os.path.exists(fixture):
+                await index.refresh_from_file(kind, fixture)
+            await dlogger(vn_listener.bot, f"VNDB {kind} dump refresh failed: `{e!r}`")
+            continue
+        logger.info(f"Indexed {count} VNDB {kind}s")
+
 
 def load(bot: lb.BotApp) -> None:
     """Load the plugin"""
@@ -1,25 +1,118 @@
+from functools import lru_cache
+
+
+class _SuffixAutomaton:
+    """Generalized suffix automaton over a sequence of strings.
+
+    Every state stands for a set of substrings sharing the same end
+    positions; `length` is the longest of them and `first` the
+    (string index, end position) of its earliest occurrence.
+    """
+
+    def __init__(self, strings):
+        self.next = [{}]
+        self.link = [-1]
+        self.length = [0]
+        self.first = [(-1, -1)]
+
+        for idx, string in enumerate(strings):
+            last = 0
+            for pos, char in enumerate(string):
+                last = self._extend(last, char, (idx, pos))
+
+    def _new_state(self, length, link, first, transitions=None):
+        self.next.append(dict(transitions) if transitions else {})
+        self.link.append(link)
+        self.length.append(length)
+        self.first.append(first)
+        return len(self.length) - 1
+
+    def _clone(self, p, q, char):
+        clone = self._new_state(
+            self.length[p] + 1, self.link[q], self.first[q], self.next[q]
+        )
+        while p != -1 and self.next[p].get(char) == q:
+            self.next[p][char] = clone
+            p = self.link[p]
+        self.link[q] = clone
+        return clone
+
+    def _extend(self, last, char, first):
+        # The substring already exists (seen in an earlier string)
+        if char in self.next[last]:
+            q = self.next[last][char]
+            if self.length[last] + 1 == self.length[q]:
+                return q
+            return self._clone(last, q, char)
+
+        cur = self._new_state(self.length[last] + 1, 0, first)
+        p = last
+        while p != -1 and char not in self.next[p]:
+            self.next[p][char] = cur
+            p = self.link[p]
+
+        if p != -1:
+            q = self.next[p][char]
+            if self.length[p] + 1 == self.length[q]:
+                self.link[cur] = q
+            else:
+                self.link[cur] = self._clone(p, q, char)
+
+        return cur
+
+    def string_counts(self, strings):
+        """Number of distinct strings each state's substrings occur in."""
+        counts = [0] * len(self.length)
+        seen = [-1] * len(self.length)
+
+        for idx, string in enumerate(strings):
+            state = 0
+            for char in string:
+                state = self.next[state][char]
+                walker = state
+                while walker > 0 and seen[walker] != idx:
+                    seen[walker] = idx
+                    counts[walker] += 1
+                    walker = self.link[walker]
+
+        return counts
+
+
 def longest_common_substring(titles, threshold=0.6):
-    """Find the longest common substring from a list of titles."""
-    # Get all possible substrings from all titles
-    all_substrings = {}
-    for title in titles:
-        for substring in get_all_substrings(title):
-            if substring not in all_substrings:
-                # Count in how many titles this substring appears
-                count = sum(1 for t in titles if substring in t)
-                frequency = count / len(titles)
-                if frequency >= threshold:
-                    all_substrings[substring] = frequency
-
-    if not all_substrings:
+    """Find the longest common substring from a list of titles.
+
+    Only substrings longer than 2 characters that appear in at least
+    `threshold` of the titles count; ties go to the earliest occurrence.
+    """
+    return _longest_common_substring(tuple(titles), threshold)
+
+
+@lru_cache(maxsize=1024)
+def _longest_common_substring(titles, threshold):
+    if not titles:
+        return ""
+
+    automaton = _SuffixAutomaton(titles)
+    counts = automaton.string_counts(titles)
+
+    best = None
+    for state in range(1, len(counts)):
+        length = automaton.length[state]
+        if length <= 2 or counts[state] / len(titles) < threshold:
+            continue
+
+        # Longest first, then earliest (title, start) like the old scan order
+        title_idx, end = automaton.first[state]
+        key = (-length, title_idx, end - length + 1)
+        if best is None or key < best:
+            best = key
+
+    if best is None:
         return ""
 
-    # Find the longest substring that meets the threshold
-    candidates = sorted(
-        all_substrings.items(), key=lambda x: len(x[0]), reverse=True
-    )
+    length, title_idx, start = -best[0], best[1], best[2]
+    return titles[title_idx][start : start + length].strip()
 
-    return candidates[0][0].strip() if candidates else titles[0]
 
 def get_all_substrings(string):
     """Get all possible substrings of length > 2 from a string."""
@@ -29,4 +122,4 @@ def get_all_substrings(string):
             substring = string[i:j]
             if len(substring) > 2:  # Only consider substrings longer than 2 chars
                 substrings.append(substring)
-    return substrings
\ No newline at end of file
+    return substrings
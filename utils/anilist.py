@@ -6,6 +6,7 @@ construction lives alongside each class via `make_embed` / `make_pages`.
 """
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timedelta
 from operator import itemgetter
 from typing import List, Optional, Set, Tuple
@@ -14,6 +15,7 @@ import hikari as hk
 
 from utils.anilist_client import AniListClient, end_of_day_utc_ttl
 from utils.errors import AniListError
+from utils.markup import to_markdown
 from utils.misc import verbose_timedelta
 from utils.models import ColorPalette as colors
 
@@ -28,24 +30,7 @@ class AnilistBase:
         """Parse an AniList description into Discord-friendly markdown."""
         if not description:
             return "-"
-
-        problematic_tags = [
-            "<i>", "</i>", "<I>", "</I>",
-            "<b>", "</b>", "<B>", "</B>",
-            "<br>", "<BR>", "#",
-        ]
-        for tag in problematic_tags:
-            description = description.replace(tag, "")
-
-        description = description.replace("~!", "||").replace("!~", "||")
-
-        if len(description) > limit:
-            description = description[:limit]
-            if description.count("||") % 2:
-                description += "||"
-            description += "..."
-
-        return description
+        return to_markdown(description, "anilist", limit)
 
 
 class ALCharacter(AnilistBase):
@@ -852,20 +837,22 @@ class ALManga(AnilistBase):
     _URL_FROM_MAL_QUERY = """
     query ($mal_id: Int, $search: String) {
         Media (idMal: $mal_id, search: $search, type: MANGA) {
+            id
+            idMal
             siteUrl
         }
     }
     """
 
     @classmethod
-    async def al_url_from_mal(
+    async def media_from_mal(
         cls,
         client: AniListClient,
         *,
         mal_id: Optional[int] = None,
         name: Optional[str] = None,
-    ) -> Optional[str]:
-        """Resolve the AniList URL for a manga given its MAL id or a title."""
+    ) -> Optional[dict]:
+        """The AniList `id`, `idMal` and `siteUrl` of a manga given its MAL id or a title."""
         try:
             data = await client.query(
                 cls._URL_FROM_MAL_QUERY,
@@ -873,8 +860,7 @@ class ALManga(AnilistBase):
             )
         except AniListError:
             return None
-        media = data.get("Media")
-        return media["siteUrl"] if media else None
+        return data.get("Media")
 
 
 class ALNovel(AnilistBase):
@@ -1086,6 +1072,7 @@ class ALStaff(AnilistBase):
     _QUERY = """
     query ($search: String, $sort: [MediaSort], $charactersSort: [CharacterSort], $perPage: Int) {
         Staff(search: $search) {
+            id
             dateOfBirth { year month day }
             age
             gender
@@ -1135,3 +1122,100 @@ class ALStaff(AnilistBase):
         except AniListError:
             return None
         return data.get("Staff")
+
+    # ---- Voice-acting roles (characterMedia walk) ----
+
+    _ROLES_PAGE_QUERY = """
+    query ($id: Int, $page: Int, $perPage: Int) {
+        Staff(id: $id) {
+            characterMedia(page: $page, perPage: $perPage, sort: POPULARITY_DESC) {
+                pageInfo { lastPage hasNextPage }
+                edges {
+                    characterRole
+                    node {
+                        id
+                        title { english romaji }
+                        popularity
+                    }
+                    characters {
+                        id
+                        name { full }
+                        image { medium }
+                    }
+                }
+            }
+        }
+    }
+    """
+
+    @classmethod
+    async def _fetch_roles_page(
+        cls, client: AniListClient, staff_id: int, page: int, per_page: int
+    ) -> dict:
+        try:
+            data = await client.query(
+                cls._ROLES_PAGE_QUERY,
+                {"id": staff_id, "page": page, "perPage": per_page},
+            )
+        except AniListError:
+            return {}
+        return (data.get("Staff") or {}).get("characterMedia") or {}
+
+    @classmethod
+    async def fetch_character_roles(
+        cls,
+        client: AniListClient,
+        staff_id: int,
+        *,
+        per_page: int = 25,
+        max_pages: int = 6,
+    ) -> list:
+        """Every character voiced by a staff member, most popular role first.
+
+        The first page is fetched to learn `lastPage`; the remaining pages
+        (capped at `max_pages`) are then fetched concurrently. Each character
+        is kept once, under the most popular media it appears in. Returns
+        card dicts (`title`/`image`/`subtitle`/`popularity`) ready for
+        `utils.card.card_maker`.
+        """
+        first = await cls._fetch_roles_page(client, staff_id, 1, per_page)
+        if not first:
+            return []
+
+        pages = [first]
+        last_page = min((first.get("pageInfo") or {}).get("lastPage") or 1, max_pages)
+        if last_page > 1:
+            pages.extend(
+                await asyncio.gather(
+                    *(
+                        cls._fetch_roles_page(client, staff_id, page, per_page)
+                        for page in range(2, last_page + 1)
+                    )
+                )
+            )
+
+        roles: dict[int, dict] = {}
+        for page in pages:
+            for edge in page.get("edges") or []:
+                media = edge.get("node") or {}
+                subtitle = (media.get("title") or {}).get("english") or (
+                    media.get("title") or {}
+                ).get("romaji")
+                popularity = media.get("popularity") or 0
+                if not subtitle:
+                    continue
+
+                for character in edge.get("characters") or []:
+                    if not character or not (character.get("image") or {}).get("medium"):
+                        continue
+                    known = roles.get(character["id"])
+                    if known and known["popularity"] >= popularity:
+                        continue
+                    roles[character["id"]] = {
+                        "title": character["name"]["full"],
+                        "image": character["image"]["medium"],
+                        "subtitle": subtitle,
+                        "popularity": popularity,
+                    }
+
+        return sorted(roles.values(), key=itemgetter("popularity"), reverse=True)
@@ -33,20 +33,23 @@ class HttpClient:
         url: str,
         *,
         cache_ttl: Optional[int] = None,
+        session=None,
         **kwargs: Any,
     ):
         """Issue a request and return the `ClientResponse`.
 
         One bounded retry on HTTP 429 when Retry-After <= 5s; raises
         `TransportError` on network error, non-OK status, or when the
-        retry budget is exhausted.
+        retry budget is exhausted. `session` overrides the client's own
+        session for this request.
         """
         if cache_ttl is not None:
             kwargs["expire_after"] = cache_ttl
+        session = session or self._session
 
         for attempt in range(2):
             try:
-                resp = await self._session.request(method, url, **kwargs)
+                resp = await session.request(method, url, **kwargs)
             except Exception as e:
                 raise TransportError(f"{method} {url} failed: {e}") from e
 
@@ -65,10 +68,13 @@ class HttpClient:
                     await asyncio.sleep(retry_after)
                     continue
                 raise TransportError(
-                    f"{method} {url} rate limited (Retry-After={retry_after})"
+                    f"{method} {url} rate limited (Retry-After={retry_after})",
+                    status=resp.status,
                 )
 
-            raise TransportError(f"{method} {url} failed with status {resp.status}")
+            raise TransportError(
+                f"{method} {url} failed with status {resp.status}", status=resp.status
+            )
 
         raise TransportError(f"{method} {url}: retries exhausted")
 
@@ -0,0 +1,138 @@
+"""Bot and host statistics for `-botinfo`, kept current in the background.
+
+`SystemSampler` polls CPU, memory and event loop lag on an interval so
+reading them never blocks, `GitInfo` caches the commit count and recent
+changelog (refreshed at startup and after a `git pull`), and
+`MemberTotals` keeps a running member count from guild events.
+"""
+import asyncio
+import os
+import typing as t
+from collections import deque
+from math import floor
+
+import psutil
+
+SAMPLE_INTERVAL = 5
+# Samples averaged into the reported figures, a minute's worth
+SAMPLE_WINDOW = 12
+
+
+class SystemSampler:
+    """Rolling CPU/RAM/event loop lag figures, sampled every `interval` seconds"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, window: int = SAMPLE_WINDOW) -> None:
+        self.interval = interval
+        self._process = psutil.Process(os.getpid())
+        self._cpu: t.Deque[float] = deque(maxlen=window)
+        self._lag: t.Deque[float] = deque(maxlen=window)
+        self.rss = 0
+        self.memory_percent = 0.0
+        self._task: t.Optional[asyncio.Task] = None
+
+    def sample(self) -> None:
+        # With no interval psutil reports usage since its previous call
+        # instead of sleeping to measure it
+        self._cpu.append(psutil.cpu_percent(None))
+        self.rss = self._process.memory_info().rss
+        self.memory_percent = psutil.virtual_memory().percent
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        # The first call only sets the baseline, sampling right after it
+        # would measure next to no time
+        psutil.cpu_percent(None)
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            # Any time past the requested sleep was spent waiting on the loop
+            self._lag.append(max(0.0, loop.time() - start - self.interval))
+            self.sample()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    @property
+    def cpu_percent(self) -> float:
+        return sum(self._cpu) / len(self._cpu) if self._cpu else 0.0
+
+    @property
+    def loop_lag(self) -> float:
+        """Mean event loop lag over the window, in seconds"""
+        return sum(self._lag) / len(self._lag) if self._lag else 0.0
+
+    @property
+    def max_loop_lag(self) -> float:
+        return max(self._lag, default=0.0)
+
+
+class GitInfo:
+    """Commit count and recent changelog of the bot's checkout"""
+
+    def __init__(self, branch: str = "main", changelog_size: int = 5) -> None:
+        self.branch = branch
+        self.changelog_size = changelog_size
+        self.commits = 0
+        self.changelog: t.List[str] = []
+
+    @staticmethod
+    async def _git(*args: str) -> str:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "git",
+                *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        except OSError:
+            # No git on this host, the info just stays empty
+            return ""
+        out, _ = await proc.communicate()
+        return out.decode("utf-8", "replace")
+
+    async def refresh(self) -> None:
+        """Re-read the repo, call after the source changes"""
+        count, log = await asyncio.gather(
+            self._git("rev-list", "--count", self.branch),
+            self._git("log", f"-{self.changelog_size}", "--format=<t:%at:D>: %s"),
+        )
+        try:
+            self.commits = int(count)
+        except ValueError:
+            pass
+        self.changelog = [line for line in log.splitlines() if line]
+
+    @property
+    def version(self) -> str:
+        return f"0.{floor(self.commits/100)}.{floor((self.commits%100)/10)}"
+
+
+class MemberTotals:
+    """Member count across guilds, adjusted as members join and leave"""
+
+    def __init__(self) -> None:
+        self._counts: t.Dict[int, int] = {}
+        self.total = 0
+
+    def __bool__(self) -> bool:
+        return bool(self._counts)
+
+    def set_guild(self, guild_id: int, count: t.Optional[int]) -> None:
+        self.total += (count or 0) - self._counts.get(guild_id, 0)
+        self._counts[guild_id] = count or 0
+
+    def add(self, guild_id: int, delta: int) -> None:
+        """A member joined (+1) or left (-1). Ignored for guilds not seen yet,
+        their count arrives with the guild."""
+        if guild_id in self._counts:
+            self._counts[guild_id] += delta
+            self.total += delta
+
+    def drop_guild(self, guild_id: int) -> None:
+        self.total -= self._counts.pop(guild_id, 0)
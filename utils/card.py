@@ -1,8 +1,35 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 import requests
-from PIL import Image, ImageOps, ImageDraw, ImageFont, ImageFilter
-import matplotlib.pyplot as plt
+from PIL import Image, ImageOps, ImageDraw, ImageFont, ImageFilter, features
 from io import BytesIO
 
+MAIN_FONT = "assets/fonts/Overpass-VariableFont_wght.ttf"
+SUB_FONT = "assets/fonts/Overpass-VariableFont_wght.ttf"
+
+TILE_SIZE = (100, 150)
+# Bump when the card layout or encoding changes so stale cached cards aren't served
+CARD_VERSION = 2
+
+
+@lru_cache(maxsize=None)
+def _font(path, size):
+    return ImageFont.truetype(path, size)
+
+
+@lru_cache(maxsize=32)
+def _rounded_mask(size, radius):
+    mask = Image.new("L", size, 0)
+    draw = ImageDraw.Draw(mask)
+    draw.rounded_rectangle([(0, 0), size], radius=radius, fill=255)
+    return mask.filter(ImageFilter.GaussianBlur(2))
+
 
 def add_rounded_corners(image, radius=200):
     """
@@ -15,67 +42,230 @@ def add_rounded_corners(image, radius=200):
     Returns:
         PIL.Image.Image: The new image with rounded corners and transparency.
     """
-    im = image.convert("RGBA")
-    mask = Image.new("L", im.size, 0)
-    draw = ImageDraw.Draw(mask)
-    draw.rounded_rectangle([(0, 0), im.size], radius=radius, fill=255)
-    mask = mask.filter(ImageFilter.GaussianBlur(2))
-    result = ImageOps.fit(im, mask.size, method=Image.Resampling.LANCZOS, centering=(0.5, 0.5))
-    result.putalpha(mask)
+    result = image.convert("RGBA")
+    result.putalpha(_rounded_mask(result.size, radius))
     return result
 
 
-async def _make_card_row(data, client=None):
-    DIMENSIONS = (500, 220)
-    BGCOLOR = (11, 22, 34)
-
-    NAME_COLOR = (164, 182, 200)
-    SERIES_COLOR = (116, 135, 152)
-
-    img = Image.new('RGBA', DIMENSIONS, BGCOLOR)
-
-    x, y = 0, 0
-    y += 20
+# Upper bound on cover downloads in flight for a single card
+MAX_CONCURRENT_FETCHES = 8
+PLACEHOLDER_COLOR = (27, 39, 53)
 
-    for data_obj in data[:4]:
-        x += 20
-        image_url = data_obj['image']
-        image_bytes = None
 
+async def _fetch_image_bytes(image_url, client, semaphore):
+    """Download a cover, returning None instead of raising on failure."""
+    async with semaphore:
         if client is not None:
             try:
                 if hasattr(client, "request"):
                     resp = await client.request("GET", image_url)
-                    image_bytes = await resp.read()
-                elif hasattr(client, "get"):
+                    return await resp.read()
+                if hasattr(client, "get"):
                     resp = await client.get(image_url)
                     if hasattr(resp, "read"):
-                        image_bytes = await resp.read()
-                    else:
-                        image_bytes = resp.content
+                        return await resp.read()
+                    return resp.content
             except Exception:
-                image_bytes = None
+                pass
+
+        try:
+            response = await asyncio.to_thread(requests.get, image_url, timeout=10)
+            response.raise_for_status()
+            return response.content
+        except Exception:
+            return None
+
 
-        if image_bytes is None:
-            response = requests.get(image_url)
-            image_bytes = response.content
+@lru_cache(maxsize=1)
+def _placeholder_thumbnail():
+    return add_rounded_corners(Image.new("RGBA", TILE_SIZE, PLACEHOLDER_COLOR), radius=5)
 
-        img1 = Image.open(BytesIO(image_bytes))
+
+def _decode_tile(image_bytes):
+    """Fit a cover into a rounded 100x150 tile, None if it can't be decoded."""
+    if image_bytes is None:
+        return None
+
+    try:
+        img = Image.open(BytesIO(image_bytes))
         resample = Image.Resampling.LANCZOS
 
-        img1 = ImageOps.fit(img1.convert("RGBA"), (100, 150), method=resample, centering=(0.5, 0.5))
-        img1 = add_rounded_corners(img1, radius=5)
+        img = ImageOps.fit(img.convert("RGBA"), TILE_SIZE, method=resample, centering=(0.5, 0.5))
+    except Exception:
+        return None
+    return add_rounded_corners(img, radius=5)
+
+
+def _make_thumbnail(image_bytes):
+    return _decode_tile(image_bytes) or _placeholder_thumbnail()
+
+
+class DiskCache:
+    """
+    Byte blobs on disk keyed by string.
+
+    Each entry is one file under `directory`, named by the sha1 of its key;
+    once the directory grows past `max_bytes` the least recently used
+    entries are evicted. Picklable, so a process pool worker gets its own
+    handle on the same directory.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(directory))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_lock", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                payload = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return payload
+
+    def put(self, key, payload):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._size += len(payload)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(os.scandir(self.directory), key=lambda entry: entry.stat().st_mtime)
+        self._size = sum(entry.stat().st_size for entry in entries)
+
+        for entry in entries:
+            if self._size <= self.max_bytes * 0.8:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self._size -= size
+
+
+class TileCache(DiskCache):
+    """Finished card tiles (as PNG) keyed by cover url."""
+
+    def __init__(self, directory="cache/card_tiles", max_bytes=64 * 1024 * 1024):
+        super().__init__(directory, max_bytes)
+
+    def get_tile(self, url):
+        payload = self.get(url)
+        if payload is None:
+            return None
+        try:
+            tile = Image.open(BytesIO(payload))
+            tile.load()
+        except (OSError, ValueError):
+            return None
+        return tile
+
+    def put_tile(self, url, tile):
+        buffer = BytesIO()
+        tile.save(buffer, format="PNG")
+        self.put(url, buffer.getvalue())
+
+
+def _load_tile(url, cover, tile_cache=None):
+    """Cached tile for `url`, else decode `cover` (and cache it), else None."""
+    tile = tile_cache.get_tile(url) if tile_cache is not None else None
+    if tile is not None:
+        return tile
+
+    tile = _decode_tile(cover)
+    if tile is None:
+        return None
+
+    if tile_cache is not None:
+        tile_cache.put_tile(url, tile)
+    return tile
+
+
+def _uncached(urls, tile_cache):
+    return [url for url in urls if url not in tile_cache]
+
+
+async def fetch_covers(data, client=None, tile_cache=None, executor=None):
+    """
+    Download every card cover in `data` concurrently (at most
+    `MAX_CONCURRENT_FETCHES` at a time, each unique url once). Returns the raw
+    bytes index-aligned with `data`, None where the download failed or the
+    finished tile is already in `tile_cache`. The result can be shared
+    between several renders over (prefixes of) the same `data` so
+    overlapping covers are only fetched once.
+
+    The `tile_cache` lookups hit the disk, so they run in `executor`
+    (the loop's default one if not given).
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    urls = list(dict.fromkeys(data_obj['image'] for data_obj in data))
+    if tile_cache is not None:
+        loop = asyncio.get_running_loop()
+        urls = await loop.run_in_executor(executor, _uncached, urls, tile_cache)
+
+    payloads = await asyncio.gather(
+        *(_fetch_image_bytes(url, client, semaphore) for url in urls)
+    )
+    covers = dict(zip(urls, payloads))
+    return [covers.get(data_obj['image']) for data_obj in data]
+
+
+async def fetch_thumbnails(data, client=None):
+    """
+    Like `fetch_covers` but decodes each cover into a ready-to-paste tile,
+    with a placeholder tile for covers that failed to download or decode.
+    """
+    return [_make_thumbnail(cover) for cover in await fetch_covers(data, client)]
+
+
+def _make_card_row(data, thumbnails):
+    DIMENSIONS = (500, 220)
+    BGCOLOR = (11, 22, 34)
+
+    NAME_COLOR = (164, 182, 200)
+    SERIES_COLOR = (116, 135, 152)
+
+    img = Image.new('RGBA', DIMENSIONS, BGCOLOR)
+
+    x, y = 0, 0
+    y += 20
 
+    for data_obj, img1 in zip(data[:4], thumbnails):
+        x += 20
         img.paste(img1, (x, y))
 
         draw = ImageDraw.Draw(img)
         draw.fontmode = "L"
 
-        MAIN_FONT = "assets/fonts/Overpass-VariableFont_wght.ttf"
-        SUB_FONT = "assets/fonts/Overpass-VariableFont_wght.ttf"
-
-        font_name = ImageFont.truetype(MAIN_FONT, 11)
-        font_series = ImageFont.truetype(SUB_FONT, 9)
+        font_name = _font(MAIN_FONT, 11)
+        font_series = _font(SUB_FONT, 9)
 
         title_trim = data_obj['title'] if len(data_obj['title']) <= 20 else data_obj['title'][:18] + '..'
         series_trim = data_obj['subtitle'] if len(data_obj['subtitle']) <= 20 else data_obj['subtitle'][:18] + '..'
@@ -87,21 +277,15 @@ async def _make_card_row(data, client=None):
     return img
 
 
-async def card_maker(data, client=None):
-    """
-    Inputs a list of dicts in the following parameters:
-    `image`: image url
-    `title`: title of the card
-    `subtitle`: subtitle of the card
-    """
+def _compose(data, thumbnails):
     if not data:
         return Image.new('RGBA', (500, 220), (11, 22, 34))
 
     chunks = [data[i:i+4] for i in range(0, len(data), 4)]
     row_images = []
 
-    for chunk in chunks:
-        row_img = await _make_card_row(chunk, client=client)
+    for n, chunk in enumerate(chunks):
+        row_img = _make_card_row(chunk, thumbnails[n*4:n*4+4])
         row_images.append(row_img)
 
     if len(row_images) == 1:
@@ -114,4 +298,163 @@ async def card_maker(data, client=None):
         combined.paste(row_img, (0, current_y))
         current_y += row_img.height
 
-    return combined
\ No newline at end of file
+    return combined
+
+
+async def card_maker(data, client=None, thumbnails=None):
+    """
+    Inputs a list of dicts in the following parameters:
+    `image`: image url
+    `title`: title of the card
+    `subtitle`: subtitle of the card
+
+    `thumbnails` optionally holds the tiles from `fetch_thumbnails`,
+    index-aligned with `data`. Otherwise every cover across all rows is
+    fetched concurrently up front, before any row is composed.
+
+    Composition runs on the calling thread; commands should go through
+    `CardRenderer` instead so the event loop isn't blocked.
+    """
+    if data and thumbnails is None:
+        thumbnails = await fetch_thumbnails(data, client)
+
+    return _compose(data, thumbnails)
+
+
+def make_card_spec(data, covers):
+    """
+    Build the serializable job spec `render_card` consumes: the card dicts
+    with the downloaded cover bytes (or None) added under `cover`.
+    """
+    return [
+        {
+            'title': data_obj['title'],
+            'subtitle': data_obj['subtitle'],
+            'image': data_obj['image'],
+            'cover': cover,
+        }
+        for data_obj, cover in zip(data, covers)
+    ]
+
+
+def card_cache_key(data):
+    """Content address of a card: everything that ends up in the image."""
+    payload = json.dumps(
+        [CARD_VERSION, [[d['title'], d['subtitle'], d['image']] for d in data]],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def card_format(payload):
+    """File extension for bytes produced by `encode_card`."""
+    return "webp" if payload[8:12] == b"WEBP" else "png"
+
+
+def encode_card(image, lossy=False):
+    """
+    Encode a card as an optimized PNG and as lossless WebP (when
+    available), returning the smaller. With `lossy`, a 256 colour palette
+    PNG is a candidate too; it is usually the smallest but can band the
+    covers. Returns the bytes (see `card_format` for the type).
+    """
+    candidates = []
+
+    buffer = BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    candidates.append(buffer.getvalue())
+
+    if features.check("webp"):
+        buffer = BytesIO()
+        image.save(buffer, format='WEBP', lossless=True, method=4)
+        candidates.append(buffer.getvalue())
+
+    if lossy:
+        buffer = BytesIO()
+        image.quantize(colors=256, method=Image.Quantize.FASTOCTREE).save(
+            buffer, format='PNG', optimize=True
+        )
+        candidates.append(buffer.getvalue())
+
+    return min(candidates, key=len)
+
+
+def _render(spec, tile_cache=None):
+    """`render_card`, also telling whether every cover made it into a tile."""
+    tiles = [_load_tile(item['image'], item['cover'], tile_cache) for item in spec]
+    image = _compose(spec, [tile or _placeholder_thumbnail() for tile in tiles])
+
+    return encode_card(image), all(tile is not None for tile in tiles)
+
+
+def render_card(spec, tile_cache=None):
+    """
+    Decode, compose and encode a card from a `make_card_spec` spec.
+
+    Picklable, so it can run in any thread or process pool. Tiles found in
+    `tile_cache` skip decoding; freshly decoded ones are added to it.
+    """
+    return _render(spec, tile_cache)[0]
+
+
+def _render_and_store(spec, key, tile_cache, card_cache):
+    payload, complete = _render(spec, tile_cache)
+    # Cards with placeholder tiles aren't worth keeping
+    if complete:
+        card_cache.put(key, payload)
+    return payload
+
+
+class CardRenderer:
+    """
+    Renders cards off the event loop.
+
+    Covers are fetched on the loop, then `render_card` runs in `executor`,
+    as do all the cache lookups and writes since they hit the disk.
+    The default is a small thread pool: Pillow drops the GIL while decoding,
+    resampling, filtering and encoding, so a render no longer stalls gateway
+    handling. Pass a `ProcessPoolExecutor` for full isolation; the caches
+    are pickled over and reopened in the worker.
+
+    Finished tiles are kept in `tile_cache` so repeated covers skip both the
+    download and the fit/mask work, and encoded cards in `card_cache` (keyed
+    by `card_cache_key`) so a repeated card skips rendering altogether.
+    """
+
+    def __init__(self, executor=None, max_workers=2, tile_cache=None, card_cache=None):
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="card-render"
+        )
+        self.tile_cache = tile_cache if tile_cache is not None else TileCache()
+        self.card_cache = (
+            card_cache if card_cache is not None
+            else DiskCache("cache/cards", 32 * 1024 * 1024)
+        )
+
+    async def fetch_covers(self, data, client=None):
+        """`fetch_covers` that skips covers whose tile is already cached."""
+        return await fetch_covers(data, client, self.tile_cache, self._executor)
+
+    async def render(self, data, client=None, covers=None):
+        """
+        Render the card for `data` (see `card_maker`) and return the encoded
+        bytes with their file extension, e.g. `(b"...", "png")`.
+        `covers` optionally holds pre-fetched bytes from `fetch_covers`.
+        """
+        key = card_cache_key(data)
+        loop = asyncio.get_running_loop()
+        payload = await loop.run_in_executor(self._executor, self.card_cache.get, key)
+
+        if payload is None:
+            if data and covers is None:
+                covers = await self.fetch_covers(data, client)
+
+            spec = make_card_spec(data, covers or [])
+            payload = await loop.run_in_executor(
+                self._executor, _render_and_store, spec, key, self.tile_cache, self.card_cache
+            )
+
+        return payload, card_format(payload)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,181 @@
+"""Fitting images into Discord's emoji limits, off the event loop.
+
+`fit_emote` takes any image Pillow can read, static or animated, and
+returns it unchanged when Discord would take it as is. Otherwise it
+shrinks it to at most EMOJI_MAX_BYTES. Static images are downscaled and
+then palette reduced. Animated ones become a GIF, which is shrunk by
+size, then by palette, then by dropping frames. Only after all that
+fails does it go below MIN_SIZE. The first output that fits wins.
+
+`EmoteProcessor` runs it on a small thread pool, since Pillow drops the
+GIL while resampling and encoding.
+"""
+import asyncio
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps, ImageSequence
+
+from utils.errors import EmoteTooLargeError
+
+EMOJI_MAX_BYTES = 256 * 1024
+# Discord never shows emotes bigger than this
+EMOJI_SIZE = 128
+# Edge lengths tried, largest first. Sizes under MIN_SIZE are only a
+# last resort, once palettes and frame dropping didn't do it either
+SIZES = (128, 112, 96, 80, 64, 48, 32)
+MIN_SIZE = 64
+PALETTES = (256, 128, 64, 32)
+# Keep every nth frame, tried after sizes and palettes are exhausted
+FRAME_STEPS = (1, 2, 3, 4)
+# Formats Discord takes for emojis, by Pillow's name
+ACCEPTED_FORMATS = {"PNG": "png", "JPEG": "jpeg", "GIF": "gif", "WEBP": "webp"}
+
+
+def _contain(frame: Image.Image, size: int) -> Image.Image:
+    if frame.width <= size and frame.height <= size:
+        return frame
+    return ImageOps.contain(frame, (size, size), Image.Resampling.LANCZOS)
+
+
+def _encode_static(image: Image.Image, colors: t.Optional[int]) -> bytes:
+    if colors:
+        image = image.quantize(colors, method=Image.Quantize.FASTOCTREE)
+    out = BytesIO()
+    image.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+def _palettize(frame: Image.Image, colors: int) -> Image.Image:
+    """RGBA -> P with at most `colors` entries, the last one transparent"""
+    palettized = frame.convert("RGB").quantize(colors - 1, method=Image.Quantize.FASTOCTREE)
+    palette = palettized.getpalette()
+    palettized.putpalette(palette + [0] * (3 * colors - len(palette)))
+    # GIF transparency is all or nothing
+    palettized.paste(colors - 1, mask=frame.getchannel("A").point(lambda a: 255 if a < 128 else 0))
+    palettized.info["transparency"] = colors - 1
+    return palettized
+
+
+def _encode_animated(
+    frames: t.List[Image.Image], durations: t.List[int], colors: int
+) -> bytes:
+    palettized = [_palettize(frame, colors) for frame in frames]
+    out = BytesIO()
+    palettized[0].save(
+        out,
+        format="GIF",
+        save_all=True,
+        append_images=palettized[1:],
+        duration=durations,
+        loop=0,
+        disposal=2,
+        optimize=True,
+    )
+    return out.getvalue()
+
+
+def _drop_frames(
+    frames: t.List[Image.Image], durations: t.List[int], step: int
+) -> t.Tuple[t.List[Image.Image], t.List[int]]:
+    """Keep every `step`th frame, each shown for as long as the ones it replaces"""
+    if step == 1:
+        return frames, durations
+    return frames[::step], [
+        sum(durations[i : i + step]) for i in range(0, len(durations), step)
+    ]
+
+
+def _search(
+    encode: t.Callable[[int], bytes], limit: int, min_size: int = MIN_SIZE
+) -> t.Optional[bytes]:
+    """The largest of SIZES (down to `min_size`) whose encoding fits in `limit`
+
+    Output size is roughly proportional to area, so the first miss is
+    used to skip straight to the size that should fit.
+    """
+    sizes = [size for size in SIZES if size >= min_size]
+    while sizes:
+        size = sizes.pop(0)
+        data = encode(size)
+        if len(data) <= limit:
+            return data
+        guess = size * (limit / len(data)) ** 0.5
+        sizes = [s for s in sizes if s <= guess] or sizes[-1:]
+    return None
+
+
+def fit_emote(data: bytes, limit: int = EMOJI_MAX_BYTES) -> t.Tuple[bytes, str]:
+    """Make an image acceptable as a Discord emoji
+
+    Args:
+        data (bytes): The image
+        limit (int, optional): Most bytes the result may be. Defaults to
+            EMOJI_MAX_BYTES.
+
+    Raises:
+        EmoteTooLargeError: Nothing tried got under `limit`
+
+    Returns:
+        t.Tuple[bytes, str]: The image and its file extension
+    """
+    with Image.open(BytesIO(data)) as im:
+        animated = getattr(im, "n_frames", 1) > 1
+        if len(data) <= limit and im.format in ACCEPTED_FORMATS:
+            return data, ACCEPTED_FORMATS[im.format]
+
+        if not animated:
+            image = im.convert("RGBA")
+            attempts = [(colors, MIN_SIZE) for colors in (None, *PALETTES)]
+            attempts.append((PALETTES[-1], 0))
+            for colors, min_size in attempts:
+                fitted = _search(
+                    lambda size: _encode_static(_contain(image, size), colors),
+                    limit,
+                    min_size,
+                )
+                if fitted:
+                    return fitted, "png"
+            raise EmoteTooLargeError("Couldn't compress the image enough")
+
+        # Frames are shrunk as they're decoded so only small copies are kept
+        frames, durations = [], []
+        for frame in ImageSequence.Iterator(im):
+            frames.append(_contain(frame.convert("RGBA"), EMOJI_SIZE))
+            durations.append(frame.info.get("duration") or 100)
+
+    attempts = [
+        (step, colors, MIN_SIZE) for step in FRAME_STEPS for colors in PALETTES
+    ]
+    attempts.append((FRAME_STEPS[-1], PALETTES[-1], 0))
+    for step, colors, min_size in attempts:
+        kept, kept_durations = _drop_frames(frames, durations, step)
+        fitted = _search(
+            lambda size: _encode_animated(
+                [_contain(frame, size) for frame in kept], kept_durations, colors
+            ),
+            limit,
+            min_size,
+        )
+        if fitted:
+            return fitted, "gif"
+    raise EmoteTooLargeError("Couldn't compress the animation enough")
+
+
+class EmoteProcessor:
+    """Runs `fit_emote` off the event loop, on `executor` (a small thread
+    pool by default)"""
+
+    def __init__(self, executor=None, max_workers: int = 2) -> None:
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="emote"
+        )
+
+    async def process(self, data: bytes, limit: int = EMOJI_MAX_BYTES) -> t.Tuple[bytes, str]:
+        """See `fit_emote`"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fit_emote, data, limit)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -11,6 +11,22 @@ class RequestsFailedError(CustomError):
 class TransportError(RequestsFailedError):
     """Raised on network error, non-OK HTTP status, or retries exhausted."""
 
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
 
 class AniListError(RequestsFailedError):
     """Raised when AniList GraphQL returns a hard failure (non-retryable or retries exhausted)."""
+
+
+class QuotaExceededError(RequestsFailedError):
+    """Raised when an API's request quota won't allow a request in time."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class EmoteTooLargeError(CustomError):
+    """Raised when an image can't be compressed under Discord's emoji size limit."""
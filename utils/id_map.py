@@ -0,0 +1,103 @@
+"""Local MAL/AniDB → AniList id map.
+
+Backed by the `anilist_id_map` table and held in memory, so resolving a
+sauce hit's AniList link usually needs no network call. Rows are added
+as AniList (or arm) lookups return ids, and can be bulk-seeded from a
+JSON fixture (see `AniListIdMap.seed_from_file`).
+"""
+import json
+import os
+import typing as t
+
+# Dropping an export here seeds the table on startup
+SEED_FILE = "assets/anilist_id_map.json"
+
+
+class AniListIdMap:
+    """Maps (source, source id, media type) to an AniList id
+
+    Args:
+        con (sqlite3.Connection): The bot's database connection, with the
+            `anilist_id_map` table already created
+    """
+
+    def __init__(self, con) -> None:
+        self.con = con
+        cursor = con.cursor()
+        cursor.execute("SELECT source, source_id, media_type, anilist_id FROM anilist_id_map")
+        self._ids: t.Dict[t.Tuple[str, int, str], int] = {
+            (source, source_id, media_type): anilist_id
+            for source, source_id, media_type, anilist_id in cursor.fetchall()
+        }
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def get(self, source: str, source_id: int, media_type: str) -> t.Optional[int]:
+        """The AniList id for e.g. ("mal", 2, "MANGA"), None if unknown"""
+        try:
+            return self._ids.get((source, int(source_id), media_type))
+        except (TypeError, ValueError):
+            return None
+
+    def put_many(self, rows: t.Iterable[t.Tuple[str, int, str, int]]) -> int:
+        """Store (source, source id, media type, AniList id) rows
+
+        Returns:
+            int: How many of them were new
+        """
+        new = [
+            (source, int(source_id), media_type, int(anilist_id))
+            for source, source_id, media_type, anilist_id in rows
+            if self._ids.get((source, int(source_id), media_type)) != int(anilist_id)
+        ]
+        if not new:
+            return 0
+
+        cursor = self.con.cursor()
+        cursor.executemany(
+            "INSERT OR REPLACE INTO anilist_id_map (source, source_id, media_type, anilist_id) "
+            "VALUES (?, ?, ?, ?)",
+            new,
+        )
+        self.con.commit()
+        for source, source_id, media_type, anilist_id in new:
+            self._ids[(source, source_id, media_type)] = anilist_id
+        return len(new)
+
+    def put(self, source: str, source_id: int, media_type: str, anilist_id: int) -> None:
+        self.put_many([(source, source_id, media_type, anilist_id)])
+
+    def remember_media(self, media: t.Iterable[dict], media_type: str) -> int:
+        """Record the MAL ids of AniList `Media` objects that have `id` and `idMal`"""
+        return self.put_many(
+            ("mal", item["idMal"], media_type, item["id"])
+            for item in media
+            if item and item.get("idMal") and item.get("id")
+        )
+
+    def seed_from_file(self, path: str = SEED_FILE) -> int:
+        """Bulk load a JSON fixture, if it exists
+
+        The file is a list of AniList `Media` objects (`id`, `idMal` and
+        `type`), e.g. a dump of AniList's media list, and/or of explicit
+        `{"source", "source_id", "type", "anilist_id"}` rows.
+
+        Returns:
+            int: How many new mappings were added
+        """
+        if not os.path.exists(path):
+            return 0
+
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+
+        rows = []
+        for entry in entries:
+            if "anilist_id" in entry:
+                rows.append(
+                    (entry["source"], entry["source_id"], entry["type"], entry["anilist_id"])
+                )
+            elif entry.get("idMal") and entry.get("id"):
+                rows.append(("mal", entry["idMal"], entry["type"], entry["id"]))
+        return self.put_many(rows)
@@ -1,8 +1,13 @@
 """Utility functions for the bot"""
+import csv
 import io
 import os
 import random
+import struct
+import tempfile
+import time
 import typing as t
+from collections import OrderedDict
 from datetime import timedelta
 from functools import lru_cache
 from urllib.parse import urlparse
@@ -49,7 +54,7 @@ async def dlogger(bot: lb.BotApp, message: str):
         else:
             await bot.rest.create_message(logs_channel, hk.Bytes(message.encode(), "error_message.txt"))
 
-@lru_cache(maxsize=3, typed=False)
+@lru_cache(maxsize=1024, typed=False)
 def check_if_url(link: str) -> bool:
     """Simple code to see if the given string is a url or not"""
     parsed = urlparse(link)
@@ -58,29 +63,208 @@ def check_if_url(link: str) -> bool:
     return False
 
 
-async def is_image(link: str, session: CachedSession) -> int:
-    """Using headers check if a link is of an image or not
+class ImageInfo(t.NamedTuple):
+    """What `probe_image` found out about an image link"""
+
+    format: str
+    width: t.Optional[int] = None
+    height: t.Optional[int] = None
+    size: t.Optional[int] = None
+    animated: bool = False
+    # What the probe read, for `fetch_image` to carry on from. Not cached
+    head: bytes = b""
+
+
+# Bytes fetched to sniff an image; JPEG dimensions sit after the EXIF
+# block so this needs to be a little generous
+PROBE_BYTES = 16 * 1024
+PROBE_TTL = 60 * 60
+# Failed probes are only remembered long enough to absorb a burst of retries
+PROBE_ERROR_TTL = 5
+PROBE_CACHE_SIZE = 2048
+
+_probe_cache: "OrderedDict[str, t.Tuple[float, t.Optional[ImageInfo]]]" = OrderedDict()
+
+
+def _jpeg_size(head: bytes) -> t.Optional[t.Tuple[int, int]]:
+    pos = 2
+    while pos + 9 <= len(head):
+        if head[pos] != 0xFF:
+            return None
+        marker = head[pos + 1]
+        # Start Of Frame markers, minus DHT/JPG/DAC which share the range
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", head[pos + 5 : pos + 9])
+            return width, height
+        pos += 2 + struct.unpack(">H", head[pos + 2 : pos + 4])[0]
+    return None
+
+
+def sniff_image(head: bytes) -> t.Optional[ImageInfo]:
+    """Identify an image from its first bytes
+
+    Args:
+        head (bytes): The start of the file
+
+    Returns:
+        t.Optional[ImageInfo]: Format and (when present in `head`) the
+            dimensions, None if it isn't a known image format
+    """
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        width, height = struct.unpack(">II", head[16:24]) if len(head) >= 24 else (None, None)
+        return ImageInfo("png", width, height, animated=b"acTL" in head)
+
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        width, height = struct.unpack("<HH", head[6:10]) if len(head) >= 10 else (None, None)
+        # Animated gifs carry the looping extension ahead of the first frame
+        animated = b"NETSCAPE2.0" in head or head.count(b"\x21\xf9\x04") > 1
+        return ImageInfo("gif", width, height, animated=animated)
+
+    if head.startswith(b"\xff\xd8\xff"):
+        width, height = _jpeg_size(head) or (None, None)
+        return ImageInfo("jpeg", width, height)
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        chunk = head[12:16]
+        width = height = None
+        animated = False
+        if chunk == b"VP8X" and len(head) >= 30:
+            animated = bool(head[20] & 0x02)
+            width = int.from_bytes(head[24:27], "little") + 1
+            height = int.from_bytes(head[27:30], "little") + 1
+        elif chunk == b"VP8 " and len(head) >= 30:
+            width, height = (v & 0x3FFF for v in struct.unpack("<HH", head[26:30]))
+        elif chunk == b"VP8L" and len(head) >= 25:
+            bits = int.from_bytes(head[21:25], "little")
+            width, height = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        return ImageInfo("webp", width, height, animated=animated)
+
+    return None
+
+
+async def probe_image(link: str, session: CachedSession) -> t.Optional[ImageInfo]:
+    """Find out whether a link is an image, and which, without downloading it
+
+    Reads only the first PROBE_BYTES (a ranged GET, which also tells the
+    full size) and sniffs the magic numbers, falling back to the
+    Content-Type for formats we don't parse. Verdicts are cached for
+    PROBE_TTL, negative ones included.
 
     Args:
         link (str): The link to check
         session (CachedSession): The async. (cached or otherwise) session
 
     Returns:
-        int: 0 if not image, 1/2 if yes
+        t.Optional[ImageInfo]: The image's details, None if not an image
     """
+    cached = _probe_cache.get(link)
+    if cached and cached[0] > time.monotonic():
+        _probe_cache.move_to_end(link)
+        return cached[1]
+
+    info = None
+    ttl = PROBE_TTL
     try:
-        async with session.head(link) as r:
-            if r.headers["content-type"] in ["image/png", "image/jpeg", "image/jpg"]:
-                return 1
-            if r.headers["content-type"] in ["image/webp", "image/gif"]:
-                return 2
-            return 0
+        async with session.get(
+            link,
+            headers={"Range": f"bytes=0-{PROBE_BYTES - 1}"},
+            # Don't let the cache read the whole body to store it
+            expire_after=0,
+        ) as r:
+            if r.ok:
+                head = await r.content.read(PROBE_BYTES)
+                size = None
+                if "content-range" in r.headers:
+                    total = r.headers["content-range"].rpartition("/")[2]
+                    size = int(total) if total.isdigit() else None
+                elif r.status == 200 and r.content_length is not None:
+                    size = r.content_length
+
+                info = sniff_image(head)
+                content_type = r.headers.get("content-type", "")
+                if info is None and content_type.startswith("image/"):
+                    info = ImageInfo(content_type[6:].split(";")[0])
+                if info is not None:
+                    info = info._replace(size=size, head=head)
     except Exception:
+        # A timeout or reset says nothing about the link, retry it soon
+        info = None
+        ttl = PROBE_ERROR_TTL
+
+    _probe_cache[link] = (
+        time.monotonic() + ttl,
+        info._replace(head=b"") if info else None,
+    )
+    _probe_cache.move_to_end(link)
+    while len(_probe_cache) > PROBE_CACHE_SIZE:
+        _probe_cache.popitem(last=False)
+
+    return info
+
+
+async def fetch_image(
+    link: str,
+    session: CachedSession,
+    info: t.Optional[ImageInfo] = None,
+    max_bytes: t.Optional[int] = None,
+) -> t.Optional[bytes]:
+    """Download an image, reusing what `probe_image` already read of it
+
+    Images that fit in the probe aren't fetched again, bigger ones only
+    have the rest requested.
+
+    Args:
+        link (str): The image link
+        session (CachedSession): The async. (cached or otherwise) session
+        info (t.Optional[ImageInfo]): `probe_image`'s result for the link
+        max_bytes (t.Optional[int]): Stop reading past this many bytes
+
+    Returns:
+        t.Optional[bytes]: The whole image, None if it's over `max_bytes`
+    """
+    head = info.head if info else b""
+    if head and info.size is not None and len(head) >= info.size:
+        return head[: info.size]
+
+    headers = {"Range": f"bytes={len(head)}-"} if head else {}
+    async with session.get(link, headers=headers) as r:
+        if r.status == 416 and head:
+            # Nothing past what the probe read, which was the whole image
+            return head
+        r.raise_for_status()
+        # Servers ignoring the range send the whole image
+        chunks = [head] if r.status == 206 else []
+        size = len(chunks[0]) if chunks else 0
+        async for chunk in r.content.iter_chunked(64 * 1024):
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                return None
+            chunks.append(chunk)
+
+    return b"".join(chunks)
+
+
+async def is_image(link: str, session: CachedSession) -> int:
+    """Check if a link is of an image or not (see `probe_image`)
+
+    Args:
+        link (str): The link to check
+        session (CachedSession): The async. (cached or otherwise) session
+
+    Returns:
+        int: 0 if not image, 1 if PIL friendly (png/jpeg), 2 if webp/gif
+    """
+    info = await probe_image(link, session)
+    if info is None:
         return 0
+    if info.format in ("png", "jpeg", "jpg"):
+        return 1
+    if info.format in ("webp", "gif"):
+        return 2
+    return 0
 
 
 from curl_cffi import requests
-import time
 
 class CustomSession(requests.Session):
     def __init__(self, *args, **kwargs):
@@ -297,3 +481,53 @@ def truncate_words(text: str, limit: int) -> str:
     truncated = truncated.rstrip(" .,!?:;-")
     return truncated + "..."
 
+
+
+# Exports stay in memory up to this size, then spill to a temp file
+CSV_SPOOL_SIZE = 1024 * 1024
+CSV_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_spool(spool: t.IO[bytes]) -> t.Iterator[bytes]:
+    try:
+        spool.seek(0)
+        while chunk := spool.read(CSV_CHUNK_SIZE):
+            yield chunk
+    finally:
+        spool.close()
+
+
+async def csv_attachment(
+    filename: str,
+    header: t.Sequence[str],
+    rows: t.Union[t.Iterable[t.Sequence], t.AsyncIterable[t.Sequence]],
+) -> hk.Bytes:
+    """Write rows to a CSV attachment without holding them all in memory
+
+    Rows (e.g. straight from a paginated REST iterator) are written as
+    they come into a spooled buffer, which is streamed back out in
+    chunks when the attachment is uploaded.
+
+    Args:
+        filename (str): The attachment's name
+        header (t.Sequence[str]): The column names
+        rows (t.Union[t.Iterable, t.AsyncIterable]): The rows
+
+    Returns:
+        hk.Bytes: The attachment
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=CSV_SPOOL_SIZE)
+    text = io.TextIOWrapper(spool, encoding="utf-8", newline="")
+    writer = csv.writer(text, lineterminator="\n")
+    writer.writerow(header)
+
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            writer.writerow(row)
+    else:
+        writer.writerows(rows)
+
+    text.flush()
+    # The wrapper would close the spool along with itself
+    text.detach()
+    return hk.Bytes(_iter_spool(spool), filename, mimetype="text/csv")
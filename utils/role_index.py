@@ -0,0 +1,99 @@
+"""Per-guild role membership index.
+
+Answers "who has this role" in O(|role|) instead of walking every cached
+member. A guild is indexed from the member cache the first time it's
+asked about, then kept current from member/role gateway events (see the
+listeners in `extensions.info`).
+"""
+import typing as t
+
+import hikari as hk
+from rapidfuzz import process
+from rapidfuzz.utils import default_process
+
+
+class RoleIndex:
+    def __init__(self) -> None:
+        # guild -> role -> members with it
+        self._members: t.Dict[int, t.Dict[int, t.Set[int]]] = {}
+        # guild -> member -> their roles, to diff updates against
+        self._roles_of: t.Dict[int, t.Dict[int, t.FrozenSet[int]]] = {}
+        # guild -> (processed role names, role ids), for fuzzy matching
+        self._names: t.Dict[int, t.Tuple[t.List[str], t.List[int]]] = {}
+
+    def is_indexed(self, guild_id: int) -> bool:
+        return guild_id in self._members
+
+    def build(self, guild_id: int, members: t.Iterable[hk.Member]) -> None:
+        """(Re)index a guild from its members"""
+        self._members[guild_id] = {}
+        self._roles_of[guild_id] = {}
+        for member in members:
+            self.set_member(guild_id, member.id, member.role_ids)
+
+    def set_member(self, guild_id: int, member_id: int, role_ids: t.Iterable[int]) -> None:
+        """Record a member's current roles. No-op for guilds not indexed yet,
+        building the index picks them up from the cache."""
+        if guild_id not in self._members:
+            return
+
+        by_role = self._members[guild_id]
+        roles = frozenset(role_ids)
+        old = self._roles_of[guild_id].get(member_id, frozenset())
+
+        for role_id in old - roles:
+            holders = by_role.get(role_id)
+            if holders is not None:
+                holders.discard(member_id)
+                if not holders:
+                    del by_role[role_id]
+        for role_id in roles - old:
+            by_role.setdefault(role_id, set()).add(member_id)
+
+        self._roles_of[guild_id][member_id] = roles
+
+    def remove_member(self, guild_id: int, member_id: int) -> None:
+        if guild_id in self._members:
+            self.set_member(guild_id, member_id, ())
+            self._roles_of[guild_id].pop(member_id, None)
+
+    def remove_role(self, guild_id: int, role_id: int) -> None:
+        self._names.pop(guild_id, None)
+        holders = self._members.get(guild_id, {}).pop(role_id, ())
+        for member_id in holders:
+            roles_of = self._roles_of[guild_id]
+            roles_of[member_id] = roles_of[member_id] - {role_id}
+
+    def drop_guild(self, guild_id: int) -> None:
+        self._members.pop(guild_id, None)
+        self._roles_of.pop(guild_id, None)
+        self._names.pop(guild_id, None)
+
+    def members_with(self, guild_id: int, role_id: int) -> t.Set[int]:
+        """Ids of the members holding a role (the live set, don't mutate it)"""
+        return self._members.get(guild_id, {}).get(role_id, set())
+
+    def invalidate_names(self, guild_id: int) -> None:
+        """A role was created, renamed or deleted"""
+        self._names.pop(guild_id, None)
+
+    def match_role_name(
+        self, guild_id: int, roles: t.Iterable[hk.Role], query: str, score_cutoff: int = 85
+    ) -> t.Optional[int]:
+        """Fuzzy match a role name, returning the role id
+
+        The processed names are cached per guild until a role event
+        invalidates them, so only the query gets processed per call.
+        """
+        if guild_id not in self._names:
+            roles = list(roles)
+            self._names[guild_id] = (
+                [default_process(role.name) for role in roles],
+                [role.id for role in roles],
+            )
+
+        names, ids = self._names[guild_id]
+        ans = process.extractOne(
+            default_process(query), names, processor=None, score_cutoff=score_cutoff
+        )
+        return ids[ans[2]] if ans else None
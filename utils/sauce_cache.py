@@ -0,0 +1,225 @@
+"""Perceptual-hash cache of reverse image search results.
+
+Every image we look up is hashed (64-bit pHash and dHash) and stored in
+the `sauce_cache` table with the engine's response. A BK-tree over the
+pHashes finds earlier lookups within a small Hamming distance, so
+re-posted, re-encoded or resized copies of an image don't cost another
+SauceNAO/trace.moe request.
+"""
+import json
+import math
+import time
+import typing as t
+from io import BytesIO
+
+from PIL import Image
+
+# Max differing bits (out of 64) for two images to count as the same
+PHASH_RADIUS = 8
+DHASH_RADIUS = 10
+# Results older than this are looked up again (and pruned on load)
+CACHE_TTL = 30 * 86400
+# The engines' thumbnail/preview links are signed and expire long before
+# the matches go stale, so older results are returned without them
+LINK_TTL = 3600
+# Per engine: the list of matches in a response, and the signed links in
+# each match (as key paths)
+_SIGNED_LINKS = {
+    "saucenao": ("results", (("header", "thumbnail"),)),
+    "tracemoe": ("result", (("image",), ("video",))),
+}
+
+_HASH_MASK = (1 << 64) - 1
+_DCT = [[math.cos(math.pi * (2 * x + 1) * u / 64) for x in range(32)] for u in range(8)]
+
+
+def _bits_to_int(bits) -> int:
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bool(bit)
+    return value
+
+
+def dhash(image: Image.Image) -> int:
+    """Difference hash: brightness gradient between neighbouring pixels"""
+    grey = image.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    px = list(grey.getdata())
+    return _bits_to_int(
+        px[row * 9 + col] > px[row * 9 + col + 1] for row in range(8) for col in range(8)
+    )
+
+
+def phash(image: Image.Image) -> int:
+    """Perceptual hash: signs of the lowest 8x8 DCT frequencies around their median"""
+    grey = image.convert("L").resize((32, 32), Image.Resampling.LANCZOS)
+    px = list(grey.getdata())
+    rows = [px[y * 32 : (y + 1) * 32] for y in range(32)]
+
+    # Separable 2D DCT, only ever computing the 8 lowest frequencies
+    partial = [[sum(p * c for p, c in zip(row, basis)) for basis in _DCT] for row in rows]
+    coeffs = [
+        sum(partial[y][u] * basis[y] for y in range(32)) for basis in _DCT for u in range(8)
+    ]
+
+    # The DC term is just the mean brightness, keep it out of the median
+    median = sorted(coeffs[1:])[len(coeffs[1:]) // 2]
+    return _bits_to_int(c > median for c in coeffs)
+
+
+def image_hashes(image: t.Union[bytes, Image.Image]) -> t.Tuple[int, int]:
+    """(pHash, dHash) of an image or its encoded bytes"""
+    if not isinstance(image, Image.Image):
+        image = Image.open(BytesIO(image))
+    # Animated images are hashed on their first frame
+    image.seek(0)
+    return phash(image), dhash(image)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance.
+
+    Each child edge is labelled with its distance from the parent, so by
+    the triangle inequality a radius-r search only descends into edges
+    within r of the query's own distance to the node.
+    """
+
+    def __init__(self) -> None:
+        self._root = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, key: int, value: t.Any) -> None:
+        self._size += 1
+        if self._root is None:
+            self._root = (key, [value], {})
+            return
+
+        node = self._root
+        while True:
+            node_key, values, children = node
+            distance = hamming(key, node_key)
+            if distance == 0:
+                values.append(value)
+                return
+            if distance not in children:
+                children[distance] = (key, [value], {})
+                return
+            node = children[distance]
+
+    def search(self, key: int, radius: int) -> t.List[t.Tuple[int, t.Any]]:
+        """Every (distance, value) within `radius` of `key`, nearest first"""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_key, values, children = stack.pop()
+            distance = hamming(key, node_key)
+            if distance <= radius:
+                found.extend((distance, value) for value in values)
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+
+        found.sort(key=lambda x: x[0])
+        return found
+
+
+def _drop_signed_links(engine: str, result: dict) -> dict:
+    """`result` with the expiring media links of its matches set to None"""
+    matches_key, paths = _SIGNED_LINKS.get(engine, (None, ()))
+    for match in result.get(matches_key) or ():
+        for *parents, key in paths:
+            node = match
+            for parent in parents:
+                node = node.get(parent) or {}
+            if key in node:
+                node[key] = None
+    return result
+
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >> 63 else value
+
+
+class SauceCache:
+    """Near-duplicate lookup of stored sauce results, backed by `sauce_cache`
+
+    Args:
+        con (sqlite3.Connection): The bot's database connection, with the
+            `sauce_cache` table already created
+        ttl (int, optional): Seconds a result stays valid. Defaults to CACHE_TTL.
+        link_ttl (int, optional): Seconds the media links in a result are
+            kept. Defaults to LINK_TTL.
+    """
+
+    def __init__(self, con, ttl: int = CACHE_TTL, link_ttl: int = LINK_TTL) -> None:
+        self.con = con
+        self.ttl = ttl
+        self.link_ttl = link_ttl
+        self._trees: t.Dict[str, BKTree] = {}
+
+        cursor = con.cursor()
+        cursor.execute(
+            "DELETE FROM sauce_cache WHERE created_at < ?", (int(time.time()) - ttl,)
+        )
+        con.commit()
+        cursor.execute("SELECT id, engine, phash, dhash, created_at FROM sauce_cache")
+        for row_id, engine, phash_, dhash_, created_at in cursor.fetchall():
+            self._tree(engine).add(
+                phash_ & _HASH_MASK, (row_id, dhash_ & _HASH_MASK, created_at)
+            )
+
+    def _tree(self, engine: str) -> BKTree:
+        return self._trees.setdefault(engine, BKTree())
+
+    def lookup(self, engine: str, hashes: t.Tuple[int, int]) -> t.Optional[dict]:
+        """The stored response for a near-duplicate image, if there is one
+
+        Responses older than `link_ttl` come without their media links.
+        """
+        phash_, dhash_ = hashes
+        now = time.time()
+        expiry = now - self.ttl
+
+        # pHash finds the candidates, dHash weeds out collisions
+        candidates = [
+            (distance, -created_at, row_id)
+            for distance, (row_id, cand_dhash, created_at) in self._tree(engine).search(
+                phash_, PHASH_RADIUS
+            )
+            if created_at >= expiry and hamming(dhash_, cand_dhash) <= DHASH_RADIUS
+        ]
+        if not candidates:
+            return None
+
+        _, neg_created_at, row_id = min(candidates)
+        cursor = self.con.cursor()
+        cursor.execute("SELECT result FROM sauce_cache WHERE id = ?", (row_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+
+        result = json.loads(row[0])
+        if now + neg_created_at > self.link_ttl:
+            result = _drop_signed_links(engine, result)
+        return result
+
+    def store(self, engine: str, hashes: t.Tuple[int, int], result: dict) -> None:
+        """Remember the response for an image"""
+        phash_, dhash_ = hashes
+        created_at = int(time.time())
+
+        cursor = self.con.cursor()
+        cursor.execute(
+            "INSERT INTO sauce_cache (engine, phash, dhash, result, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (engine, _to_signed(phash_), _to_signed(dhash_), json.dumps(result), created_at),
+        )
+        self.con.commit()
+        self._tree(engine).add(phash_, (cursor.lastrowid, dhash_, created_at))
@@ -0,0 +1,336 @@
+"""SauceNAO + trace.moe transport.
+
+`SauceClient` is an `HttpClient` for both reverse image search engines.
+Images go out either as a url (the engine downloads it) or as bytes /
+a PIL image, which are downscaled to the size the engine actually
+matches on and uploaded as multipart form data — no re-hosting needed.
+Uploads bypass the shared response cache: every multipart body has a
+random boundary, so a cached upload could never be hit again.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from collections import defaultdict, deque
+from io import BytesIO
+from typing import Any, Hashable, Optional, Union
+
+import aiohttp
+from PIL import Image
+
+from utils.anilist_client import HttpClient
+from utils.errors import QuotaExceededError, TransportError
+
+ImageLike = Union[bytes, Image.Image]
+
+
+def fit_upload(image: ImageLike, max_side: int, quality: int = 85) -> bytes:
+    """Downscale an image so its longest side is at most `max_side`, as a JPEG"""
+    if not isinstance(image, Image.Image):
+        image = Image.open(BytesIO(image))
+    image = image.convert("RGB")
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _multipart(field: str, payload: bytes, filename: str = "image.jpg") -> tuple[bytes, str]:
+    """A single-file multipart body, as bytes so a retried request can resend it"""
+    boundary = uuid.uuid4().hex
+    body = b"".join(
+        (
+            f"--{boundary}\r\n".encode(),
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'.encode(),
+            b"Content-Type: image/jpeg\r\n\r\n",
+            payload,
+            f"\r\n--{boundary}--\r\n".encode(),
+        )
+    )
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+class SauceNAOQuota:
+    """Admission control for SauceNAO's 30 second and 24 hour search limits.
+
+    Every search response reports `short_remaining`/`long_remaining` (and
+    the limits) in its header; `update` feeds those back in. `acquire`
+    queues callers in FIFO order while the 30s window is full instead of
+    letting SauceNAO 429 them, and hands out a ticket per request: the
+    slot is given back with `release` if the request never counted
+    against SauceNAO, and headers are applied in ticket order so only an
+    out-of-order (older) one is ignored.
+
+    The daily budget is shared fairly between buckets (guilds, or users
+    in DMs): a bucket past its equal share can only spend what isn't
+    still owed to the other buckets active in the last day. A bucket
+    that has gone quiet releases its unused share over `IDLE_RELEASE`
+    seconds, so the full quota stays usable.
+    """
+
+    SHORT_WINDOW = 30
+    LONG_WINDOW = 86400
+    IDLE_RELEASE = 6 * 3600
+    # How long to wait before probing again once the daily quota hits 0
+    LONG_RETRY = 3600
+
+    def __init__(self, short_limit: int = 4, long_limit: int = 100, max_wait: float = 90) -> None:
+        self.short_limit = short_limit
+        self.long_limit = long_limit
+        self.long_remaining = long_limit
+        self.max_wait = max_wait
+
+        self._lock = asyncio.Lock()
+        self._recent: deque[float] = deque()
+        self._usage: defaultdict[Hashable, deque[float]] = defaultdict(deque)
+        self._short_blocked_until = 0.0
+        self._long_blocked_until = 0.0
+        # ticket -> (bucket, time) of requests whose header hasn't come back
+        self._pending: dict[int, tuple[Hashable, float]] = {}
+        self._next_ticket = 0
+        self._applied_ticket = -1
+
+    def _expire(self, now: float) -> None:
+        while self._recent and self._recent[0] <= now - self.SHORT_WINDOW:
+            self._recent.popleft()
+        for bucket in list(self._usage):
+            usage = self._usage[bucket]
+            while usage and usage[0] <= now - self.LONG_WINDOW:
+                usage.popleft()
+            if not usage:
+                del self._usage[bucket]
+
+    def _short_wait(self, now: float) -> float:
+        """Seconds until the 30s window has room again"""
+        wait = self._short_blocked_until - now
+        if len(self._recent) >= self.short_limit:
+            wait = max(wait, self._recent[-self.short_limit] + self.SHORT_WINDOW - now)
+        return wait
+
+    def _owed_to_others(self, bucket: Hashable, now: float) -> float:
+        """Daily quota still reserved for the other active buckets"""
+        active = set(self._usage) | {bucket}
+        share = self.long_limit / len(active)
+        owed = 0.0
+        for other, usage in self._usage.items():
+            if other == bucket:
+                continue
+            idle = now - usage[-1]
+            owed += max(0.0, share - len(usage)) * max(0.0, 1 - idle / self.IDLE_RELEASE)
+        return owed
+
+    def _check_budget(self, bucket: Hashable, now: float) -> None:
+        if self.long_remaining <= 0 and now < self._long_blocked_until:
+            raise QuotaExceededError(
+                "SauceNAO's daily search limit is used up",
+                retry_after=self._long_blocked_until - now,
+            )
+
+        used = len(self._usage.get(bucket, ()))
+        share = self.long_limit / len(set(self._usage) | {bucket})
+        if used >= share and self.long_remaining - 1 < self._owed_to_others(bucket, now):
+            usage = self._usage.get(bucket)
+            # No usage of its own means the whole budget is 0 (long_limit 0)
+            retry_after = usage[0] + self.LONG_WINDOW - now if usage else self.LONG_RETRY
+            raise QuotaExceededError(
+                "This server has used its share of today's SauceNAO searches",
+                retry_after=retry_after,
+            )
+
+    async def acquire(self, bucket: Hashable = None) -> int:
+        """Wait for a search slot for `bucket`.
+
+        Returns:
+            int: The request's ticket, for `update` or `release`
+
+        Raises:
+            QuotaExceededError: The daily budget doesn't allow it, or the
+                wait for a slot would exceed `max_wait`
+        """
+        deadline = time.monotonic() + self.max_wait
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                self._check_budget(bucket, now)
+
+                wait = self._short_wait(now)
+                if wait <= 0:
+                    break
+                if now + wait > deadline:
+                    raise QuotaExceededError(
+                        "SauceNAO is busy, try again in a bit", retry_after=wait
+                    )
+                await asyncio.sleep(wait)
+
+            self._recent.append(now)
+            self._usage[bucket].append(now)
+            self.long_remaining -= 1
+            if self.long_remaining <= 0:
+                self._long_blocked_until = now + self.LONG_RETRY
+
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._pending[ticket] = (bucket, now)
+            return ticket
+
+    def release(self, ticket: int) -> None:
+        """Give a slot back: the request failed before SauceNAO counted it,
+        or its answer came from the local cache"""
+        if ticket not in self._pending:
+            return
+        bucket, taken = self._pending.pop(ticket)
+        for times in (self._recent, self._usage.get(bucket)):
+            if times and taken in times:
+                times.remove(taken)
+        if bucket in self._usage and not self._usage[bucket]:
+            del self._usage[bucket]
+        self.long_remaining += 1
+
+    def update(self, header: dict, ticket: Optional[int] = None) -> None:
+        """Sync with the limits reported in a SauceNAO response header
+
+        `ticket` is the one `acquire` gave the request. Headers older than
+        one already applied are ignored; otherwise SauceNAO's counts are
+        taken as they are, less the requests sent since that it hasn't
+        reported yet.
+        """
+        now = time.monotonic()
+        if ticket is not None:
+            self._pending.pop(ticket, None)
+            if ticket < self._applied_ticket:
+                return
+
+        try:
+            short_limit = int(header.get("short_limit", self.short_limit))
+            long_limit = int(header.get("long_limit", self.long_limit))
+            long_remaining = int(header.get("long_remaining", self.long_remaining))
+            short_remaining = int(header.get("short_remaining", 1))
+        except (TypeError, ValueError):
+            return
+
+        if ticket is not None:
+            self._applied_ticket = ticket
+            long_remaining -= sum(1 for later in self._pending if later > ticket)
+
+        self.short_limit = short_limit
+        self.long_limit = long_limit
+        self.long_remaining = long_remaining
+
+        if short_remaining <= 0:
+            self._short_blocked_until = now + self.SHORT_WINDOW
+        if self.long_remaining <= 0:
+            self._long_blocked_until = now + self.LONG_RETRY
+
+    def throttled(self) -> None:
+        """SauceNAO said 429 without a usable header, back off a full window"""
+        self._short_blocked_until = time.monotonic() + self.SHORT_WINDOW
+
+
+class SauceClient(HttpClient):
+    SAUCENAO_URL = "https://saucenao.com/search.php"
+    TRACEMOE_URL = "https://api.trace.moe/search"
+
+    # Both engines match on heavily reduced images, so anything above
+    # these only costs upload time
+    SAUCENAO_MAX_SIDE = 800
+    TRACEMOE_MAX_SIDE = 640
+
+    def __init__(self, session, saucenao_key: Optional[str] = None) -> None:
+        super().__init__(session)
+        self._saucenao_key = saucenao_key
+        self.quota = SauceNAOQuota()
+        self._upload_session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def upload_session(self) -> aiohttp.ClientSession:
+        """Uncached session for the multipart uploads"""
+        if self._upload_session is None or self._upload_session.closed:
+            self._upload_session = aiohttp.ClientSession(timeout=self._session.timeout)
+        return self._upload_session
+
+    async def close(self) -> None:
+        if self._upload_session is not None:
+            await self._upload_session.close()
+
+    async def _upload(self, url: str, field: str, image: ImageLike, max_side: int, **kwargs: Any):
+        payload = await asyncio.to_thread(fit_upload, image, max_side)
+        body, content_type = _multipart(field, payload)
+        return await self.request(
+            "POST",
+            url,
+            data=body,
+            headers={"Content-Type": content_type},
+            session=self.upload_session,
+            **kwargs,
+        )
+
+    async def saucenao(
+        self,
+        url: Optional[str] = None,
+        image: Optional[ImageLike] = None,
+        *,
+        numres: int = 5,
+        bucket: Hashable = None,
+    ) -> dict:
+        """Search SauceNAO by url or by image, return the raw response body.
+
+        Waits for a slot from `self.quota`, charged to `bucket` (e.g. the
+        guild id). A negative `header.status` in the body is SauceNAO's own
+        error signal and is left for the caller to report.
+
+        Raises:
+            QuotaExceededError: No slot for `bucket` within the quota
+            TransportError: The request failed
+        """
+        params = {"api_key": self._saucenao_key, "output_type": 2, "numres": numres}
+
+        ticket = await self.quota.acquire(bucket)
+        try:
+            if image is not None:
+                resp = await self._upload(
+                    self.SAUCENAO_URL, "file", image, self.SAUCENAO_MAX_SIDE, params=params
+                )
+            else:
+                resp = await self.request(
+                    "GET", self.SAUCENAO_URL, params={**params, "url": url}
+                )
+            body = await resp.json(content_type=None)
+        except BaseException as e:
+            if isinstance(e, TransportError) and e.status == 429:
+                self.quota.throttled()
+            self.quota.release(ticket)
+            raise
+
+        # A repeated url search can be answered by the session cache, which
+        # SauceNAO never saw and whose header is long out of date
+        if getattr(resp, "from_cache", False):
+            self.quota.release(ticket)
+        else:
+            self.quota.update(body.get("header", {}), ticket)
+        return body
+
+    async def tracemoe(
+        self,
+        url: Optional[str] = None,
+        image: Optional[ImageLike] = None,
+        *,
+        cut_borders: bool = True,
+    ) -> dict:
+        """Search trace.moe by url or by image, return the raw response body.
+
+        `cut_borders` has trace.moe strip black letterboxing first, which
+        matters for screenshots and video frames.
+        """
+        params = {"cutBorders": ""} if cut_borders else {}
+
+        if image is not None:
+            resp = await self._upload(
+                self.TRACEMOE_URL, "image", image, self.TRACEMOE_MAX_SIDE, params=params
+            )
+        else:
+            resp = await self.request("GET", self.TRACEMOE_URL, params={**params, "url": url})
+
+        return await resp.json(content_type=None)
@@ -0,0 +1,222 @@
+"""Keyframe extraction from videos via an ffmpeg subprocess"""
+import asyncio
+import os
+import tempfile
+import typing as t
+from io import BytesIO
+
+from PIL import Image, ImageFilter, ImageStat
+
+FFMPEG = os.getenv("FFMPEG_PATH", "ffmpeg")
+
+# ffmpeg decodes are CPU heavy, so only a few run at once across all users
+MAX_FFMPEG_PROCS = 2
+# Frames wider than this are scaled down by ffmpeg before they reach us
+MAX_FRAME_WIDTH = 1280
+CHUNK_SIZE = 64 * 1024
+# Most of a video that is downloaded and kept for the file fallback
+MAX_VIDEO_BYTES = 100 * 1024 * 1024
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+_ffmpeg_slots = asyncio.Semaphore(MAX_FFMPEG_PROCS)
+
+
+async def iter_url(session, url: str, chunk_size: int = CHUNK_SIZE):
+    """Stream the body of a url in chunks
+
+    Args:
+        session (CachedSession): The aiohttp session
+        url (str): The url to download
+        chunk_size (int, optional): Bytes per chunk. Defaults to CHUNK_SIZE.
+
+    Yields:
+        bytes: The next chunk of the body
+    """
+    async with session.get(url) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.content.iter_chunked(chunk_size):
+            yield chunk
+
+
+def split_png_stream(data: bytes) -> t.List[bytes]:
+    """Split the output of ffmpeg's `image2pipe` png muxer into single images"""
+    images = []
+    pos = 0
+    while data.startswith(_PNG_SIGNATURE, pos):
+        start = pos
+        pos += len(_PNG_SIGNATURE)
+        while pos + 8 <= len(data):
+            length = int.from_bytes(data[pos : pos + 4], "big")
+            chunk_type = data[pos + 4 : pos + 8]
+            # length, type, data and crc
+            pos += 12 + length
+            if chunk_type == b"IEND":
+                images.append(data[start:pos])
+                break
+        else:
+            # Truncated trailing image
+            break
+    return images
+
+
+def laplacian_variance(image: Image.Image) -> float:
+    """Sharpness score of an image, higher is sharper
+
+    Variance of the Laplacian over the greyscale image; blurry frames and
+    fades have few edges and so a low variance.
+    """
+    grey = image.convert("L")
+    if grey.width > 512:
+        grey = grey.resize((512, round(grey.height * 512 / grey.width)))
+    # The offset keeps negative responses from being clipped to 0
+    edges = grey.filter(
+        ImageFilter.Kernel((3, 3), (0, 1, 0, 1, -4, 1, 0, 1, 0), scale=1, offset=128)
+    )
+    return ImageStat.Stat(edges).var[0]
+
+
+def _ffmpeg_args(source: str, max_frames: int, scene_threshold: float) -> t.List[str]:
+    return [
+        FFMPEG,
+        "-hide_banner",
+        "-loglevel", "error",
+        "-i", source,
+        "-an",
+        # The first frame plus every scene change, capped to MAX_FRAME_WIDTH
+        "-vf",
+        f"select=eq(n\\,0)+gt(scene\\,{scene_threshold}),"
+        f"scale=min({MAX_FRAME_WIDTH}\\,iw):-2",
+        "-vsync", "vfr",
+        "-frames:v", str(max_frames),
+        "-f", "image2pipe",
+        "-c:v", "png",
+        "pipe:1",
+    ]
+
+
+async def _run_ffmpeg(args, chunks=None) -> t.Tuple[int, bytes]:
+    """Run ffmpeg, feeding `chunks` into stdin"""
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.PIPE if chunks is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+
+    async def feed():
+        try:
+            async for chunk in chunks:
+                proc.stdin.write(chunk)
+                await proc.stdin.drain()
+            proc.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg has all the frames it wants or gave up on the input
+            pass
+
+    try:
+        if chunks is not None:
+            stdout, _ = await asyncio.gather(proc.stdout.read(), feed())
+        else:
+            stdout = await proc.stdout.read()
+        await proc.wait()
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+
+    return proc.returncode, stdout
+
+
+async def extract_keyframes(
+    chunks: t.AsyncIterator[bytes],
+    max_frames: int = 4,
+    scene_threshold: float = 0.3,
+    timeout: float = 60,
+    max_bytes: int = MAX_VIDEO_BYTES,
+) -> t.List[Image.Image]:
+    """Extract the first frame and a few scene-change keyframes of a video
+
+    The video is streamed into ffmpeg's stdin and frames come back over
+    stdout. Containers that can't be read from a pipe (mp4s with the index
+    at the end) are retried from a file in a temp dir private to the call.
+    Only the first `max_bytes` are read; ffmpeg sees the input end there
+    and the file retry is skipped.
+
+    Args:
+        chunks (t.AsyncIterator[bytes]): The video, e.g. from `iter_url`
+        max_frames (int, optional): Most frames to return. Defaults to 4.
+        scene_threshold (float, optional): ffmpeg scene score (0-1) above
+            which a frame counts as a scene change. Defaults to 0.3.
+        timeout (float, optional): Seconds before giving up. Defaults to 60.
+        max_bytes (int, optional): Most bytes to read from `chunks`.
+            Defaults to MAX_VIDEO_BYTES.
+
+    Returns:
+        t.List[Image.Image]: The decoded frames, may be empty
+    """
+    args = _ffmpeg_args("pipe:0", max_frames, scene_threshold)
+    buffer = bytearray()
+    too_large = False
+
+    async def buffered():
+        # Keeps a copy for the file fallback, up to max_bytes
+        nonlocal too_large
+        async for chunk in chunks:
+            if len(buffer) + len(chunk) > max_bytes:
+                too_large = True
+                return
+            buffer.extend(chunk)
+            yield chunk
+
+    async def drain():
+        async for _ in stream:
+            pass
+
+    stream = buffered()
+    try:
+        async with _ffmpeg_slots:
+            _, stdout = await asyncio.wait_for(_run_ffmpeg(args, stream), timeout)
+            frames = split_png_stream(stdout)
+
+            if not frames and not too_large:
+                # Whatever ffmpeg didn't read is still pending on the stream
+                await asyncio.wait_for(drain(), timeout)
+
+            # A truncated file would fail the same way, so don't bother
+            if not frames and not too_large:
+                with tempfile.TemporaryDirectory(prefix="akane-video-") as tmp:
+                    path = os.path.join(tmp, "input")
+                    with open(path, "wb") as f:
+                        await asyncio.to_thread(f.write, buffer)
+
+                    args = _ffmpeg_args(path, max_frames, scene_threshold)
+                    _, stdout = await asyncio.wait_for(_run_ffmpeg(args), timeout)
+                    frames = split_png_stream(stdout)
+    finally:
+        # Releases the download behind the stream (e.g. `iter_url`'s
+        # response), which ffmpeg may have stopped reading early
+        await stream.aclose()
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    return [Image.open(BytesIO(frame)) for frame in frames]
+
+
+def _sharpest(frames: t.List[Image.Image]) -> Image.Image:
+    return max(frames, key=laplacian_variance)
+
+
+async def best_frame(chunks: t.AsyncIterator[bytes], **kwargs) -> t.Optional[Image.Image]:
+    """The sharpest keyframe of a video (see `extract_keyframes`)
+
+    Returns:
+        t.Optional[Image.Image]: The frame, None if nothing could be decoded
+    """
+    frames = await extract_keyframes(chunks, **kwargs)
+    if not frames:
+        return None
+    return await asyncio.to_thread(_sharpest, frames)
+
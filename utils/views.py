@@ -66,6 +66,65 @@ class AuthorNavi(nav.NavigatorView):
             await self.message.edit(components=new_view)
 
 
+class LazyNavi(AuthorNavi):
+    """An author navigator which builds each page the first time it's shown
+
+    Args:
+        page_count (int): The number of pages
+        page_builder (t.Callable): Coroutine function taking a page index
+            and returning the page
+        cache_window (int, optional): Keep only the pages within this many
+            of the current one, rebuilding others when revisited. Defaults
+            to None, keeping every page built.
+    """
+
+    def __init__(
+        self,
+        *,
+        page_count: int,
+        page_builder: t.Callable[
+            [int], t.Awaitable[t.Union[str, hk.Embed, t.Sequence[hk.Embed], nav.Page]]
+        ],
+        buttons: t.Optional[t.Sequence[nav.NavButton]] = None,
+        timeout: t.Optional[t.Union[float, int, timedelta]] = 15 * 60,
+        user_id: t.Optional[hk.Snowflake] = None,
+        clean_items: t.Optional[bool] = True,
+        cache_window: t.Optional[int] = None,
+    ) -> None:
+        self.page_builder = page_builder
+        self.cache_window = cache_window
+        self._built: t.Set[int] = set()
+        super().__init__(
+            pages=[None] * page_count,
+            buttons=buttons,
+            timeout=timeout,
+            user_id=user_id,
+            clean_items=clean_items,
+        )
+
+    async def _build_page(self, index: int) -> None:
+        if self.pages[index] is None:
+            self.pages[index] = await self.page_builder(index)
+            self._built.add(index)
+
+        if self.cache_window is not None:
+            for stale in [i for i in self._built if abs(i - index) > self.cache_window]:
+                self.pages[stale] = None
+                self._built.discard(stale)
+
+    async def send_page(
+        self, context: miru.Context, page_index: t.Optional[int] = None
+    ) -> None:
+        if page_index is not None:
+            self.current_page = page_index
+        await self._build_page(self.current_page)
+        await super().send_page(context)
+
+    async def send(self, to, *, start_at: int = 0, **kwargs) -> None:
+        await self._build_page(start_at)
+        await super().send(to, start_at=start_at, **kwargs)
+
+
 class AuthorView(miru.View):
     """A subclassed view with author checks for the view"""
 
@@ -109,10 +168,41 @@ class AuthorView(miru.View):
         return False
 
 
+class LazyPages(t.Mapping[str, t.Any]):
+    """A read-only pages mapping which builds each page on first access
+
+    Holds the raw records and runs `builder` on one only when its key is
+    looked up, keeping the result. Drop-in for a `pages` dict.
+
+    Args:
+        records (t.Mapping[str, t.Any]): The records, by page key
+        builder (t.Callable): Makes the page (embed, list of embeds...) of a record
+    """
+
+    def __init__(self, records: t.Mapping[str, t.Any], builder: t.Callable[[t.Any], t.Any]) -> None:
+        self.records = dict(records)
+        self.builder = builder
+        self._built: dict[str, t.Any] = {}
+
+    def __getitem__(self, key: str) -> t.Any:
+        if key not in self._built:
+            self._built[key] = self.builder(self.records[key])
+        return self._built[key]
+
+    def __iter__(self) -> t.Iterator[str]:
+        return iter(self.records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.records
+
+
 class SelectView(AuthorView):
     """A subclassed view designed for Text Select"""
 
-    def __init__(self, user_id: hk.Snowflake, pages: dict[str, hk.Embed]) -> None:
+    def __init__(self, user_id: hk.Snowflake, pages: t.Mapping[str, hk.Embed]) -> None:
         self.pages = pages
         super().__init__(timeout=60 * 60, clean_items=False, user_id=user_id)
 
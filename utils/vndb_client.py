@@ -0,0 +1,223 @@
+"""VNDB (api.vndb.org/kana) transport.
+
+`VNDBClient` is an `HttpClient` for VNDB's query endpoints. Filters are
+plain VNDB filter JSON, built with `predicate`/`search`/`all_of`/
+`any_of`, and `select` normalizes the fields to return. Request bodies are
+serialized canonically so equivalent queries share one entry in the
+session's response cache, and uncached requests are throttled to VNDB's
+published limits.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Iterable, Optional, Union
+
+from utils.anilist_client import HttpClient
+from utils.errors import QuotaExceededError
+
+Filter = list
+
+ENDPOINTS = frozenset(
+    {"vn", "release", "producer", "character", "staff", "tag", "trait", "quote", "ulist"}
+)
+OPERATORS = frozenset({"=", "!=", ">", ">=", "<", "<="})
+
+
+def predicate(name: str, op: str, value: Any) -> Filter:
+    """A single `[name, op, value]` filter"""
+    if op not in OPERATORS:
+        raise ValueError(f"Unknown VNDB filter operator {op!r}")
+    return [name, op, value]
+
+
+def search(query: str) -> Filter:
+    return predicate("search", "=", query)
+
+
+def _combine(kind: str, filters: Iterable[Optional[Filter]]) -> Optional[Filter]:
+    filters = [f for f in filters if f]
+    if len(filters) < 2:
+        return filters[0] if filters else None
+    return [kind, *filters]
+
+
+def all_of(*filters: Optional[Filter]) -> Optional[Filter]:
+    """AND the filters together (empty ones are dropped)"""
+    return _combine("and", filters)
+
+
+def any_of(*filters: Optional[Filter]) -> Optional[Filter]:
+    """OR the filters together (empty ones are dropped)"""
+    return _combine("or", filters)
+
+
+def select(*names: Union[str, Iterable[str]]) -> str:
+    """Canonical `fields` string: comma separated, de-duplicated and sorted
+
+    Accepts names, comma separated strings or iterables of either, so
+    `select("title, image.url", ["rating"])` works.
+    """
+    flat = set()
+    for name in names:
+        parts = name.split(",") if isinstance(name, str) else name
+        flat.update(part.strip() for part in parts)
+    flat.discard("")
+    return ",".join(sorted(flat))
+
+
+def canonical_body(payload: dict) -> bytes:
+    """The request body as stable JSON, which doubles as the cache key"""
+    return json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+
+
+class VNDBRateLimit:
+    """Sliding window limiter for VNDB's 200 requests per 5 minutes.
+
+    VNDB also caps server execution time per minute; keeping only a few
+    requests in flight at once stays well within it.
+    """
+
+    WINDOW = 300
+
+    def __init__(self, limit: int = 200, concurrency: int = 4, max_wait: float = 30) -> None:
+        self.limit = limit
+        self.max_wait = max_wait
+        self._lock = asyncio.Lock()
+        self._in_flight = asyncio.Semaphore(concurrency)
+        self._sent: deque[float] = deque()
+
+    async def acquire(self) -> float:
+        """Wait for a request slot
+
+        Returns:
+            float: The slot taken, to `refund` it
+
+        Raises:
+            QuotaExceededError: The wait would exceed `max_wait`
+        """
+        async with self._lock:
+            now = time.monotonic()
+            while self._sent and self._sent[0] <= now - self.WINDOW:
+                self._sent.popleft()
+
+            if len(self._sent) >= self.limit:
+                wait = self._sent[0] + self.WINDOW - now
+                if wait > self.max_wait:
+                    raise QuotaExceededError(
+                        "VNDB's request limit is used up, try again in a bit",
+                        retry_after=wait,
+                    )
+                await asyncio.sleep(wait)
+                self._sent.popleft()
+
+            slot = time.monotonic()
+            self._sent.append(slot)
+            return slot
+
+    def refund(self, slot: float) -> None:
+        """Give back a slot, the response came from the local cache"""
+        try:
+            self._sent.remove(slot)
+        except ValueError:
+            # Already slid out of the window
+            pass
+
+    async def __aenter__(self) -> float:
+        await self._in_flight.acquire()
+        try:
+            return await self.acquire()
+        except BaseException:
+            self._in_flight.release()
+            raise
+
+    async def __aexit__(self, *exc) -> None:
+        self._in_flight.release()
+
+
+class VNDBClient(HttpClient):
+    URL = "https://api.vndb.org/kana"
+    # Most results a single request can ask for
+    MAX_RESULTS = 100
+
+    def __init__(self, session) -> None:
+        super().__init__(session)
+        self.rate_limit = VNDBRateLimit()
+
+    async def query(
+        self,
+        endpoint: str,
+        filters: Optional[Filter] = None,
+        fields: str = "id",
+        *,
+        sort: Optional[str] = None,
+        reverse: bool = False,
+        results: int = 10,
+        page: int = 1,
+        count: bool = False,
+        cache_ttl: Optional[int] = None,
+    ) -> dict:
+        """POST a query to `/kana/<endpoint>`, return the response body
+        (`results`, `more` and, if asked for, `count`).
+
+        Raises:
+            QuotaExceededError: No request slot within the rate limit
+            TransportError: The request failed
+        """
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown VNDB endpoint {endpoint!r}")
+
+        payload: dict[str, Any] = {
+            "fields": select(fields),
+            "results": min(results, self.MAX_RESULTS),
+            "page": page,
+        }
+        if filters:
+            payload["filters"] = filters
+        if sort:
+            payload["sort"] = sort
+            payload["reverse"] = reverse
+        if count:
+            payload["count"] = True
+
+        async with self.rate_limit as slot:
+            resp = await self.request(
+                "POST",
+                f"{self.URL}/{endpoint}",
+                data=canonical_body(payload),
+                headers={"Content-Type": "application/json"},
+                cache_ttl=cache_ttl,
+            )
+            if getattr(resp, "from_cache", False):
+                self.rate_limit.refund(slot)
+
+        return await resp.json()
+
+    async def search(self, endpoint: str, query: str, fields: str, **kwargs: Any) -> list:
+        """The `results` of a text search on an endpoint"""
+        return (await self.query(endpoint, search(query), fields, **kwargs))["results"]
+
+    async def paginate(
+        self,
+        endpoint: str,
+        filters: Optional[Filter] = None,
+        fields: str = "id",
+        *,
+        per_page: int = MAX_RESULTS,
+        max_pages: Optional[int] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[dict]:
+        """Yield every result of a query, fetching pages while `more` is set"""
+        page = 1
+        while True:
+            body = await self.query(
+                endpoint, filters, fields, results=per_page, page=page, **kwargs
+            )
+            for item in body["results"]:
+                yield item
+
+            if not body.get("more") or (max_pages and page >= max_pages):
+                return
+            page += 1
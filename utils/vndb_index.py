@@ -0,0 +1,305 @@
+"""Local index of VNDB's tags and traits.
+
+VNDB's tag and trait vocabulary barely changes, so instead of hitting
+the API for every `/vntag` or `/vntrait`, the public database dumps
+(https://vndb.org/d14) are loaded into SQLite with an FTS5 index over
+names and aliases. `VNDBIndex.lookup` returns records shaped like the
+API's `/tag` and `/trait` results.
+
+The bot's own aliases (the `traitmap`) are indexed alongside VNDB's, as
+extra FTS rows with an empty name pointing at the entry they stand for.
+"""
+import asyncio
+import gzip
+import json
+import re
+import sqlite3
+import time
+import typing as t
+
+DUMP_URLS = {
+    "tag": "https://dl.vndb.org/dump/vndb-tags-latest.json.gz",
+    "trait": "https://dl.vndb.org/dump/vndb-traits-latest.json.gz",
+}
+# Used when the index was never built and the dumps can't be downloaded
+FIXTURES = {
+    "tag": "assets/vndb-tags.json.gz",
+    "trait": "assets/vndb-traits.json.gz",
+}
+# Dumps are regenerated daily upstream, weekly is plenty for us
+MAX_AGE = 7 * 86400
+
+_ID_PREFIX = {"tag": "g", "trait": "i"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vndb_tags (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    aliases TEXT,
+    description TEXT,
+    category TEXT,
+    vn_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS vndb_traits (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    aliases TEXT,
+    description TEXT,
+    group_name TEXT,
+    char_count INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS vndb_tags_fts USING fts5(
+    id UNINDEXED, name, aliases, tokenize='unicode61 remove_diacritics 2'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS vndb_traits_fts USING fts5(
+    id UNINDEXED, name, aliases, tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS vndb_local_aliases (
+    kind TEXT,
+    alias TEXT,
+    target TEXT,
+    PRIMARY KEY (kind, alias)
+);
+CREATE TABLE IF NOT EXISTS vndb_index_meta (
+    kind TEXT PRIMARY KEY,
+    built_at INTEGER,
+    entries INTEGER
+);
+"""
+
+
+def load_dump(data: bytes) -> t.List[dict]:
+    """Decode a (gzipped) JSON tags/traits dump"""
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _vndb_id(kind: str, value: t.Union[int, str]) -> str:
+    value = str(value)
+    return value if value[:1].isalpha() else f"{_ID_PREFIX[kind]}{value}"
+
+
+# Shorter words only match whole tokens, or "c++" would match "cool beauty"
+MIN_PREFIX_LENGTH = 2
+
+
+def _fts_query(text: str) -> t.Optional[str]:
+    """Every word of `text` as a quoted term (a prefix term from
+    MIN_PREFIX_LENGTH on), so user input can't trip FTS5's query syntax"""
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    return " ".join(
+        f'"{word}"*' if len(word) >= MIN_PREFIX_LENGTH else f'"{word}"' for word in words
+    )
+
+
+class VNDBIndex:
+    """FTS5 lookup of VNDB tags and traits, backed by the bot's database
+
+    Args:
+        con (sqlite3.Connection): The bot's database connection
+    """
+
+    _TABLES = {"tag": "vndb_tags", "trait": "vndb_traits"}
+
+    def __init__(self, con: sqlite3.Connection) -> None:
+        self.con = con
+        con.executescript(_SCHEMA)
+        con.commit()
+        # Rebuilds open their own connection here, off the event loop.
+        # Empty for in-memory databases, which only `con` can reach
+        self.path = con.execute("PRAGMA database_list").fetchone()[2]
+
+    def built_at(self, kind: str) -> t.Optional[int]:
+        """Unix time the `kind` index was last built, None if it never was"""
+        cursor = self.con.cursor()
+        cursor.execute("SELECT built_at FROM vndb_index_meta WHERE kind = ?", (kind,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def is_stale(self, kind: str, max_age: int = MAX_AGE) -> bool:
+        built_at = self.built_at(kind)
+        return built_at is None or time.time() - built_at > max_age
+
+    def _rows(self, kind: str, entries: t.List[dict]) -> t.List[tuple]:
+        if kind == "tag":
+            return [
+                (
+                    _vndb_id(kind, entry["id"]),
+                    entry["name"],
+                    "\n".join(entry.get("aliases") or []),
+                    entry.get("description") or "",
+                    entry.get("category") or entry.get("cat"),
+                    entry.get("vn_count", entry.get("vns", 0)),
+                )
+                for entry in entries
+            ]
+
+        # Older trait dumps only have the parents, the group is the root
+        by_id = {entry["id"]: entry for entry in entries}
+
+        def group_name(entry: dict) -> t.Optional[str]:
+            if entry.get("group_name"):
+                return entry["group_name"]
+            seen = set()
+            while entry.get("parents") and entry["id"] not in seen:
+                seen.add(entry["id"])
+                entry = by_id.get(entry["parents"][0], entry)
+            return entry["name"]
+
+        return [
+            (
+                _vndb_id(kind, entry["id"]),
+                entry["name"],
+                "\n".join(entry.get("aliases") or []),
+                entry.get("description") or "",
+                group_name(entry),
+                entry.get("char_count", entry.get("chars", 0)),
+            )
+            for entry in entries
+        ]
+
+    def ingest(self, kind: str, entries: t.List[dict]) -> int:
+        """Replace the `kind` ("tag" or "trait") index with a dump's entries
+
+        Returns:
+            int: The number of entries indexed
+        """
+        return self._ingest(self.con, kind, entries)
+
+    def _ingest(self, con: sqlite3.Connection, kind: str, entries: t.List[dict]) -> int:
+        table = self._TABLES[kind]
+        rows = self._rows(kind, entries)
+
+        with con:
+            con.execute(f"DELETE FROM {table}")
+            con.execute(f"DELETE FROM {table}_fts")
+            con.executemany(f"INSERT INTO {table} VALUES (?, ?, ?, ?, ?, ?)", rows)
+            con.executemany(
+                f"INSERT INTO {table}_fts (id, name, aliases) VALUES (?, ?, ?)",
+                [row[:3] for row in rows],
+            )
+            con.execute(
+                "INSERT OR REPLACE INTO vndb_index_meta (kind, built_at, entries) "
+                "VALUES (?, ?, ?)",
+                (kind, int(time.time()), len(rows)),
+            )
+            self._index_local_aliases(con, kind)
+        return len(rows)
+
+    def _ingest_detached(self, kind: str, data: bytes) -> int:
+        con = sqlite3.connect(self.path)
+        try:
+            return self._ingest(con, kind, load_dump(data))
+        finally:
+            con.close()
+
+    async def _ingest_off_loop(self, kind: str, data: bytes) -> int:
+        if self.path:
+            return await asyncio.to_thread(self._ingest_detached, kind, data)
+        entries = await asyncio.to_thread(load_dump, data)
+        return self.ingest(kind, entries)
+
+    def set_local_aliases(self, kind: str, aliases: t.Mapping[str, str]) -> None:
+        """Replace the bot's own aliases for `kind`, each mapping an alias to
+        a query for the entry it stands for (resolved against the index)"""
+        with self.con:
+            self.con.execute("DELETE FROM vndb_local_aliases WHERE kind = ?", (kind,))
+            self.con.executemany(
+                "INSERT OR REPLACE INTO vndb_local_aliases (kind, alias, target) "
+                "VALUES (?, ?, ?)",
+                [(kind, alias.strip().lower(), target) for alias, target in aliases.items()],
+            )
+            self._index_local_aliases(self.con, kind)
+
+    def _index_local_aliases(self, con: sqlite3.Connection, kind: str) -> None:
+        table = self._TABLES[kind]
+        # Dump entries always have a name, alias rows never do
+        con.execute(f"DELETE FROM {table}_fts WHERE name = ''")
+        cursor = con.cursor()
+        cursor.execute(
+            "SELECT alias, target FROM vndb_local_aliases WHERE kind = ?", (kind,)
+        )
+        rows = []
+        for alias, target in cursor.fetchall():
+            entry = self._lookup(con, kind, target)
+            if entry is not None:
+                rows.append((entry["id"], "", alias))
+        con.executemany(
+            f"INSERT INTO {table}_fts (id, name, aliases) VALUES (?, ?, ?)", rows
+        )
+
+    def lookup(self, kind: str, query: str, local_aliases: bool = True) -> t.Optional[dict]:
+        """The best matching tag/trait for `query`, in the API's result shape
+
+        The bot's own aliases (unless `local_aliases` is off) win outright,
+        then exact names, then exact VNDB aliases, then FTS5 relevance
+        (names weighted over aliases) and popularity.
+        """
+        return self._lookup(self.con, kind, query, local_aliases)
+
+    def _lookup(
+        self, con: sqlite3.Connection, kind: str, query: str, local_aliases: bool = True
+    ) -> t.Optional[dict]:
+        match = _fts_query(query)
+        if match is None:
+            return None
+
+        table = self._TABLES[kind]
+        count = "vn_count" if kind == "tag" else "char_count"
+        extra = "category" if kind == "tag" else "group_name"
+        cursor = con.cursor()
+        cursor.execute(
+            f"""
+            SELECT t.id, t.name, t.aliases, t.description, t.{extra}, t.{count}
+            FROM {table}_fts f JOIN {table} t ON t.id = f.id
+            WHERE {table}_fts MATCH :match AND (:local OR f.name != '')
+            ORDER BY
+                f.name = '' AND lower(f.aliases) = lower(:q) DESC,
+                lower(t.name) = lower(:q) DESC,
+                instr(lower(char(10) || t.aliases || char(10)),
+                      lower(char(10) || :q || char(10))) > 0 DESC,
+                bm25({table}_fts, 0, 10.0, 2.0),
+                t.{count} DESC
+            LIMIT 1
+            """,
+            {"match": match, "q": query.strip(), "local": local_aliases},
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+
+        id_, name, aliases, description, extra_value, count_value = row
+        return {
+            "id": id_,
+            "name": name,
+            "aliases": aliases.split("\n") if aliases else [],
+            "description": description,
+            extra: extra_value,
+            count: count_value,
+        }
+
+    def ingest_file(self, kind: str, path: str) -> int:
+        """Rebuild the `kind` index from a local dump or fixture (.json or .json.gz)"""
+        with open(path, "rb") as f:
+            return self.ingest(kind, load_dump(f.read()))
+
+    async def refresh_from_file(self, kind: str, path: str) -> int:
+        """`ingest_file`, run off the event loop"""
+        return await self._ingest_off_loop(kind, await asyncio.to_thread(_read_file, path))
+
+    async def refresh(self, session, kind: str) -> int:
+        """Download the latest `kind` dump and rebuild its index off the event loop"""
+        # The dumps are big and change daily, keep them out of the response cache
+        async with session.get(DUMP_URLS[kind], expire_after=0) as resp:
+            resp.raise_for_status()
+            data = await resp.read()
+
+        return await self._ingest_off_loop(kind, data)